@@ -0,0 +1,145 @@
+#!/usr/bin/env python3
+
+"""
+Benchmark of the bulk filemanager resolution of the resample scripts, against the local filemanager stand-in.
+
+For a list of s3 uris, we compare
+* serial - a lookup then a presign request for each uri in turn, as each task did before
+* bulk - resolve_s3_uris, chunked key queries and bounded concurrent presign requests
+
+and report the wall time and the number of requests of each, with --latency-ms standing in for the api round trip.
+A few uris that are not in the stand-in are included, and the records of both approaches are checked to match.
+
+Not shipped in the container image, run from this directory with
+uv run python3 benchmark_filemanager_resolver.py [--num-uris 200] [--latency-ms 20]
+"""
+
+# Standard imports
+import argparse
+import sys
+from pathlib import Path
+from time import perf_counter
+from typing import Dict, List
+
+# Local imports
+from filemanager_stand_in import start_filemanager_stand_in
+
+sys.path.insert(0, str(Path(__file__).absolute().parent.parent / "scripts"))
+from filemanager import (  # noqa: E402
+    DEFAULT_KEYS_PER_REQUEST,
+    DEFAULT_MAX_PARALLEL_REQUESTS,
+    get_presigned_url_from_s3_object_id,
+    get_s3_object_from_s3_uri_if_exists,
+    resolve_s3_uris
+)
+
+# Globals
+ORCABUS_TOKEN = "stand-in-token"
+
+
+def resolve_s3_uris_serially(filemanager_url: str, s3_uri_list: List[str]) -> Dict[str, Dict]:
+    """
+    Resolve each s3 uri in turn, with one lookup and one presign request per uri
+    :param filemanager_url:
+    :param s3_uri_list:
+    :return:
+    """
+    s3_objects_by_uri = {}
+    for s3_uri_iter_ in s3_uri_list:
+        s3_object = get_s3_object_from_s3_uri_if_exists(filemanager_url, ORCABUS_TOKEN, s3_uri_iter_)
+        if s3_object is None:
+            continue
+        s3_objects_by_uri[s3_uri_iter_] = {
+            **s3_object,
+            "presignedUrl": get_presigned_url_from_s3_object_id(
+                filemanager_url, ORCABUS_TOKEN, s3_object["s3ObjectId"]
+            )
+        }
+    return s3_objects_by_uri
+
+
+def get_args():
+    """
+    Use argparse, to get the arguments from the command line.
+    We collect the following arguments
+    * --num-uris
+    * --num-missing-uris
+    * --latency-ms
+    * --max-parallel-requests
+    * --keys-per-request
+    :return:
+    """
+    args = argparse.ArgumentParser(description="Compare serial and bulk filemanager resolution of s3 uris.")
+
+    args.add_argument("--num-uris", type=int, default=200, help="The number of s3 uris in the filemanager.")
+    args.add_argument("--num-missing-uris", type=int, default=3, help="The number of s3 uris not in the filemanager.")
+    args.add_argument("--latency-ms", type=float, default=20, help="The latency added to every request.")
+    args.add_argument("--max-parallel-requests", type=int, default=DEFAULT_MAX_PARALLEL_REQUESTS)
+    args.add_argument("--keys-per-request", type=int, default=DEFAULT_KEYS_PER_REQUEST)
+
+    return args.parse_args()
+
+
+def main():
+    args = get_args()
+
+    # Spread the uris over two buckets
+    s3_uri_list = [
+        f"s3://bucket-{uri_index_iter_ % 2}/cache/fastq-{uri_index_iter_:05d}/multiqc.parquet"
+        for uri_index_iter_ in range(args.num_uris)
+    ]
+    missing_s3_uri_list = [
+        f"s3://bucket-0/missing/fastq-{uri_index_iter_:05d}/multiqc.parquet"
+        for uri_index_iter_ in range(args.num_missing_uris)
+    ]
+    filemanager_stand_in = start_filemanager_stand_in(s3_uri_list, latency_ms=args.latency_ms)
+
+    print(
+        f"Resolving {args.num_uris} + {args.num_missing_uris} missing s3 uri(s), "
+        f"{args.latency_ms:g}ms per request"
+    )
+    results = {}
+    for approach_iter_ in ["serial", "bulk"]:
+        filemanager_stand_in.request_counts.update({"s3": 0, "presign": 0})
+        start_time = perf_counter()
+        if approach_iter_ == "serial":
+            s3_objects_by_uri = resolve_s3_uris_serially(filemanager_stand_in.url, s3_uri_list + missing_s3_uri_list)
+        else:
+            s3_objects_by_uri = resolve_s3_uris(
+                filemanager_stand_in.url, ORCABUS_TOKEN, s3_uri_list + missing_s3_uri_list,
+                max_parallel_requests=args.max_parallel_requests,
+                keys_per_request=args.keys_per_request
+            )
+        wall_time = perf_counter() - start_time
+        results[approach_iter_] = s3_objects_by_uri
+        print(
+            f"  {approach_iter_:<8} {wall_time:>7.3f}s  "
+            f"{filemanager_stand_in.request_counts['s3']:>5} lookup and "
+            f"{filemanager_stand_in.request_counts['presign']:>5} presign request(s), "
+            f"{len(s3_objects_by_uri)} resolved"
+        )
+
+    filemanager_stand_in.shutdown()
+
+    # The presigned urls differ between requests, the records must otherwise match
+    def drop_presigned_urls(s3_objects_by_uri: Dict[str, Dict]) -> Dict[str, Dict]:
+        return {
+            s3_uri_iter_: {
+                key_iter_: value_iter_
+                for key_iter_, value_iter_ in s3_object_iter_.items()
+                if key_iter_ != "presignedUrl"
+            }
+            for s3_uri_iter_, s3_object_iter_ in s3_objects_by_uri.items()
+        }
+
+    if drop_presigned_urls(results["serial"]) != drop_presigned_urls(results["bulk"]):
+        print("The serial and bulk records differ", file=sys.stderr)
+        sys.exit(1)
+    if not all("presignedUrl" in s3_object_iter_ for s3_object_iter_ in results["bulk"].values()):
+        print("A bulk record is missing its presigned url", file=sys.stderr)
+        sys.exit(1)
+    print("The serial and bulk records match")
+
+
+if __name__ == "__main__":
+    main()
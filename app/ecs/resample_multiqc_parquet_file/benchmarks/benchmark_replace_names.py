@@ -0,0 +1,162 @@
+#!/usr/bin/env python3
+
+"""
+Micro-benchmark of the plot input data name replacement walker.
+
+Compares the recursive rebuild-everything walker the resample script used to have
+against replace_names, on the plot input data JSON of a real multiqc parquet file.
+
+For each walker we report
+* The total time taken to walk every plot input data object, over --repeats repeats
+* The number and size of memory blocks still held by the walked objects (measured with tracemalloc)
+
+Both walkers must return the same JSON for every object, otherwise the benchmark exits non-zero.
+
+Not shipped in the container image, run from this directory with
+uv run python3 benchmark_replace_names.py --parquet-file multiqc.parquet --old-sample-name <name> --new-sample-name <name>
+"""
+
+# Standard imports
+import argparse
+import json
+import sys
+import tracemalloc
+from pathlib import Path
+from time import perf_counter
+from typing import Callable, Dict, List
+import pandas as pd
+
+# Local imports
+sys.path.append(str(Path(__file__).absolute().parent.parent / "scripts"))
+from update_sample_names_in_parquet_files import replace_names  # noqa: E402
+
+
+def recursively_replace_name(d, rename_map: Dict[str, str]):
+    """
+    The previous recursive walker, copies every dict and list in the tree
+    :param d:
+    :param rename_map:
+    :return:
+    """
+    if isinstance(d, dict):
+        return {
+            rename_map.get(k, k): recursively_replace_name(v, rename_map)
+            for k, v in
+            d.items()
+        }
+    elif isinstance(d, list):
+        return [
+            recursively_replace_name(i, rename_map)
+            for i in d
+        ]
+    elif isinstance(d, str):
+        return rename_map.get(d, d)
+    return d
+
+
+def time_walker(walker: Callable, plot_input_objects: List, rename_map: Dict[str, str], repeats: int) -> float:
+    """
+    Return the total seconds taken to walk all plot input objects, repeats times
+    """
+    start_time = perf_counter()
+    for _ in range(repeats):
+        for plot_input_object_iter_ in plot_input_objects:
+            walker(plot_input_object_iter_, rename_map)
+    return perf_counter() - start_time
+
+
+def measure_walker_allocations(walker: Callable, plot_input_objects: List, rename_map: Dict[str, str]) -> (int, int):
+    """
+    Return the number of blocks and bytes allocated by a walker that are still held by its results
+    """
+    tracemalloc.start()
+    snapshot_before = tracemalloc.take_snapshot()
+    results = [
+        walker(plot_input_object_iter_, rename_map)
+        for plot_input_object_iter_ in plot_input_objects
+    ]
+    snapshot_after = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+
+    statistics = snapshot_after.compare_to(snapshot_before, "filename")
+    del results
+
+    return (
+        sum(statistic_iter_.count_diff for statistic_iter_ in statistics),
+        sum(statistic_iter_.size_diff for statistic_iter_ in statistics)
+    )
+
+
+def get_args():
+    """
+    Get the arguments from the command line
+    :return:
+    """
+    args = argparse.ArgumentParser(
+        description="Benchmark the plot input data name replacement walkers."
+    )
+    args.add_argument(
+        "--parquet-file",
+        type=str,
+        required=True,
+        help="The path to a multiqc parquet file."
+    )
+    args.add_argument(
+        "--old-sample-name",
+        type=str,
+        required=True,
+        help="The sample name to replace."
+    )
+    args.add_argument(
+        "--new-sample-name",
+        type=str,
+        required=True,
+        help="The sample name to replace with."
+    )
+    args.add_argument(
+        "--repeats",
+        type=int,
+        default=5,
+        help="The number of times to walk every plot input object when timing. Defaults to 5."
+    )
+    return args.parse_args()
+
+
+def main():
+    args = get_args()
+
+    rename_map = {
+        args.old_sample_name: args.new_sample_name
+    }
+
+    # Parse the plot input data once, we only want to benchmark the walk
+    df = pd.read_parquet(args.parquet_file, columns=['type', 'plot_input_data'])
+    plot_input_objects = list(map(
+        json.loads,
+        df.loc[df['type'] == 'plot_input', 'plot_input_data']
+    ))
+    print(f"Walking {len(plot_input_objects)} plot input objects")
+
+    # Confirm the walkers agree
+    for plot_input_object_iter_ in plot_input_objects:
+        if (
+                json.dumps(replace_names(plot_input_object_iter_, rename_map)) !=
+                json.dumps(recursively_replace_name(plot_input_object_iter_, rename_map))
+        ):
+            print("Walkers disagree on a plot input object", file=sys.stderr)
+            sys.exit(1)
+
+    for walker_name, walker in [
+        ("recursively_replace_name", recursively_replace_name),
+        ("replace_names", replace_names),
+    ]:
+        allocated_blocks, allocated_bytes = measure_walker_allocations(walker, plot_input_objects, rename_map)
+        seconds = time_walker(walker, plot_input_objects, rename_map, args.repeats)
+        print(
+            f"{walker_name}: {seconds:.3f}s over {args.repeats} repeats, "
+            f"{allocated_blocks} blocks / {allocated_bytes / 1024 / 1024:.1f} MB held by the results"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,194 @@
+#!/usr/bin/env python3
+
+"""
+Startup benchmark of the resample scripts.
+
+Each entry path of the container is imported in a fresh interpreter, as a task would on start up,
+and we report the time from interpreter launch to the end of the imports, i.e. the time before any useful work.
+
+The entry paths are
+* driver - the driver module, imported before the hostname and tokens are resolved
+* cache skip - the driver and the cache sidecar module, all a task needs for a file it skips
+* upload only - the upload module
+* rename - the driver and everything needed to download, rename and upload a file
+
+Each path is timed
+* cold - with an empty bytecode cache, so every module is compiled on import, as without precompiled .pyc files
+* warm - with a populated bytecode cache, as with the precompiled .pyc files of the image
+
+We also list which of pandas, pyarrow, boto3 and wrapica each path imports.
+
+To compare before and after a change, check out the earlier scripts directory (e.g. with git worktree)
+and pass it as --baseline-scripts-dir.
+
+Not shipped in the container image, run from this directory with
+uv run python3 benchmark_startup.py [--baseline-scripts-dir <path/to/old/scripts>]
+"""
+
+# Standard imports
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from time import perf_counter
+from typing import Dict, List, Optional
+
+# Globals
+SCRIPTS_DIR = Path(__file__).absolute().parent.parent / "scripts"
+HEAVY_MODULES = ["pandas", "pyarrow", "boto3", "wrapica"]
+ENTRY_PATHS: Dict[str, List[str]] = {
+    "driver": ["resample_multiqc_parquet_files"],
+    "cache skip": ["resample_multiqc_parquet_files", "resample_cache"],
+    "upload only": ["upload_file_to_icav2"],
+    "rename": ["resample_multiqc_parquet_files", "resample_cache", "resample_parquet_file", "upload_file_to_icav2"],
+}
+
+
+def time_entry_path(
+        scripts_dir: Path,
+        modules: List[str],
+        pycache_prefix: Path
+) -> Dict:
+    """
+    Import the modules in a fresh interpreter, returning the wall time and the heavy modules imported
+    :param scripts_dir:
+    :param modules:
+    :param pycache_prefix:
+    :return:
+    """
+    code = "; ".join(
+        [
+            "import sys, json",
+            *[f"import {module_iter_}" for module_iter_ in modules],
+            f"print(json.dumps([m for m in {HEAVY_MODULES!r} if m in sys.modules]))"
+        ]
+    )
+
+    start_time = perf_counter()
+    completed_process = subprocess.run(
+        [sys.executable, "-c", code],
+        cwd=scripts_dir,
+        env={
+            **os.environ,
+            "PYTHONPATH": os.pathsep.join(filter(None, [str(scripts_dir), os.environ.get("PYTHONPATH")])),
+            "PYTHONPYCACHEPREFIX": str(pycache_prefix)
+        },
+        capture_output=True,
+        text=True,
+        check=True
+    )
+    wall_time = perf_counter() - start_time
+
+    return {
+        "seconds": wall_time,
+        "heavy_modules": json.loads(completed_process.stdout.strip().splitlines()[-1])
+    }
+
+
+def benchmark_scripts_dir(scripts_dir: Path, repeats: int) -> Dict[str, Dict]:
+    """
+    Time each entry path of the scripts dir, cold and warm
+    :param scripts_dir:
+    :param repeats:
+    :return:
+    """
+    results = {}
+    for entry_path_name_iter_, modules_iter_ in ENTRY_PATHS.items():
+        if not all((scripts_dir / f"{module_iter_}.py").is_file() for module_iter_ in modules_iter_):
+            continue
+        cold_times = []
+        warm_times = []
+        heavy_modules = []
+        for _ in range(repeats):
+            with TemporaryDirectory() as pycache_prefix:
+                # The first import compiles every module into the empty cache, the second reads the cache
+                cold_result = time_entry_path(scripts_dir, modules_iter_, Path(pycache_prefix))
+                warm_result = time_entry_path(scripts_dir, modules_iter_, Path(pycache_prefix))
+            cold_times.append(cold_result["seconds"])
+            warm_times.append(warm_result["seconds"])
+            heavy_modules = warm_result["heavy_modules"]
+
+        results[entry_path_name_iter_] = {
+            "cold": statistics.median(cold_times),
+            "warm": statistics.median(warm_times),
+            "heavy_modules": heavy_modules
+        }
+
+    return results
+
+
+def print_results(label: str, results: Dict[str, Dict], baseline_results: Optional[Dict[str, Dict]] = None):
+    """
+    Print the results table of a scripts dir
+    :param label:
+    :param results:
+    :param baseline_results:
+    :return:
+    """
+    print(label)
+    print(f"  {'entry path':<12} {'cold':>8} {'warm':>8} {'warm vs baseline':>18}  imports")
+    for entry_path_name_iter_, result_iter_ in results.items():
+        if baseline_results is not None and entry_path_name_iter_ in baseline_results:
+            baseline_warm = baseline_results[entry_path_name_iter_]["warm"]
+            versus_baseline = f"{result_iter_['warm'] - baseline_warm:+.3f}s"
+        else:
+            versus_baseline = "-"
+        print(
+            f"  {entry_path_name_iter_:<12} "
+            f"{result_iter_['cold']:>7.3f}s "
+            f"{result_iter_['warm']:>7.3f}s "
+            f"{versus_baseline:>18}  "
+            f"{', '.join(result_iter_['heavy_modules']) or '-'}"
+        )
+
+
+def get_args():
+    """
+    Use argparse, to get the arguments from the command line.
+    We collect the following arguments
+    * --baseline-scripts-dir
+    * --repeats
+    :return:
+    """
+    args = argparse.ArgumentParser(
+        description="Time the imports of each entry path of the resample scripts in a fresh interpreter."
+    )
+
+    args.add_argument(
+        "--baseline-scripts-dir",
+        type=str,
+        required=False,
+        help="An earlier scripts directory to compare against. Entry paths missing from it are not compared."
+    )
+    args.add_argument(
+        "--repeats",
+        type=int,
+        default=5,
+        help="The number of times each entry path is timed, the median is reported."
+    )
+
+    return args.parse_args()
+
+
+def main():
+    args = get_args()
+
+    baseline_results = None
+    if args.baseline_scripts_dir is not None:
+        baseline_scripts_dir = Path(args.baseline_scripts_dir).absolute()
+        baseline_results = benchmark_scripts_dir(baseline_scripts_dir, args.repeats)
+        print_results(f"Baseline ({baseline_scripts_dir})", baseline_results)
+
+    print_results(
+        f"Current ({SCRIPTS_DIR})",
+        benchmark_scripts_dir(SCRIPTS_DIR, args.repeats),
+        baseline_results
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+
+"""
+Differential check of the parse and arrow rename engines of update_sample_names_in_parquet_files.py.
+
+Both engines are run over
+* A set of edge case JSON strings (names that are part of other names, escaped quotes, unicode escapes, keys and values)
+* The plot input data JSON strings of a multiqc parquet file, if --parquet-file is given
+
+Each pair of results is compared as strings, both engines serialise every string the same way
+(the string kernel is only used when the strings are serialised by json.dumps with its default arguments).
+The time taken by each engine over the parquet file is reported, the check exits non-zero if the engines disagree.
+
+Not shipped in the container image, run from this directory with
+uv run python3 compare_rename_engines.py --old-sample-name <name> --new-sample-name <name> [--parquet-file multiqc.parquet]
+"""
+
+# Standard imports
+import argparse
+import json
+import sys
+from pathlib import Path
+from time import perf_counter
+from typing import Dict, List
+import pandas as pd
+import pyarrow as pa
+
+# Local imports
+sys.path.append(str(Path(__file__).absolute().parent.parent / "scripts"))
+from update_sample_names_in_parquet_files import PlotInputDataCache  # noqa: E402
+
+
+def get_edge_case_plot_input_data_list(old_sample_name: str) -> List[str]:
+    """
+    Build JSON strings where a token-level replace of the old sample name could go wrong
+    :param old_sample_name:
+    :return:
+    """
+    return [
+        # Key and value matches
+        json.dumps({"data": {old_sample_name: [1, 2, 3]}, "samples": [old_sample_name]}),
+        json.dumps({old_sample_name: {old_sample_name: old_sample_name}}),
+        # Old name as part of another name or string
+        json.dumps({"data": {f"{old_sample_name}_2": 1, old_sample_name: 2}}),
+        json.dumps({"title": f"Sample {old_sample_name} metrics"}),
+        # Old name inside escaped quotes
+        json.dumps({"title": f'"{old_sample_name}"'}),
+        json.dumps({"title": f'\\"{old_sample_name}"'}),
+        # Unicode escapes
+        json.dumps({"data": {old_sample_name: "µm"}}),
+        '{"data": {"' + "".join(f"\\u{ord(char_iter_):04x}" for char_iter_ in old_sample_name) + '": 1}}',
+        # No match
+        json.dumps({"data": {"other": 1}}),
+    ]
+
+
+def compare_engines(plot_input_data_list: List[str], rename_map: Dict[str, str]) -> (int, float, float):
+    """
+    Run both engines over the strings, return the number of disagreeing rows and the time taken by each engine
+    """
+    plot_input_data_array = pa.array(plot_input_data_list, type=pa.large_string())
+
+    engine_results = {}
+    engine_seconds = {}
+    for engine_iter_ in ["parse", "arrow"]:
+        # Disable the cache so that both engines do the full rewrite
+        plot_input_data_cache = PlotInputDataCache(rename_map=rename_map, max_cache_mb=0, engine=engine_iter_)
+        start_time = perf_counter()
+        engine_results[engine_iter_] = plot_input_data_cache.update_plot_input_array(plot_input_data_array).to_pylist()
+        engine_seconds[engine_iter_] = perf_counter() - start_time
+        plot_input_data_cache.print_stats()
+
+    disagreements = 0
+    for plot_input_data_iter_, parse_result_iter_, arrow_result_iter_ in zip(
+        plot_input_data_list, engine_results["parse"], engine_results["arrow"]
+    ):
+        if parse_result_iter_ != arrow_result_iter_:
+            disagreements += 1
+            print(f"Engines disagree on {plot_input_data_iter_[:200]}", file=sys.stderr)
+
+    return disagreements, engine_seconds["parse"], engine_seconds["arrow"]
+
+
+def get_args():
+    """
+    Get the arguments from the command line
+    :return:
+    """
+    args = argparse.ArgumentParser(
+        description="Check the parse and arrow rename engines agree."
+    )
+    args.add_argument(
+        "--parquet-file",
+        type=str,
+        required=False,
+        help="The path to a multiqc parquet file."
+    )
+    args.add_argument(
+        "--old-sample-name",
+        type=str,
+        required=True,
+        help="The sample name to replace."
+    )
+    args.add_argument(
+        "--new-sample-name",
+        type=str,
+        required=True,
+        help="The sample name to replace with."
+    )
+    return args.parse_args()
+
+
+def main():
+    args = get_args()
+
+    rename_map = {
+        args.old_sample_name: args.new_sample_name
+    }
+
+    disagreements, _, _ = compare_engines(
+        get_edge_case_plot_input_data_list(args.old_sample_name),
+        rename_map
+    )
+    print(f"Edge cases: {disagreements} disagreements")
+
+    if args.parquet_file is not None:
+        df = pd.read_parquet(args.parquet_file, columns=['type', 'plot_input_data'])
+        plot_input_data_list = df.loc[df['type'] == 'plot_input', 'plot_input_data'].tolist()
+        parquet_disagreements, parse_seconds, arrow_seconds = compare_engines(plot_input_data_list, rename_map)
+        print(
+            f"{len(plot_input_data_list)} plot input rows: {parquet_disagreements} disagreements, "
+            f"parse engine {parse_seconds:.3f}s, arrow engine {arrow_seconds:.3f}s"
+        )
+        disagreements += parquet_disagreements
+
+    if disagreements > 0:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,178 @@
+#!/usr/bin/env python3
+
+"""
+Local stand-in of the filemanager api, for testing and benchmarking the filemanager helpers of the resample scripts.
+
+Serves the two endpoints the helpers use, over plain http on localhost
+* GET /api/v1/s3?bucket=<bucket>&key=<key>[&key=<key>...][&rowsPerPage=<n>][&page=<n>]
+  the records of the requested keys of the bucket, paginated with a full next url under links.next
+* GET /api/v1/s3/presign/<s3ObjectId>
+  a json string of a fake presigned url
+
+Every request sleeps for --latency-ms first, to stand in for the round trip to the real api,
+and the number of requests to each endpoint is counted.
+
+Run on its own with
+uv run python3 filemanager_stand_in.py --bucket <bucket> --key <key> [--key <key> ...]
+or start it in a thread with start_filemanager_stand_in
+"""
+
+# Standard imports
+import argparse
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from time import sleep
+from typing import Dict, List, Tuple
+from urllib.parse import parse_qs, urlencode, urlparse
+from uuid import uuid4
+
+# Globals
+DEFAULT_ROWS_PER_PAGE = 1000
+
+
+class FilemanagerStandIn(ThreadingHTTPServer):
+    """
+    Holds the s3 object records served by the stand-in, and the request counts of each endpoint
+    """
+    daemon_threads = True
+
+    def __init__(self, server_address: Tuple[str, int], s3_uri_list: List[str], latency_ms: float):
+        super().__init__(server_address, FilemanagerStandInRequestHandler)
+        self.latency_seconds = latency_ms / 1000
+        self.request_counts: Dict[str, int] = {"s3": 0, "presign": 0}
+        self.request_counts_lock = threading.Lock()
+
+        self.s3_objects_by_bucket_and_key: Dict[Tuple[str, str], Dict] = {}
+        for s3_uri_iter_ in s3_uri_list:
+            s3_uri_obj = urlparse(s3_uri_iter_)
+            bucket, key = s3_uri_obj.netloc, s3_uri_obj.path.lstrip("/")
+            self.s3_objects_by_bucket_and_key[(bucket, key)] = {
+                "s3ObjectId": str(uuid4()),
+                "bucket": bucket,
+                "key": key,
+                "eTag": f"\"{uuid4().hex}\""
+            }
+        self.s3_objects_by_id = {
+            s3_object_iter_["s3ObjectId"]: s3_object_iter_
+            for s3_object_iter_ in self.s3_objects_by_bucket_and_key.values()
+        }
+
+    @property
+    def url(self) -> str:
+        return f"http://{self.server_address[0]}:{self.server_address[1]}/api/v1"
+
+    def count_request(self, endpoint_name: str):
+        with self.request_counts_lock:
+            self.request_counts[endpoint_name] += 1
+
+
+class FilemanagerStandInRequestHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    server: FilemanagerStandIn
+
+    def send_json(self, response_json, status: int = 200):
+        response_bytes = json.dumps(response_json).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(response_bytes)))
+        self.end_headers()
+        self.wfile.write(response_bytes)
+
+    def do_GET(self):
+        sleep(self.server.latency_seconds)
+
+        url_obj = urlparse(self.path)
+        query = parse_qs(url_obj.query)
+
+        if url_obj.path == "/api/v1/s3":
+            self.server.count_request("s3")
+            return self.send_s3_objects(url_obj.path, query)
+
+        if url_obj.path.startswith("/api/v1/s3/presign/"):
+            self.server.count_request("presign")
+            s3_object = self.server.s3_objects_by_id.get(url_obj.path.rsplit("/", 1)[-1])
+            if s3_object is None:
+                return self.send_json({"message": "Not found"}, status=404)
+            return self.send_json(
+                f"https://{s3_object['bucket']}.s3.amazonaws.com/{s3_object['key']}?X-Amz-Signature={uuid4().hex}"
+            )
+
+        return self.send_json({"message": f"Unknown endpoint {url_obj.path}"}, status=404)
+
+    def send_s3_objects(self, path: str, query: Dict[str, List[str]]):
+        bucket = query.get("bucket", [""])[0]
+        rows_per_page = int(query.get("rowsPerPage", [DEFAULT_ROWS_PER_PAGE])[0])
+        page = int(query.get("page", ["1"])[0])
+
+        results = [
+            self.server.s3_objects_by_bucket_and_key[(bucket, key_iter_)]
+            for key_iter_ in query.get("key", [])
+            if (bucket, key_iter_) in self.server.s3_objects_by_bucket_and_key
+        ]
+        page_results = results[(page - 1) * rows_per_page:page * rows_per_page]
+
+        next_url = None
+        if page * rows_per_page < len(results):
+            next_url = (
+                f"http://{self.headers['Host']}{path}?" +
+                urlencode({**query, "page": [str(page + 1)]}, doseq=True)
+            )
+
+        return self.send_json({
+            "links": {"previous": None, "next": next_url},
+            "pagination": {"count": len(results), "page": page, "rowsPerPage": rows_per_page},
+            "results": page_results
+        })
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_filemanager_stand_in(s3_uri_list: List[str], latency_ms: float = 0, port: int = 0) -> FilemanagerStandIn:
+    """
+    Start the stand-in in a background thread, port 0 picks a free port
+    :param s3_uri_list:
+    :param latency_ms:
+    :param port:
+    :return:
+    """
+    filemanager_stand_in = FilemanagerStandIn(("127.0.0.1", port), s3_uri_list, latency_ms)
+    threading.Thread(target=filemanager_stand_in.serve_forever, daemon=True).start()
+    return filemanager_stand_in
+
+
+def get_args():
+    """
+    Use argparse, to get the arguments from the command line.
+    We collect the following arguments
+    * --bucket
+    * --key
+    * --latency-ms
+    * --port
+    :return:
+    """
+    args = argparse.ArgumentParser(description="Serve a local stand-in of the filemanager api.")
+
+    args.add_argument("--bucket", type=str, required=True, help="The bucket of the keys.")
+    args.add_argument("--key", type=str, action="append", default=[], help="A key to serve, may be repeated.")
+    args.add_argument("--latency-ms", type=float, default=0, help="The latency added to every request.")
+    args.add_argument("--port", type=int, default=8080, help="The port to serve on. Defaults to 8080.")
+
+    return args.parse_args()
+
+
+def main():
+    args = get_args()
+
+    filemanager_stand_in = FilemanagerStandIn(
+        ("127.0.0.1", args.port),
+        [f"s3://{args.bucket}/{key_iter_}" for key_iter_ in args.key],
+        args.latency_ms
+    )
+    print(f"Serving the filemanager stand-in at {filemanager_stand_in.url}")
+    filemanager_stand_in.serve_forever()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,230 @@
+#!/usr/bin/env python3
+
+"""
+Given a cache uri, and either the uris of the resampled multiqc parquet files of this run under it
+or the number of files this run resampled,
+download each <cacheUri>/<fastqId>/multiqc.parquet file to <outputDir>/<fastqId>.parquet
+
+We collect the download urls of the whole cache folder in a single api call,
+then download the multiqc parquet files in parallel.
+
+With a list of uris, exactly the requested files are downloaded,
+files left under the cache folder by earlier attempts are ignored, and we fail if any requested file is missing.
+
+With an expected file count, every <fastqId>/multiqc.parquet file directly under the cache uri is downloaded,
+and we fail if the number found differs, so files left by earlier attempts are never merged silently.
+The count is used by the state machine, as a list of hundreds of uris does not fit in the ECS container overrides.
+"""
+
+# Standard imports
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from shutil import copyfileobj
+from typing import List, Optional
+from urllib.request import urlopen
+
+# Wrapica imports
+from wrapica.project_data import (
+    convert_uri_to_project_data_obj,
+    create_download_urls
+)
+
+# Globals
+MULTIQC_PARQUET_NAME = "multiqc.parquet"
+DEFAULT_MAX_PARALLEL_DOWNLOADS = 8
+
+
+def download_file(url: str, output_path: Path):
+    """
+    Download a presigned url to a local file
+    :param url:
+    :param output_path:
+    :return:
+    """
+    with urlopen(url) as response_h, open(output_path, "wb") as output_h:
+        copyfileobj(response_h, output_h)
+
+
+def get_relative_paths(cache_uri: str, parquet_file_uri_list: List[str]) -> List[Path]:
+    """
+    Get the path of each parquet file uri relative to the cache uri
+    :param cache_uri:
+    :param parquet_file_uri_list:
+    :return:
+    """
+    cache_uri = cache_uri.rstrip("/") + "/"
+
+    relative_paths = []
+    for parquet_file_uri_iter_ in dict.fromkeys(parquet_file_uri_list):
+        if not parquet_file_uri_iter_.startswith(cache_uri):
+            raise ValueError(f"{parquet_file_uri_iter_} is not under the cache uri {cache_uri}")
+        relative_paths.append(Path(parquet_file_uri_iter_[len(cache_uri):]))
+
+    return relative_paths
+
+
+def download_multiqc_parquet_files_from_icav2(
+        cache_uri: str,
+        output_dir: Path,
+        parquet_file_uri_list: Optional[List[str]] = None,
+        expected_file_count: Optional[int] = None,
+        max_parallel_downloads: int = DEFAULT_MAX_PARALLEL_DOWNLOADS
+) -> List[Path]:
+    """
+    Collect the download urls of the cache folder and download the per fastq multiqc parquet files,
+    either the requested files, or every <fastqId>/multiqc.parquet file when we are given the expected count
+    :param cache_uri:
+    :param output_dir:
+    :param parquet_file_uri_list: The uris of the parquet files to download, each under the cache uri
+    :param expected_file_count: The number of <fastqId>/multiqc.parquet files expected under the cache uri
+    :param max_parallel_downloads:
+    :return: The paths of the downloaded parquet files
+    """
+    if (parquet_file_uri_list is None) == (expected_file_count is None):
+        raise ValueError("Exactly one of parquet_file_uri_list and expected_file_count is required")
+
+    output_dir.mkdir(parents=True, exist_ok=True)
+
+    relative_paths = None
+    if parquet_file_uri_list is not None:
+        relative_paths = get_relative_paths(cache_uri, parquet_file_uri_list)
+        if len(relative_paths) == 0:
+            raise ValueError("No multiqc parquet files were requested")
+
+    # Get the cache folder object
+    cache_folder_object = convert_uri_to_project_data_obj(cache_uri)
+    cache_folder_path = Path(cache_folder_object.data.details.path)
+
+    # Collect the download urls of every file under the cache folder
+    download_urls_by_relative_path = {
+        Path(data_url_with_path_iter_.path).relative_to(cache_folder_path): data_url_with_path_iter_.url
+        for data_url_with_path_iter_ in create_download_urls(
+            project_id=str(cache_folder_object.project_id),
+            folder_id=str(cache_folder_object.data.id),
+            recursive=True
+        )
+    }
+
+    # Without a list, take every per fastq parquet file, the count must match this run
+    if relative_paths is None:
+        relative_paths = sorted(
+            relative_path_iter_
+            for relative_path_iter_ in download_urls_by_relative_path.keys()
+            if len(relative_path_iter_.parts) == 2 and relative_path_iter_.name == MULTIQC_PARQUET_NAME
+        )
+        if len(relative_paths) != expected_file_count:
+            raise ValueError(
+                f"Expected {expected_file_count} multiqc parquet files under {cache_uri} "
+                f"but found {len(relative_paths)}: {', '.join(map(str, relative_paths))}"
+            )
+
+    # Only download the requested files, every one of them must be present
+    missing_relative_paths = [
+        relative_path_iter_
+        for relative_path_iter_ in relative_paths
+        if relative_path_iter_ not in download_urls_by_relative_path
+    ]
+    if len(missing_relative_paths) > 0:
+        raise FileNotFoundError(
+            f"Could not find {len(missing_relative_paths)} of {len(relative_paths)} multiqc parquet files "
+            f"under {cache_uri}: {', '.join(map(str, missing_relative_paths))}"
+        )
+
+    # Name each download after its folders under the cache uri, i.e. <fastqId>.parquet
+    download_jobs = [
+        (
+            download_urls_by_relative_path[relative_path_iter_],
+            output_dir / f"{'__'.join(relative_path_iter_.parent.parts) or relative_path_iter_.stem}.parquet"
+        )
+        for relative_path_iter_ in relative_paths
+    ]
+
+    print(f"Downloading {len(download_jobs)} multiqc parquet files from {cache_uri}")
+
+    with ThreadPoolExecutor(max_workers=max_parallel_downloads) as executor:
+        # Consume the results so that any download errors are raised
+        list(executor.map(lambda download_job_iter_: download_file(*download_job_iter_), download_jobs))
+
+    return [
+        output_path_iter_
+        for _, output_path_iter_ in download_jobs
+    ]
+
+
+def get_args():
+    """
+    Use argparse, to get the arguments from the command line.
+    We collect the following arguments
+    * --cache-uri
+    * --parquet-file-uri or --expected-file-count
+    * --output-dir
+    * --max-parallel-downloads
+    :return:
+    """
+    # Get args
+    args = argparse.ArgumentParser(
+        description="Download the per fastq multiqc parquet files under a cache uri."
+    )
+
+    args.add_argument(
+        "--cache-uri",
+        type=str,
+        required=True,
+        help="The cache uri, multiqc parquet files are expected at <cacheUri>/<fastqId>/multiqc.parquet."
+    )
+    args.add_argument(
+        "--parquet-file-uri",
+        type=str,
+        action="append",
+        required=False,
+        help="The uri of a multiqc parquet file under the cache uri to download, may be repeated."
+    )
+    args.add_argument(
+        "--expected-file-count",
+        type=int,
+        required=False,
+        help=(
+            "Download every <fastqId>/multiqc.parquet file under the cache uri, failing if this many are not found. "
+            "Alternative to --parquet-file-uri."
+        )
+    )
+    args.add_argument(
+        "--output-dir",
+        type=str,
+        required=True,
+        help="The directory to download the parquet files to, files are named <fastqId>.parquet."
+    )
+    args.add_argument(
+        "--max-parallel-downloads",
+        type=int,
+        default=DEFAULT_MAX_PARALLEL_DOWNLOADS,
+        help=f"The number of files to download at once. Defaults to {DEFAULT_MAX_PARALLEL_DOWNLOADS}."
+    )
+
+    parsed_args = args.parse_args()
+
+    if (parsed_args.parquet_file_uri is None) == (parsed_args.expected_file_count is None):
+        args.error("Exactly one of --parquet-file-uri and --expected-file-count is required")
+
+    return parsed_args
+
+
+def main():
+    """
+    Download the per fastq multiqc parquet files under the cache uri
+    :return:
+    """
+    args = get_args()
+
+    download_multiqc_parquet_files_from_icav2(
+        cache_uri=args.cache_uri,
+        output_dir=Path(args.output_dir),
+        parquet_file_uri_list=args.parquet_file_uri,
+        expected_file_count=args.expected_file_count,
+        max_parallel_downloads=args.max_parallel_downloads
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,286 @@
+#!/usr/bin/env python3
+
+"""
+Filemanager helpers of the resample task
+
+Resolve s3 uris to their filemanager s3 object records, and s3 object ids to presigned urls.
+
+resolve_s3_uris resolves a whole list of s3 uris at once, rather than making two round trips per uri in turn:
+* The keys of each bucket are queried in chunks, the key query parameter is repeated for each key of the chunk,
+  and every page of the results is collected
+* Any uri the chunked queries did not return is looked up on its own, so a uri is only missing if its own lookup fails
+* The presigned urls are then requested, with at most max_parallel_requests requests in flight at once
+
+Only urllib3 is needed, so the helpers can be used from a lambda as well as the container.
+The filemanager url is passed in, so they can also be pointed at a local stand-in of the filemanager api.
+"""
+
+# Standard imports
+from concurrent.futures import ThreadPoolExecutor
+from itertools import chain
+from typing import Dict, List, Optional, Sequence, Tuple, Union
+from urllib.parse import urlparse
+
+# HTTP imports
+from urllib3 import PoolManager
+from urllib3.util import Retry
+
+# Globals
+MAX_RETRIES = 5
+DEFAULT_MAX_PARALLEL_REQUESTS = 8
+DEFAULT_KEYS_PER_REQUEST = 50
+DEFAULT_ROWS_PER_PAGE = 1000
+
+# Reused for every filemanager request of the process
+HTTP_POOL_MANAGER = PoolManager(
+    maxsize=DEFAULT_MAX_PARALLEL_REQUESTS,
+    retries=Retry(
+        total=MAX_RETRIES,
+        backoff_factor=1,
+        status_forcelist=[429, 500, 502, 503, 504]
+    )
+)
+
+# Query parameters, a list of pairs so that a parameter may be repeated
+QueryFields = Union[Dict[str, str], Sequence[Tuple[str, str]]]
+
+
+def get_filemanager_url(hostname: str) -> str:
+    """
+    Get the filemanager api url of the hostname
+    :param hostname:
+    :return:
+    """
+    return f"https://file.{hostname}/api/v1"
+
+
+def get_standard_s3_uri(s3_uri: str) -> str:
+    """
+    Get the s3://bucket/key form of an s3 uri, the form used for the keys of resolve_s3_uris
+    :param s3_uri:
+    :return:
+    """
+    s3_uri_obj = urlparse(s3_uri)
+    return f"s3://{s3_uri_obj.netloc}/{s3_uri_obj.path.lstrip('/')}"
+
+
+def get_filemanager_json(
+        filemanager_url: str,
+        orcabus_token: str,
+        endpoint: str,
+        fields: Optional[QueryFields] = None
+):
+    """
+    Get a filemanager endpoint, or the full url of a page of an endpoint
+    :param filemanager_url:
+    :param orcabus_token:
+    :param endpoint:
+    :param fields:
+    :return:
+    """
+    response = HTTP_POOL_MANAGER.request(
+        "GET",
+        endpoint if urlparse(endpoint).scheme else f"{filemanager_url}/{endpoint}",
+        fields=fields,
+        headers={
+            "Accept": "application/json",
+            "Authorization": f"Bearer {orcabus_token}"
+        }
+    )
+
+    if not 200 <= response.status < 300:
+        raise RuntimeError(
+            f"Filemanager request to {endpoint} failed with status {response.status}. "
+            f"Response was {response.data.decode()}"
+        )
+
+    return response.json()
+
+
+def get_filemanager_results(
+        filemanager_url: str,
+        orcabus_token: str,
+        endpoint: str,
+        fields: Optional[QueryFields] = None
+) -> List[Dict]:
+    """
+    Get the results of every page of a filemanager list endpoint, following the next link of each page
+    :param filemanager_url:
+    :param orcabus_token:
+    :param endpoint:
+    :param fields:
+    :return:
+    """
+    response_json = get_filemanager_json(filemanager_url, orcabus_token, endpoint, fields)
+    results = list(response_json["results"])
+
+    while (response_json.get("links") or {}).get("next"):
+        response_json = get_filemanager_json(filemanager_url, orcabus_token, response_json["links"]["next"])
+        results.extend(response_json["results"])
+
+    return results
+
+
+def get_s3_object_from_s3_uri(filemanager_url: str, orcabus_token: str, s3_uri: str) -> Dict:
+    """
+    Get the filemanager s3 object record of an s3 uri
+    :param filemanager_url:
+    :param orcabus_token:
+    :param s3_uri:
+    :return:
+    """
+    s3_uri_obj = urlparse(s3_uri)
+
+    results = get_filemanager_json(
+        filemanager_url, orcabus_token, "s3",
+        fields={
+            "bucket": s3_uri_obj.netloc,
+            "key": s3_uri_obj.path.lstrip("/")
+        }
+    )["results"]
+
+    if len(results) == 0:
+        raise FileNotFoundError(f"Could not find {s3_uri} in the filemanager")
+
+    return results[0]
+
+
+def get_s3_object_from_s3_uri_if_exists(filemanager_url: str, orcabus_token: str, s3_uri: str) -> Optional[Dict]:
+    """
+    Get the filemanager s3 object record of an s3 uri, or None if it is not in the filemanager
+    :param filemanager_url:
+    :param orcabus_token:
+    :param s3_uri:
+    :return:
+    """
+    try:
+        return get_s3_object_from_s3_uri(filemanager_url, orcabus_token, s3_uri)
+    except FileNotFoundError:
+        return None
+
+
+def get_presigned_url_from_s3_object_id(filemanager_url: str, orcabus_token: str, s3_object_id: str) -> str:
+    """
+    Get the presigned url of an s3 object id through the filemanager
+    :param filemanager_url:
+    :param orcabus_token:
+    :param s3_object_id:
+    :return:
+    """
+    return get_filemanager_json(
+        filemanager_url, orcabus_token, f"s3/presign/{s3_object_id}",
+        fields={
+            "responseContentDisposition": "inline"
+        }
+    )
+
+
+def get_s3_objects_from_bucket_and_keys(
+        filemanager_url: str,
+        orcabus_token: str,
+        bucket: str,
+        keys: List[str]
+) -> List[Dict]:
+    """
+    Get the filemanager s3 object records of several keys of a bucket in a single paginated query
+    :param filemanager_url:
+    :param orcabus_token:
+    :param bucket:
+    :param keys:
+    :return:
+    """
+    return get_filemanager_results(
+        filemanager_url, orcabus_token, "s3",
+        fields=[
+            ("bucket", bucket),
+            *[("key", key_iter_) for key_iter_ in keys],
+            ("rowsPerPage", str(DEFAULT_ROWS_PER_PAGE))
+        ]
+    )
+
+
+def resolve_s3_uris(
+        filemanager_url: str,
+        orcabus_token: str,
+        s3_uri_list: List[str],
+        presign: bool = True,
+        max_parallel_requests: int = DEFAULT_MAX_PARALLEL_REQUESTS,
+        keys_per_request: int = DEFAULT_KEYS_PER_REQUEST
+) -> Dict[str, Dict]:
+    """
+    Resolve a list of s3 uris to their filemanager s3 object records,
+    adding the presigned url of each object as 'presignedUrl' if presign is set.
+    :param filemanager_url:
+    :param orcabus_token:
+    :param s3_uri_list:
+    :param presign:
+    :param max_parallel_requests:
+    :param keys_per_request:
+    :return: The s3 object record of each unique s3 uri, keyed by s3 uri (in s3://bucket/key form),
+             uris that are not in the filemanager are left out
+    """
+    # Group the unique keys by bucket, a dict keeps the order of the uris and gives fast membership checks
+    s3_uris = dict.fromkeys(
+        get_standard_s3_uri(s3_uri_iter_)
+        for s3_uri_iter_ in s3_uri_list
+    )
+    keys_by_bucket: Dict[str, List[str]] = {}
+    for s3_uri_iter_ in s3_uris:
+        s3_uri_obj = urlparse(s3_uri_iter_)
+        keys_by_bucket.setdefault(s3_uri_obj.netloc, []).append(s3_uri_obj.path.lstrip("/"))
+
+    key_chunks = [
+        (bucket_iter_, keys_iter_[chunk_start_iter_:chunk_start_iter_ + keys_per_request])
+        for bucket_iter_, keys_iter_ in keys_by_bucket.items()
+        for chunk_start_iter_ in range(0, len(keys_iter_), keys_per_request)
+    ]
+
+    with ThreadPoolExecutor(max_workers=max_parallel_requests) as executor:
+        # Query the keys of each bucket in chunks, keeping the first record of each key as a single lookup would
+        s3_objects_by_uri: Dict[str, Dict] = {}
+        for s3_object_iter_ in chain.from_iterable(
+            executor.map(
+                lambda key_chunk_iter_: get_s3_objects_from_bucket_and_keys(
+                    filemanager_url, orcabus_token, *key_chunk_iter_
+                ),
+                key_chunks
+            )
+        ):
+            s3_uri = f"s3://{s3_object_iter_['bucket']}/{s3_object_iter_['key']}"
+            if s3_uri in s3_uris:
+                s3_objects_by_uri.setdefault(s3_uri, s3_object_iter_)
+
+        # Look up any uri the chunked queries did not return on its own
+        missing_s3_uris = [
+            s3_uri_iter_
+            for s3_uri_iter_ in s3_uris
+            if s3_uri_iter_ not in s3_objects_by_uri
+        ]
+        for s3_uri_iter_, s3_object_iter_ in zip(
+            missing_s3_uris,
+            executor.map(
+                lambda s3_uri_iter_: get_s3_object_from_s3_uri_if_exists(filemanager_url, orcabus_token, s3_uri_iter_),
+                missing_s3_uris
+            )
+        ):
+            if s3_object_iter_ is not None:
+                s3_objects_by_uri[s3_uri_iter_] = s3_object_iter_
+
+        # Presign each object found
+        if presign:
+            found_s3_uris = list(s3_objects_by_uri.keys())
+            for s3_uri_iter_, presigned_url_iter_ in zip(
+                found_s3_uris,
+                executor.map(
+                    lambda s3_uri_iter_: get_presigned_url_from_s3_object_id(
+                        filemanager_url, orcabus_token, s3_objects_by_uri[s3_uri_iter_]["s3ObjectId"]
+                    ),
+                    found_s3_uris
+                )
+            ):
+                s3_objects_by_uri[s3_uri_iter_] = {
+                    **s3_objects_by_uri[s3_uri_iter_],
+                    "presignedUrl": presigned_url_iter_
+                }
+
+    return s3_objects_by_uri
@@ -0,0 +1,299 @@
+#!/usr/bin/env python3
+
+"""
+Given a directory of multiqc parquet files, merge them into a single deduplicated parquet file
+
+Steps are as follows:
+* Collect the arrow schema of each parquet file, without the pandas metadata
+* Unify the schemas, columns missing from a file are filled with nulls,
+  columns with different types across files are promoted to a common type
+* Read each parquet file one batch at a time, align the batch to the unified schema
+* Drop rows we have already written, rows are first compared by a hash of all of their values,
+  a row whose hash matches a written row is then compared value by value against that row,
+  read back from its input file, so a hash collision never drops a distinct row
+* Nested columns (lists, structs, maps), which pandas cannot hash, are hashed and compared by their JSON form
+* Write each batch to a ParquetWriter, so peak memory is bounded by the batch size rather than the number of files,
+  the hash and input file location of each written row, and the last ROW_GROUP_CACHE_SIZE row groups read back
+
+Files are read in sorted order, so the output is the same for the same set of input files.
+"""
+
+# Standard imports
+import argparse
+import json
+import sys
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, List, Tuple
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+
+# Globals
+DEFAULT_BATCH_SIZE = 65536
+# Number of decoded row groups kept to compare rows with matching hashes against,
+# duplicate rows tend to repeat the rows of the same earlier files
+ROW_GROUP_CACHE_SIZE = 4
+
+
+def get_unified_schema(parquet_file_paths: List[Path]) -> pa.Schema:
+    """
+    Given a list of parquet files, return a schema that all files can be cast to.
+    Columns are ordered by their first appearance.
+    :param parquet_file_paths:
+    :return:
+    """
+    return pa.unify_schemas(
+        [
+            pq.read_schema(parquet_file_path_iter_).remove_metadata()
+            for parquet_file_path_iter_ in parquet_file_paths
+        ],
+        promote_options="permissive"
+    )
+
+
+def align_record_batch_to_schema(
+        record_batch: pa.RecordBatch,
+        schema: pa.Schema
+) -> pa.RecordBatch:
+    """
+    Given a record batch, reorder and cast its columns to the schema, adding null columns for any that are missing
+    :param record_batch:
+    :param schema:
+    :return:
+    """
+    return pa.RecordBatch.from_arrays(
+        [
+            (
+                pc.cast(record_batch.column(field_iter_.name), field_iter_.type)
+                if field_iter_.name in record_batch.schema.names
+                else pa.nulls(record_batch.num_rows, type=field_iter_.type)
+            )
+            for field_iter_ in schema
+        ],
+        schema=schema
+    )
+
+
+def get_row_hashes(record_batch: pa.RecordBatch) -> np.ndarray:
+    """
+    Given a record batch, return a hash of the values of each row.
+    Nested columns are hashed by the JSON form of their values, as pandas cannot hash lists or dicts
+    :param record_batch:
+    :return:
+    """
+    df = record_batch.to_pandas()
+    for field_index_iter_, field_iter_ in enumerate(record_batch.schema):
+        if pa.types.is_nested(field_iter_.type):
+            df.isetitem(field_index_iter_, [
+                json.dumps(value_iter_, sort_keys=True, default=str)
+                for value_iter_ in record_batch.column(field_index_iter_).to_pylist()
+            ])
+
+    return pd.util.hash_pandas_object(df, index=False).to_numpy()
+
+
+def get_row_key(record_batch: pa.RecordBatch, row_index: int) -> str:
+    """
+    Given a record batch and a row index, return the JSON form of the values of the row, to compare rows by.
+    NaN values are written as NaN, so NaN values compare equal, as they do in the row hashes
+    :param record_batch:
+    :param row_index:
+    :return:
+    """
+    return json.dumps(record_batch.slice(row_index, 1).to_pylist()[0], sort_keys=True, default=str)
+
+
+class SeenRows:
+    """
+    The rows already written, as the hash of their values and where they were read from,
+    rather than the rows themselves.
+
+    A row whose hash matches a seen row is only dropped once it is equal to the seen row,
+    read back from its input file, the last ROW_GROUP_CACHE_SIZE row groups read back are kept.
+    """
+    def __init__(self, parquet_file_paths: List[Path], schema: pa.Schema):
+        self.parquet_file_paths = parquet_file_paths
+        self.schema = schema
+
+        # Row hash -> (file index, row group index, row index in the row group) of each distinct row with the hash
+        self.row_locations: Dict[int, List[Tuple[int, int, int]]] = {}
+
+        # (file index, row group index) -> row group, aligned to the schema
+        self.row_group_cache: OrderedDict[Tuple[int, int], pa.RecordBatch] = OrderedDict()
+
+        # Counters
+        self.hash_collisions = 0
+
+    def get_row_group(self, file_index: int, row_group_index: int) -> pa.RecordBatch:
+        """
+        Read a row group back from its input file, from the row group cache if recently read
+        :param file_index:
+        :param row_group_index:
+        :return:
+        """
+        row_group_key = (file_index, row_group_index)
+        if row_group_key in self.row_group_cache:
+            self.row_group_cache.move_to_end(row_group_key)
+            return self.row_group_cache[row_group_key]
+
+        with pq.ParquetFile(self.parquet_file_paths[file_index]) as parquet_file:
+            row_group = align_record_batch_to_schema(
+                parquet_file.read_row_group(row_group_index).combine_chunks().to_batches()[0],
+                self.schema
+            )
+
+        self.row_group_cache[row_group_key] = row_group
+        if len(self.row_group_cache) > ROW_GROUP_CACHE_SIZE:
+            self.row_group_cache.popitem(last=False)
+
+        return row_group
+
+    def get_new_rows_mask(
+            self,
+            record_batch: pa.RecordBatch,
+            file_index: int,
+            row_group_index: int,
+            row_offset: int
+    ) -> np.ndarray:
+        """
+        Given a record batch of a row group, return a mask of the rows not yet seen, adding them to the seen rows
+        :param record_batch: The record batch, aligned to the schema
+        :param file_index: The index of the input file of the record batch
+        :param row_group_index: The index of the row group of the record batch
+        :param row_offset: The index of the first row of the record batch in the row group
+        :return:
+        """
+        row_hashes = get_row_hashes(record_batch)
+
+        new_rows_mask = np.zeros(len(row_hashes), dtype=bool)
+        for row_index_iter_, row_hash_iter_ in enumerate(row_hashes.tolist()):
+            row_location = (file_index, row_group_index, row_offset + row_index_iter_)
+
+            seen_row_locations = self.row_locations.get(row_hash_iter_)
+            if seen_row_locations is None:
+                self.row_locations[row_hash_iter_] = [row_location]
+                new_rows_mask[row_index_iter_] = True
+                continue
+
+            # Compare the values of the row against each seen row with the same hash
+            row_key = get_row_key(record_batch, row_index_iter_)
+            if any(
+                get_row_key(
+                    self.get_row_group(seen_file_index_iter_, seen_row_group_index_iter_),
+                    seen_row_index_iter_
+                ) == row_key
+                for seen_file_index_iter_, seen_row_group_index_iter_, seen_row_index_iter_ in seen_row_locations
+            ):
+                continue
+
+            self.hash_collisions += 1
+            seen_row_locations.append(row_location)
+            new_rows_mask[row_index_iter_] = True
+
+        return new_rows_mask
+
+
+def merge_parquet_files(
+        parquet_file_paths: List[Path],
+        output_parquet_file: Path,
+        batch_size: int = DEFAULT_BATCH_SIZE
+):
+    """
+    Merge the parquet files into the output parquet file, dropping duplicate rows
+    :param parquet_file_paths:
+    :param output_parquet_file:
+    :param batch_size:
+    :return:
+    """
+    schema = get_unified_schema(parquet_file_paths)
+    seen_rows = SeenRows(parquet_file_paths=parquet_file_paths, schema=schema)
+    input_row_count = 0
+    output_row_count = 0
+
+    with pq.ParquetWriter(output_parquet_file, schema=schema) as parquet_writer:
+        for file_index_iter_, parquet_file_path_iter_ in enumerate(parquet_file_paths):
+            with pq.ParquetFile(parquet_file_path_iter_) as parquet_file:
+                # Read each row group on its own, so each row can be found again by its row group
+                for row_group_index_iter_ in range(parquet_file.num_row_groups):
+                    row_offset = 0
+                    for record_batch_iter_ in parquet_file.iter_batches(
+                            batch_size=batch_size,
+                            row_groups=[row_group_index_iter_]
+                    ):
+                        record_batch_iter_ = align_record_batch_to_schema(record_batch_iter_, schema)
+                        new_record_batch = record_batch_iter_.filter(
+                            pa.array(seen_rows.get_new_rows_mask(
+                                record_batch_iter_,
+                                file_index=file_index_iter_,
+                                row_group_index=row_group_index_iter_,
+                                row_offset=row_offset
+                            ))
+                        )
+                        row_offset += record_batch_iter_.num_rows
+                        input_row_count += record_batch_iter_.num_rows
+                        output_row_count += new_record_batch.num_rows
+                        if new_record_batch.num_rows > 0:
+                            parquet_writer.write_batch(new_record_batch)
+
+    print(
+        f"Merged {len(parquet_file_paths)} parquet files, "
+        f"{input_row_count} rows in, {output_row_count} rows out, "
+        f"{seen_rows.hash_collisions} hash collisions between distinct rows",
+        file=sys.stderr
+    )
+
+
+def get_args():
+    """
+    Use argparse, to get the arguments from the command line.
+    We collect the following arguments
+    * --input-dir
+    * --output-parquet-file
+    :return:
+    """
+    # Get args
+    args = argparse.ArgumentParser(
+        description="Merge a directory of multiqc parquet files into a single deduplicated parquet file."
+    )
+
+    # IO
+    args.add_argument(
+        "--input-dir",
+        type=str,
+        required=True,
+        help="The directory of parquet files to merge, all files ending in .parquet are merged."
+    )
+    args.add_argument(
+        "--output-parquet-file",
+        type=str,
+        required=True,
+        help="The path to the merged parquet file."
+    )
+
+    return args.parse_args()
+
+
+def main():
+    """
+    Given a directory of parquet files, merge them into a single parquet file
+    :return:
+    """
+    # Get args
+    args = get_args()
+
+    # Collect the parquet files
+    parquet_file_paths = sorted(Path(args.input_dir).glob("*.parquet"))
+    if len(parquet_file_paths) == 0:
+        raise ValueError(f"No parquet files found in {args.input_dir}")
+
+    merge_parquet_files(
+        parquet_file_paths=parquet_file_paths,
+        output_parquet_file=Path(args.output_parquet_file)
+    )
+
+
+if __name__ == "__main__":
+    main()
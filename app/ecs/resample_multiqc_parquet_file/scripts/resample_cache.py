@@ -0,0 +1,175 @@
+#!/usr/bin/env python3
+
+"""
+Check or write the resample cache sidecar of a resampled multiqc parquet file
+
+The sidecar <outputUri>.cache.json sits next to the resampled file and has the following structure:
+
+{
+  // Key made from the input object etag, the sample renames and the version of the resample scripts and libraries
+  "cacheKey": "sha256 hexdigest",
+  // The data id of the resampled file the key was written for
+  "outputDataId": "fil.abcdef"
+}
+
+check - prints 'true' if the sidecar key matches the given key,
+        and the resampled file it was written for is still in place and available, otherwise prints 'false'
+write - writes the sidecar for the resampled file currently at the output uri, replacing any existing sidecar
+"""
+
+# Standard imports
+import argparse
+import json
+from io import StringIO
+from pathlib import Path
+from typing import Optional
+
+# Wrapica imports
+from wrapica.project_data import (
+    convert_uri_to_project_data_obj,
+    read_icav2_file_contents_to_string,
+    write_icav2_file_contents
+)
+
+# Local imports
+from upload_file_to_icav2 import delete_project_data_and_wait, get_data_status
+
+# Globals
+CACHE_SIDECAR_SUFFIX = ".cache.json"
+
+
+def get_data_obj_if_exists(data_uri: str):
+    """
+    Get the project data object of the uri, or None if it does not exist
+    :param data_uri:
+    :return:
+    """
+    try:
+        return convert_uri_to_project_data_obj(
+            data_uri=data_uri,
+            create_data_if_not_found=False
+        )
+    except FileNotFoundError:
+        return None
+
+
+def get_sidecar_contents(output_uri: str) -> Optional[dict]:
+    """
+    Read the sidecar of an output uri, or None if there is no sidecar
+    :param output_uri:
+    :return:
+    """
+    sidecar_data_obj = get_data_obj_if_exists(output_uri + CACHE_SIDECAR_SUFFIX)
+    if sidecar_data_obj is None:
+        return None
+
+    return json.loads(
+        read_icav2_file_contents_to_string(
+            project_id=str(sidecar_data_obj.project_id),
+            data_id=str(sidecar_data_obj.data.id)
+        )
+    )
+
+
+def check_cache(output_uri: str, cache_key: str) -> bool:
+    """
+    Check if the resampled file at the output uri was written with the same cache key
+    :param output_uri:
+    :param cache_key:
+    :return:
+    """
+    sidecar_contents = get_sidecar_contents(output_uri)
+    if sidecar_contents is None or sidecar_contents.get("cacheKey") != cache_key:
+        return False
+
+    # Confirm the file the sidecar was written for is the one in place, and it has finished uploading
+    output_data_obj = get_data_obj_if_exists(output_uri)
+    return (
+        output_data_obj is not None and
+        str(output_data_obj.data.id) == sidecar_contents.get("outputDataId") and
+        get_data_status(output_data_obj) == "AVAILABLE"
+    )
+
+
+def write_cache(output_uri: str, cache_key: str):
+    """
+    Write the sidecar of the resampled file at the output uri
+    :param output_uri:
+    :param cache_key:
+    :return:
+    """
+    output_data_obj = convert_uri_to_project_data_obj(output_uri)
+
+    # Delete the existing sidecar first, we cannot create a file over an existing one
+    sidecar_data_obj = get_data_obj_if_exists(output_uri + CACHE_SIDECAR_SUFFIX)
+    if sidecar_data_obj is not None:
+        # Don't move on until file is deleted from database
+        delete_project_data_and_wait(
+            project_id=str(sidecar_data_obj.project_id),
+            data_id=str(sidecar_data_obj.data.id),
+            data_path=Path(str(sidecar_data_obj.data.details.path))
+        )
+
+    write_icav2_file_contents(
+        project_id=str(output_data_obj.project_id),
+        data_path=Path(str(output_data_obj.data.details.path) + CACHE_SIDECAR_SUFFIX),
+        file_stream_or_path=StringIO(
+            json.dumps({
+                "cacheKey": cache_key,
+                "outputDataId": str(output_data_obj.data.id)
+            })
+        )
+    )
+
+
+def get_args():
+    """
+    Use argparse, to get the arguments from the command line.
+    We collect the following arguments
+    * command, one of check, write
+    * --output-uri
+    * --cache-key
+    :return:
+    """
+    # Get args
+    args = argparse.ArgumentParser(
+        description="Check or write the resample cache sidecar of a resampled multiqc parquet file."
+    )
+
+    args.add_argument(
+        "command",
+        choices=["check", "write"],
+        help="Check the sidecar matches the cache key, or write the sidecar with the cache key."
+    )
+    args.add_argument(
+        "--output-uri",
+        type=str,
+        required=True,
+        help="The uri of the resampled multiqc parquet file."
+    )
+    args.add_argument(
+        "--cache-key",
+        type=str,
+        required=True,
+        help="The cache key of the resample."
+    )
+
+    return args.parse_args()
+
+
+def main():
+    """
+    Check or write the resample cache sidecar
+    :return:
+    """
+    args = get_args()
+
+    if args.command == "check":
+        print(str(check_cache(args.output_uri, args.cache_key)).lower())
+        return
+
+    write_cache(args.output_uri, args.cache_key)
+
+
+if __name__ == "__main__":
+    main()
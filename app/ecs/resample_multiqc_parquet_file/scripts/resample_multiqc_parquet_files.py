@@ -0,0 +1,542 @@
+#!/usr/bin/env python3
+
+"""
+Entry module of the resample multiqc parquet file task.
+
+Resolves the hostname and access tokens, then either resamples a manifest of multiqc parquet files
+or merges a cache folder of resampled multiqc parquet files, all in the one process.
+
+The following environment variables are required
+HOSTNAME_SSM_PARAMETER_NAME - static
+ORCABUS_TOKEN_SECRET_ID - static
+ICAV2_ACCESS_TOKEN_SECRET_ID - static
+
+Then either a manifest of files to resample
+MANIFEST_JSON - dynamic, a json list of {"inputUri", "outputUri", "oldSampleName", "newSampleName"} objects
+  an entry may instead hold a "renameMap" object of old sample name to new sample name,
+  in place of "oldSampleName" and "newSampleName", to rename several samples in one pass
+MANIFEST_URI - dynamic, an s3 uri of a json file with the same structure as MANIFEST_JSON
+MAX_PARALLEL_FILES - optional, the number of files to process at once, defaults to 2
+PARQUET_REWRITE_WORKERS - optional, the number of processes used to rewrite each file, defaults to 1
+
+Or a single file to resample
+INPUT_URI - dynamic
+OUTPUT_URI - dynamic
+OLD_SAMPLE_NAME - dynamic
+NEW_SAMPLE_NAME - dynamic
+
+Each resampled file has a <outputUri>.cache.json sidecar with a key made from the input object etag,
+the sample renames and the version of the resample scripts and libraries,
+files with a matching sidecar are not resampled again
+
+Or a cache uri of already resampled files to merge
+MERGE_CACHE_URI - dynamic, the <cacheUri>/<fastqId>/multiqc.parquet files are merged into <cacheUri>/multiqc.parquet
+MERGE_FILE_COUNT - dynamic, the number of files this run resampled,
+  every <cacheUri>/<fastqId>/multiqc.parquet file is merged, and the merge fails if a different number is found
+MANIFEST_JSON or MANIFEST_URI - dynamic, alternative to MERGE_FILE_COUNT, a json list of the uris of the files to merge,
+  only these files are merged, and the merge fails if any of them is missing under the cache uri
+The state machine passes MERGE_FILE_COUNT, a list of every uri of a large run does not fit in the container overrides
+
+The s3 object ids and presigned urls of every input are resolved in the filemanager at once before the fan out,
+a presigned url is only requested again if the file is reached after PRESIGNED_URL_MAX_AGE_SECONDS.
+
+The time spent in each phase is logged for each file.
+The rename, merge and icav2 modules are imported on first use, so that a file skipped by its cache sidecar
+never imports pyarrow or pandas, and the hostname and tokens are resolved before wrapica is imported.
+When more than one file is resampled at once, each file is resampled in its own process,
+since the rename is bound by the CPU rather than the network.
+"""
+
+# Standard imports
+import hashlib
+import json
+import sys
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from contextlib import contextmanager
+from datetime import datetime
+from functools import partial
+from importlib.metadata import PackageNotFoundError, version as get_package_version
+from os import environ
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from time import perf_counter, time
+from typing import Dict, List, Optional
+
+# AWS imports
+import boto3
+
+# Local imports
+from filemanager import (
+    HTTP_POOL_MANAGER,
+    get_filemanager_url,
+    get_presigned_url_from_s3_object_id,
+    get_s3_object_from_s3_uri,
+    get_standard_s3_uri,
+    resolve_s3_uris
+)
+
+# Globals
+MULTIQC_PARQUET_NAME = "multiqc.parquet"
+DEFAULT_MAX_PARALLEL_FILES = 2
+DEFAULT_PARQUET_REWRITE_WORKERS = 1
+# The scripts and libraries that shape the bytes of a resampled file,
+# their version is part of the resample cache key so that a change to any of them invalidates the cache
+RESAMPLE_SCRIPT_PATHS = [
+    Path(__file__),
+    Path(__file__).parent / "resample_parquet_file.py",
+    Path(__file__).parent / "update_sample_names_in_parquet_files.py",
+]
+RESAMPLE_LIBRARY_NAMES = ["pyarrow", "pandas"]
+# Presigned urls resolved up front are requested again if the file is reached after this long
+PRESIGNED_URL_MAX_AGE_SECONDS = 600
+
+
+def log_stderr(message: str):
+    """
+    Log a timestamped message to stderr
+    :param message:
+    :return:
+    """
+    print(datetime.now().astimezone().isoformat(timespec="seconds"), message, file=sys.stderr, flush=True)
+
+
+@contextmanager
+def time_phase(phase_timings: Dict[str, float], phase_name: str):
+    """
+    Add the time spent in the block to the timings of the phase
+    :param phase_timings:
+    :param phase_name:
+    :return:
+    """
+    start_time = perf_counter()
+    try:
+        yield
+    finally:
+        phase_timings[phase_name] = phase_timings.get(phase_name, 0.0) + perf_counter() - start_time
+
+
+def format_phase_timings(phase_timings: Dict[str, float]) -> str:
+    """
+    Format the phase timings for logging
+    :param phase_timings:
+    :return:
+    """
+    return ", ".join(
+        f"{phase_name_iter_} {phase_seconds_iter_:.2f}s"
+        for phase_name_iter_, phase_seconds_iter_ in phase_timings.items()
+    )
+
+
+def get_hostname(hostname_ssm_parameter_name: str) -> str:
+    """
+    Get the hostname from the ssm parameter
+    :param hostname_ssm_parameter_name:
+    :return:
+    """
+    return boto3.client("ssm").get_parameter(
+        Name=hostname_ssm_parameter_name
+    )["Parameter"]["Value"]
+
+
+def get_orcabus_token(orcabus_token_secret_id: str) -> str:
+    """
+    Get the orcabus id token from the orcabus token secret
+    :param orcabus_token_secret_id:
+    :return:
+    """
+    return json.loads(
+        boto3.client("secretsmanager").get_secret_value(
+            SecretId=orcabus_token_secret_id
+        )["SecretString"]
+    )["id_token"]
+
+
+def get_icav2_access_token(icav2_access_token_secret_id: str) -> str:
+    """
+    Get the icav2 access token from the icav2 access token secret
+    :param icav2_access_token_secret_id:
+    :return:
+    """
+    return boto3.client("secretsmanager").get_secret_value(
+        SecretId=icav2_access_token_secret_id
+    )["SecretString"]
+
+
+def get_script_version() -> str:
+    """
+    Get the version of the resample, the sha256 of each script that shapes the resampled file,
+    and the version of each library that does.
+    The library versions are read from their metadata, so pyarrow and pandas are not imported
+    :return:
+    """
+    script_version_hash = hashlib.sha256()
+    for script_path_iter_ in RESAMPLE_SCRIPT_PATHS:
+        script_version_hash.update(f"{script_path_iter_.name}\n".encode())
+        script_version_hash.update(hashlib.sha256(script_path_iter_.read_bytes()).digest())
+    for library_name_iter_ in RESAMPLE_LIBRARY_NAMES:
+        try:
+            library_version = get_package_version(library_name_iter_)
+        except PackageNotFoundError:
+            library_version = "none"
+        script_version_hash.update(f"{library_name_iter_}=={library_version}\n".encode())
+
+    return script_version_hash.hexdigest()
+
+
+def get_cache_key(input_e_tag: str, rename_map: Dict[str, str], script_version: str) -> str:
+    """
+    Get the resample cache key of a manifest entry.
+    The key is the sha256 of the compact, key sorted json of the input etag, renames and script version
+    :param input_e_tag:
+    :param rename_map:
+    :param script_version:
+    :return:
+    """
+    return hashlib.sha256(
+        (
+            json.dumps(
+                {
+                    "inputETag": input_e_tag,
+                    "renameMap": rename_map,
+                    "scriptVersion": script_version
+                },
+                sort_keys=True,
+                separators=(",", ":"),
+                ensure_ascii=False
+            ) + "\n"
+        ).encode()
+    ).hexdigest()
+
+
+def get_rename_map_from_manifest_entry(manifest_entry: Dict) -> Dict[str, str]:
+    """
+    Get the rename map of a manifest entry, from its renameMap or from its oldSampleName and newSampleName
+    :param manifest_entry:
+    :return:
+    """
+    if manifest_entry.get("renameMap") is not None:
+        return manifest_entry["renameMap"]
+
+    return {
+        manifest_entry["oldSampleName"]: manifest_entry["newSampleName"]
+    }
+
+
+def resample_manifest_entry(
+        manifest_entry: Dict,
+        filemanager_url: str,
+        orcabus_token: str,
+        script_version: str,
+        parquet_rewrite_workers: int = DEFAULT_PARQUET_REWRITE_WORKERS,
+        input_s3_object: Optional[Dict] = None,
+        resolved_time: Optional[float] = None
+):
+    """
+    Download, rename and upload a single manifest entry
+    :param manifest_entry:
+    :param filemanager_url:
+    :param orcabus_token:
+    :param script_version:
+    :param parquet_rewrite_workers:
+    :param input_s3_object: The s3 object record of the input, if resolved up front
+    :param resolved_time: The time the s3 object record was resolved, used to refresh an old presigned url
+    :return:
+    """
+    # The icav2 modules are imported on first use
+    from resample_cache import check_cache, write_cache
+
+    input_uri = manifest_entry["inputUri"]
+    output_uri = manifest_entry["outputUri"]
+    rename_map = get_rename_map_from_manifest_entry(manifest_entry)
+
+    phase_timings: Dict[str, float] = {}
+    start_time = perf_counter()
+
+    if input_s3_object is None:
+        with time_phase(phase_timings, "lookup"):
+            input_s3_object = get_s3_object_from_s3_uri(filemanager_url, orcabus_token, input_uri)
+
+    # Skip the file if it has already been resampled from the same input with the same renames
+    cache_key = None
+    if input_s3_object.get("eTag"):
+        cache_key = get_cache_key(input_s3_object["eTag"], rename_map, script_version)
+        with time_phase(phase_timings, "cache check"):
+            is_cached = check_cache(output_uri, cache_key)
+        if is_cached:
+            log_stderr(
+                f"'{output_uri}' is already resampled from '{input_uri}', skipping "
+                f"({format_phase_timings(phase_timings)})"
+            )
+            return
+
+    # The rename modules are imported once we know the file needs resampling
+    with time_phase(phase_timings, "import"):
+        from resample_parquet_file import PresignedUrlReader, resample_parquet_file_obj
+        from update_sample_names_in_parquet_files import PlotInputDataCache
+        from upload_file_to_icav2 import upload_file_obj_to_icav2
+
+    # Presign again if the url resolved up front is missing or may have expired while the file was queued
+    input_presigned_url = input_s3_object.get("presignedUrl")
+    if (
+            input_presigned_url is None or
+            resolved_time is None or
+            time() - resolved_time > PRESIGNED_URL_MAX_AGE_SECONDS
+    ):
+        with time_phase(phase_timings, "presign"):
+            input_presigned_url = get_presigned_url_from_s3_object_id(
+                filemanager_url, orcabus_token, input_s3_object["s3ObjectId"]
+            )
+
+    log_stderr(f"Resampling multiqc parquet file '{input_uri}' to '{output_uri}', renaming {len(rename_map)} sample(s)")
+
+    with time_phase(phase_timings, "probe"):
+        input_file_obj = PresignedUrlReader(input_presigned_url)
+
+    plot_input_data_cache = PlotInputDataCache(
+        rename_map=rename_map,
+        workers=parquet_rewrite_workers
+    )
+    # The input is downloaded a range at a time as the batches are renamed
+    with input_file_obj:
+        try:
+            with time_phase(phase_timings, "download and rename"):
+                output_file_obj, output_file_size = resample_parquet_file_obj(
+                    input_file_obj=input_file_obj,
+                    plot_input_data_cache=plot_input_data_cache
+                )
+        finally:
+            plot_input_data_cache.shutdown()
+
+    plot_input_data_cache.print_stats()
+
+    with output_file_obj, time_phase(phase_timings, "upload"):
+        upload_file_obj_to_icav2(
+            input_file_obj=output_file_obj,
+            input_file_size=output_file_size,
+            output_uri=output_uri
+        )
+
+    # Record the cache key next to the uploaded file
+    if cache_key is not None:
+        with time_phase(phase_timings, "cache write"):
+            write_cache(output_uri, cache_key)
+
+    log_stderr(
+        f"Resampled '{output_uri}' in {perf_counter() - start_time:.2f}s "
+        f"({format_phase_timings(phase_timings)})"
+    )
+
+
+def merge_cache_uri(
+        merge_cache_uri: str,
+        parquet_file_uri_list: Optional[List[str]] = None,
+        expected_file_count: Optional[int] = None
+):
+    """
+    Merge the resampled files of this run under the cache uri into a single run level parquet file
+    :param merge_cache_uri:
+    :param parquet_file_uri_list: The uris of the resampled files to merge
+    :param expected_file_count: Or the number of resampled files expected under the cache uri, to merge them all
+    :return:
+    """
+    phase_timings: Dict[str, float] = {}
+    merged_output_uri = merge_cache_uri.rstrip("/") + "/" + MULTIQC_PARQUET_NAME
+
+    with time_phase(phase_timings, "import"):
+        from download_multiqc_parquet_files_from_icav2 import download_multiqc_parquet_files_from_icav2
+        from merge_parquet_files import merge_parquet_files
+        from upload_file_to_icav2 import upload_file_obj_to_icav2
+
+    with TemporaryDirectory() as merge_dir:
+        merge_dir_path = Path(merge_dir)
+
+        log_stderr(
+            f"Downloading "
+            f"{len(parquet_file_uri_list) if parquet_file_uri_list is not None else expected_file_count} "
+            f"resampled multiqc parquet files under '{merge_cache_uri}'"
+        )
+        with time_phase(phase_timings, "download"):
+            parquet_file_paths = download_multiqc_parquet_files_from_icav2(
+                cache_uri=merge_cache_uri,
+                output_dir=merge_dir_path / "inputs",
+                parquet_file_uri_list=parquet_file_uri_list,
+                expected_file_count=expected_file_count
+            )
+
+        log_stderr("Merging resampled multiqc parquet files")
+        with time_phase(phase_timings, "merge"):
+            merge_parquet_files(
+                parquet_file_paths=sorted(parquet_file_paths),
+                output_parquet_file=merge_dir_path / MULTIQC_PARQUET_NAME
+            )
+
+        log_stderr(f"Uploading merged multiqc parquet file to '{merged_output_uri}'")
+        with time_phase(phase_timings, "upload"), open(merge_dir_path / MULTIQC_PARQUET_NAME, "rb") as merged_file_h:
+            upload_file_obj_to_icav2(
+                input_file_obj=merged_file_h,
+                input_file_size=(merge_dir_path / MULTIQC_PARQUET_NAME).stat().st_size,
+                output_uri=merged_output_uri
+            )
+
+    log_stderr(f"Merged '{merged_output_uri}' ({format_phase_timings(phase_timings)})")
+
+
+def get_manifest(filemanager_url: str, orcabus_token: str) -> List[Dict]:
+    """
+    Collect the manifest from MANIFEST_JSON, MANIFEST_URI or the single file environment variables,
+    for a merge, the manifest is the list of the uris of the files to merge
+    :param filemanager_url:
+    :param orcabus_token:
+    :return:
+    """
+    if environ.get("MANIFEST_JSON"):
+        return json.loads(environ["MANIFEST_JSON"])
+
+    if environ.get("MANIFEST_URI"):
+        log_stderr(f"Downloading manifest from '{environ['MANIFEST_URI']}'")
+        response = HTTP_POOL_MANAGER.request(
+            "GET",
+            get_presigned_url_from_s3_object_id(
+                filemanager_url, orcabus_token,
+                get_s3_object_from_s3_uri(filemanager_url, orcabus_token, environ["MANIFEST_URI"])["s3ObjectId"]
+            )
+        )
+        if not 200 <= response.status < 300:
+            raise RuntimeError(f"Failed to download the manifest with status {response.status}")
+        return response.json()
+
+    return [
+        {
+            "inputUri": environ["INPUT_URI"],
+            "outputUri": environ["OUTPUT_URI"],
+            "oldSampleName": environ["OLD_SAMPLE_NAME"],
+            "newSampleName": environ["NEW_SAMPLE_NAME"]
+        }
+    ]
+
+
+def check_environment():
+    """
+    Confirm the required environment variables are set, exiting if not
+    :return:
+    """
+    required_env_vars = [
+        "HOSTNAME_SSM_PARAMETER_NAME",
+        "ORCABUS_TOKEN_SECRET_ID",
+        "ICAV2_ACCESS_TOKEN_SECRET_ID",
+    ]
+
+    # The merge needs the list or the number of files to merge
+    if environ.get("MERGE_CACHE_URI") and not any(
+        environ.get(env_var_iter_) for env_var_iter_ in ["MERGE_FILE_COUNT", "MANIFEST_JSON", "MANIFEST_URI"]
+    ):
+        log_stderr("MERGE_CACHE_URI is set without MERGE_FILE_COUNT, MANIFEST_JSON or MANIFEST_URI. Exiting.")
+        sys.exit(1)
+
+    if not any(environ.get(env_var_iter_) for env_var_iter_ in ["MERGE_CACHE_URI", "MANIFEST_JSON", "MANIFEST_URI"]):
+        required_env_vars.extend([
+            "INPUT_URI",
+            "OUTPUT_URI",
+            "OLD_SAMPLE_NAME",
+            "NEW_SAMPLE_NAME",
+        ])
+
+    for env_var_iter_ in required_env_vars:
+        if not environ.get(env_var_iter_):
+            log_stderr(f"{env_var_iter_} is not set. Exiting.")
+            sys.exit(1)
+
+
+def main():
+    """
+    Resolve the hostname and tokens, then merge the cache uri, or resample each entry of the manifest
+    :return:
+    """
+    check_environment()
+
+    max_parallel_files = int(environ.get("MAX_PARALLEL_FILES", DEFAULT_MAX_PARALLEL_FILES))
+    parquet_rewrite_workers = int(environ.get("PARQUET_REWRITE_WORKERS", DEFAULT_PARQUET_REWRITE_WORKERS))
+
+    startup_timings: Dict[str, float] = {}
+    with time_phase(startup_timings, "ssm"):
+        hostname = get_hostname(environ["HOSTNAME_SSM_PARAMETER_NAME"])
+    with time_phase(startup_timings, "secrets"):
+        orcabus_token = get_orcabus_token(environ["ORCABUS_TOKEN_SECRET_ID"])
+        # Set before any icav2 calls, and before any worker processes are started, so they inherit it
+        environ["ICAV2_ACCESS_TOKEN"] = get_icav2_access_token(environ["ICAV2_ACCESS_TOKEN_SECRET_ID"])
+    log_stderr(f"Resolved hostname and tokens ({format_phase_timings(startup_timings)})")
+
+    filemanager_url = get_filemanager_url(hostname)
+
+    # Merge the resampled files of this run into a single run level parquet file
+    if environ.get("MERGE_CACHE_URI"):
+        if environ.get("MERGE_FILE_COUNT"):
+            merge_cache_uri(environ["MERGE_CACHE_URI"], expected_file_count=int(environ["MERGE_FILE_COUNT"]))
+        else:
+            merge_cache_uri(
+                environ["MERGE_CACHE_URI"],
+                parquet_file_uri_list=get_manifest(filemanager_url, orcabus_token)
+            )
+        return
+
+    manifest = get_manifest(filemanager_url, orcabus_token)
+
+    # Resolve the s3 object ids and presigned urls of every input at once, before the fan out
+    resolve_timings: Dict[str, float] = {}
+    with time_phase(resolve_timings, "resolve"):
+        input_s3_objects = resolve_s3_uris(
+            filemanager_url, orcabus_token,
+            [manifest_entry_iter_["inputUri"] for manifest_entry_iter_ in manifest]
+        )
+    resolved_time = time()
+    log_stderr(
+        f"Resolved {len(input_s3_objects)} of {len(manifest)} input(s) in the filemanager "
+        f"({format_phase_timings(resolve_timings)})"
+    )
+
+    log_stderr(f"Resampling {len(manifest)} multiqc parquet file(s), {max_parallel_files} at a time")
+
+    resample_manifest_entry_partial = partial(
+        resample_manifest_entry,
+        filemanager_url=filemanager_url,
+        orcabus_token=orcabus_token,
+        script_version=get_script_version(),
+        parquet_rewrite_workers=parquet_rewrite_workers,
+        resolved_time=resolved_time
+    )
+
+    has_failures = False
+    if max_parallel_files <= 1 or len(manifest) <= 1:
+        for manifest_entry_iter_ in manifest:
+            try:
+                resample_manifest_entry_partial(
+                    manifest_entry_iter_,
+                    input_s3_object=input_s3_objects.get(get_standard_s3_uri(manifest_entry_iter_["inputUri"]))
+                )
+            except Exception as e:
+                log_stderr(f"Failed to resample '{manifest_entry_iter_.get('inputUri')}': {e!r}")
+                has_failures = True
+    else:
+        with ProcessPoolExecutor(max_workers=max_parallel_files) as executor:
+            futures = {
+                executor.submit(
+                    resample_manifest_entry_partial,
+                    manifest_entry_iter_,
+                    input_s3_object=input_s3_objects.get(get_standard_s3_uri(manifest_entry_iter_["inputUri"]))
+                ): manifest_entry_iter_
+                for manifest_entry_iter_ in manifest
+            }
+            for future_iter_ in as_completed(futures):
+                try:
+                    future_iter_.result()
+                except Exception as e:
+                    log_stderr(f"Failed to resample '{futures[future_iter_].get('inputUri')}': {e!r}")
+                    has_failures = True
+
+    if has_failures:
+        log_stderr("One or more multiqc parquet files failed to resample. Exiting.")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
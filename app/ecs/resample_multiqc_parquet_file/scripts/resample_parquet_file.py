@@ -0,0 +1,463 @@
+#!/usr/bin/env python3
+
+"""
+Given a presigned url of a multiqc parquet file and an output uri,
+download, rename the samples and upload the parquet file in a single process.
+
+Steps are as follows:
+* Probe the size and etag of the input with a single byte range request
+* Open the presigned url as a seekable file, each read is made with byte range requests,
+  pinned to the probed etag with If-Match, and retried on its own if it fails.
+  Reads larger than the range size are split into ranges that are downloaded in parallel
+* Rename the samples one record batch at a time, reading the footer and then the column chunks
+  through the ranged reader, and writing each batch to a spooled temporary file
+* Upload the spooled file to the output uri, in a single PUT or a multipart upload for larger files
+
+Only the byte ranges that are being decoded are held in memory, rather than the whole input file,
+and the output is kept in memory up to --max-memory-mb before it spills over to a temporary file on disk.
+An upload url needs the final size up front, so the upload starts once the last batch is written.
+Download, rename and upload of different files overlap through the parallel jobs of the entrypoint instead.
+
+Peak memory is roughly the streaming batch budget and the spooled output, both set with --max-memory-mb,
+plus the parallel byte ranges of a column chunk read, set with --range-size-mb and --max-parallel-ranges.
+"""
+
+# Standard imports
+import argparse
+import re
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from io import RawIOBase, SEEK_CUR, SEEK_END, SEEK_SET
+from tempfile import SpooledTemporaryFile
+from time import sleep
+from typing import Optional, Tuple
+
+# Arrow imports
+import pyarrow as pa
+
+# Download imports
+from urllib3 import BaseHTTPResponse, PoolManager, Timeout
+from urllib3.exceptions import HTTPError
+from urllib3.util import Retry
+
+# Local imports
+from update_sample_names_in_parquet_files import (
+    DEFAULT_MAX_MEMORY_MB,
+    PlotInputDataCache,
+    add_rename_args, check_rename_args,
+    get_plot_input_data_cache_from_args,
+    stream_update_sample_names
+)
+from upload_file_to_icav2 import (
+    DEFAULT_MULTIPART_THRESHOLD_MB,
+    MAX_RETRIES,
+    upload_file_obj_to_icav2
+)
+
+# Globals
+DEFAULT_RANGE_SIZE_MB = 8
+DEFAULT_MAX_PARALLEL_RANGES = 8
+DOWNLOAD_CHUNK_SIZE = 1024 * 1024
+# A stalled range is retried rather than holding up the whole download
+DOWNLOAD_READ_TIMEOUT_SECONDS = 60
+CONTENT_RANGE_REGEX = re.compile(r"^bytes (\d+)-(\d+)/(\d+)$")
+
+
+class ETagChangedError(Exception):
+    """
+    The object behind the presigned url changed while we were downloading it
+    """
+    pass
+
+
+def read_response_into(response: BaseHTTPResponse, buffer_view: memoryview):
+    """
+    Read the body of a response directly into a slice of the download buffer
+    :param response:
+    :param buffer_view:
+    :return:
+    """
+    bytes_read = 0
+    while bytes_read < len(buffer_view):
+        chunk_bytes_read = response.readinto(
+            buffer_view[bytes_read:bytes_read + DOWNLOAD_CHUNK_SIZE]
+        )
+        if chunk_bytes_read == 0:
+            raise ConnectionError(
+                f"Response ended after {bytes_read} of {len(buffer_view)} bytes"
+            )
+        bytes_read += chunk_bytes_read
+
+
+def get_object_size_and_e_tag(pool_manager: PoolManager, presigned_url: str) -> Tuple[int, Optional[str]]:
+    """
+    Probe the size and etag of the object behind the presigned url by requesting its first byte
+    :param pool_manager:
+    :param presigned_url:
+    :return:
+    """
+    response = pool_manager.request(
+        "GET", presigned_url,
+        headers={"Range": "bytes=0-0"}
+    )
+
+    if response.status != 206:
+        raise RuntimeError(
+            f"Failed to probe the input parquet file with status {response.status}. "
+            f"Response was {response.data.decode()}"
+        )
+
+    content_range_match = CONTENT_RANGE_REGEX.match(response.headers.get("Content-Range", ""))
+    if content_range_match is None:
+        raise ValueError(f"Could not parse the Content-Range header '{response.headers.get('Content-Range')}'")
+
+    return int(content_range_match.group(3)), response.headers.get("ETag")
+
+
+def download_range(
+        pool_manager: PoolManager,
+        presigned_url: str,
+        e_tag: Optional[str],
+        buffer_view: memoryview,
+        range_start: int
+):
+    """
+    Download a byte range of the presigned url into its slice of the download buffer,
+    retrying the range on its own if the transfer fails part way through.
+    The range is only accepted if the object still has the etag we probed.
+    :param pool_manager:
+    :param presigned_url:
+    :param e_tag:
+    :param buffer_view: The slice of the download buffer for this range
+    :param range_start:
+    :return:
+    """
+    range_end = range_start + len(buffer_view) - 1
+
+    headers = {"Range": f"bytes={range_start}-{range_end}"}
+    if e_tag is not None:
+        headers["If-Match"] = e_tag
+
+    for attempt_iter_ in range(MAX_RETRIES + 1):
+        response = pool_manager.request(
+            "GET", presigned_url,
+            headers=headers,
+            preload_content=False
+        )
+        try:
+            if response.status == 412:
+                raise ETagChangedError(
+                    f"The input parquet file changed while downloading bytes {range_start}-{range_end}"
+                )
+            if response.status != 206:
+                raise RuntimeError(
+                    f"Failed to download bytes {range_start}-{range_end} with status {response.status}. "
+                    f"Response was {response.data.decode()}"
+                )
+            if e_tag is not None and response.headers.get("ETag") != e_tag:
+                raise ETagChangedError(
+                    f"The input parquet file etag changed from {e_tag} to {response.headers.get('ETag')} "
+                    f"while downloading bytes {range_start}-{range_end}"
+                )
+            if response.headers.get("Content-Range", "").split("/")[0] != f"bytes {range_start}-{range_end}":
+                raise ValueError(
+                    f"Expected bytes {range_start}-{range_end} but got '{response.headers.get('Content-Range')}'"
+                )
+            read_response_into(response, buffer_view)
+            return
+        except (ConnectionError, HTTPError) as e:
+            if attempt_iter_ == MAX_RETRIES:
+                raise
+            print(
+                f"Retrying bytes {range_start}-{range_end} after attempt {attempt_iter_ + 1} failed with {e}",
+                file=sys.stderr
+            )
+            sleep(2 ** attempt_iter_)
+        finally:
+            response.release_conn()
+
+
+class PresignedUrlReader(RawIOBase):
+    """
+    A read only, seekable file over a presigned url, every read is made with byte range requests.
+    Reads larger than the range size are split into ranges that are downloaded in parallel over a connection pool,
+    each range is read directly into its slice of the caller's buffer.
+    """
+    def __init__(
+            self,
+            presigned_url: str,
+            range_size_mb: int = DEFAULT_RANGE_SIZE_MB,
+            max_parallel_ranges: int = DEFAULT_MAX_PARALLEL_RANGES
+    ):
+        """
+        Probe the size and etag of the object behind the presigned url
+        :param presigned_url:
+        :param range_size_mb:
+        :param max_parallel_ranges:
+        """
+        super().__init__()
+        self.presigned_url = presigned_url
+        self.range_size = range_size_mb * 1024 * 1024
+        self.pool_manager = PoolManager(
+            maxsize=max_parallel_ranges,
+            timeout=Timeout(connect=10, read=DOWNLOAD_READ_TIMEOUT_SECONDS),
+            retries=Retry(
+                total=MAX_RETRIES,
+                backoff_factor=1,
+                status_forcelist=[500, 502, 503, 504]
+            )
+        )
+        self.executor = ThreadPoolExecutor(max_workers=max_parallel_ranges)
+        self.position = 0
+        self.bytes_downloaded = 0
+
+        try:
+            self.size, self.e_tag = get_object_size_and_e_tag(self.pool_manager, presigned_url)
+        except Exception:
+            self.close()
+            raise
+
+    def readable(self) -> bool:
+        """
+        The presigned url can be read
+        :return:
+        """
+        return True
+
+    def seekable(self) -> bool:
+        """
+        Any position can be read with a byte range request
+        :return:
+        """
+        return True
+
+    def tell(self) -> int:
+        """
+        The position of the next read
+        :return:
+        """
+        return self.position
+
+    def seek(self, offset: int, whence: int = SEEK_SET) -> int:
+        """
+        Move the position of the next read, no request is made until we read
+        :param offset:
+        :param whence:
+        :return:
+        """
+        if whence == SEEK_SET:
+            position = offset
+        elif whence == SEEK_CUR:
+            position = self.position + offset
+        elif whence == SEEK_END:
+            position = self.size + offset
+        else:
+            raise ValueError(f"Invalid whence {whence}")
+
+        if position < 0:
+            raise ValueError(f"Cannot seek to negative position {position}")
+
+        self.position = position
+        return self.position
+
+    def readinto(self, buffer) -> int:
+        """
+        Download the bytes from the current position into the buffer, in parallel ranges if the read is large
+        :param buffer:
+        :return: The number of bytes read, 0 at the end of the file
+        """
+        buffer_view = memoryview(buffer).cast("B")
+        read_size = max(0, min(len(buffer_view), self.size - self.position))
+        if read_size == 0:
+            return 0
+
+        # Consume the results so that any range errors are raised
+        list(self.executor.map(
+            lambda range_offset_iter_: download_range(
+                pool_manager=self.pool_manager,
+                presigned_url=self.presigned_url,
+                e_tag=self.e_tag,
+                buffer_view=buffer_view[range_offset_iter_:min(range_offset_iter_ + self.range_size, read_size)],
+                range_start=self.position + range_offset_iter_
+            ),
+            range(0, read_size, self.range_size)
+        ))
+
+        self.position += read_size
+        self.bytes_downloaded += read_size
+        return read_size
+
+    def close(self):
+        """
+        Stop the range download threads and release the pooled connections
+        :return:
+        """
+        if not self.closed:
+            self.executor.shutdown(wait=True)
+            self.pool_manager.clear()
+        super().close()
+
+
+def resample_parquet_file_obj(
+        input_file_obj: PresignedUrlReader,
+        plot_input_data_cache: PlotInputDataCache,
+        max_memory_mb: int = DEFAULT_MAX_MEMORY_MB
+) -> Tuple[SpooledTemporaryFile, int]:
+    """
+    Rename the samples of a parquet file read through the ranged reader,
+    writing the renamed parquet file to a spooled temporary file that is kept in memory up to max_memory_mb.
+    Column chunks are read a range at a time, so the whole input is never held in memory.
+    :param input_file_obj:
+    :param plot_input_data_cache:
+    :param max_memory_mb:
+    :return: The spooled temporary file rewound to its start and its size, the caller is responsible for closing it
+    """
+    output_file_obj = SpooledTemporaryFile(max_size=max_memory_mb * 1024 * 1024)
+
+    try:
+        stream_update_sample_names(
+            input_source=pa.PythonFile(input_file_obj, mode="r"),
+            output_sink=pa.PythonFile(output_file_obj, mode="w"),
+            rename_map=plot_input_data_cache.rename_map,
+            max_memory_mb=max_memory_mb,
+            plot_input_data_cache=plot_input_data_cache,
+            input_buffer_size=input_file_obj.range_size
+        )
+    except Exception:
+        output_file_obj.close()
+        raise
+
+    output_file_size = output_file_obj.tell()
+    output_file_obj.seek(0)
+
+    return output_file_obj, output_file_size
+
+
+def get_args():
+    """
+    Use argparse, to get the arguments from the command line.
+    We collect the following arguments
+    * --input-presigned-url
+    * --output-uri
+    * --max-memory-mb
+    * --range-size-mb
+    * --max-parallel-ranges
+    * --multipart-threshold-mb
+    * --old-sample-name / --new-sample-name, or --rename-map
+    * --plot-input-cache-mb
+    * --workers
+    * --engine
+    :return:
+    """
+    # Get args
+    args = argparse.ArgumentParser(
+        description="Download, rename the samples of and upload a multiqc parquet file."
+    )
+
+    # IO
+    args.add_argument(
+        "--input-presigned-url",
+        type=str,
+        required=True,
+        help="The presigned url of the parquet file to be updated."
+    )
+    args.add_argument(
+        "--output-uri",
+        type=str,
+        required=True,
+        help="The output uri where the updated parquet file should be uploaded to."
+    )
+
+    # Memory args
+    args.add_argument(
+        "--max-memory-mb",
+        type=int,
+        default=DEFAULT_MAX_MEMORY_MB,
+        help=(
+            "The approximate memory budget in MB used to choose the batch size, "
+            "and the size of the output held in memory before it spills over to a temporary file. "
+            f"Defaults to {DEFAULT_MAX_MEMORY_MB}."
+        )
+    )
+
+    # Transfer args
+    args.add_argument(
+        "--range-size-mb",
+        type=int,
+        default=DEFAULT_RANGE_SIZE_MB,
+        help=(
+            "The size of each byte range of the download, and of each read of a column chunk. "
+            f"Defaults to {DEFAULT_RANGE_SIZE_MB}."
+        )
+    )
+    args.add_argument(
+        "--max-parallel-ranges",
+        type=int,
+        default=DEFAULT_MAX_PARALLEL_RANGES,
+        help=f"The number of byte ranges to download at once. Defaults to {DEFAULT_MAX_PARALLEL_RANGES}."
+    )
+    args.add_argument(
+        "--multipart-threshold-mb",
+        type=int,
+        default=DEFAULT_MULTIPART_THRESHOLD_MB,
+        help=(
+            "Files of this size and above are uploaded with a multipart upload. "
+            f"Defaults to {DEFAULT_MULTIPART_THRESHOLD_MB}."
+        )
+    )
+
+    # Naming, cache, workers and engine args
+    add_rename_args(args)
+
+    parsed_args = args.parse_args()
+
+    check_rename_args(args, parsed_args)
+
+    return parsed_args
+
+
+def main():
+    """
+    Read the parquet file through the ranged reader, rename the samples and upload the result to the output uri
+    :return:
+    """
+    # Get args
+    args = get_args()
+
+    # Get the rename map and create the plot input data cache
+    plot_input_data_cache = get_plot_input_data_cache_from_args(args)
+
+    # Download and rename
+    with PresignedUrlReader(
+        presigned_url=args.input_presigned_url,
+        range_size_mb=args.range_size_mb,
+        max_parallel_ranges=args.max_parallel_ranges
+    ) as input_file_obj:
+        try:
+            output_file_obj, output_file_size = resample_parquet_file_obj(
+                input_file_obj=input_file_obj,
+                plot_input_data_cache=plot_input_data_cache,
+                max_memory_mb=args.max_memory_mb
+            )
+        finally:
+            plot_input_data_cache.shutdown()
+        print(
+            f"Downloaded {input_file_obj.bytes_downloaded} bytes of {input_file_obj.size} bytes",
+            file=sys.stderr
+        )
+
+    plot_input_data_cache.print_stats()
+
+    # Upload
+    with output_file_obj:
+        upload_file_obj_to_icav2(
+            input_file_obj=output_file_obj,
+            input_file_size=output_file_size,
+            output_uri=args.output_uri,
+            multipart_threshold_mb=args.multipart_threshold_mb
+        )
+    print(f"Uploaded {output_file_size} bytes to {args.output_uri}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
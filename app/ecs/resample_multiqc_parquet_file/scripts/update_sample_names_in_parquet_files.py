@@ -7,106 +7,849 @@ Given a multiqc parquet file, update the former names to the new names
 Steps are as follows:
 * Read the parquet file into a pandas DataFrame
 
-* Iterate through each item and replace the old sample name with the new sample name
+* Mask the DataFrame on the 'type' column and replace the old sample names with the new sample names
 
 For plot input types we perform the following:
 * Load the JSON string into a Python dictionary where the 'data' key contains a dict
 * The name is the top level key, so we need to iterate through the 'data' dict and replace the one key
+* Only the rows of type 'plot_input' are parsed, all other rows are left untouched
 
 For plot input row we only need to perform the following:
 * Update the 'sample' column in the DataFrame. The sample column contains the sample names to be replaced.
+* This is a single vectorised assignment over all rows of type 'plot_input_row'
 
 Once completed, we write the updated DataFrame back to a parquet file.
 * Write the updated DataFrame back to a parquet file
 
+Renames are given either as a single --old-sample-name / --new-sample-name pair,
+or as a --rename-map file (JSON object or two column TSV) of old name to new name.
+All renames are applied in a single pass over the file, with a dictionary lookup per key / string value.
+
+With a single pair, every plot input row is set to the new sample name (per fastq files only hold the one sample),
+with a rename map, only the plot input rows whose sample is in the map are renamed.
+
+Plot input data cache
+* Many plot input rows carry the same plot input data JSON string, so rewritten strings are kept in a
+  least recently used cache keyed on a digest of the string, bounded by --plot-input-cache-mb
+* Strings that do not contain any of the old sample names, and have no unicode escapes, are skipped without being parsed
+* Rewritten strings are serialised by json.dumps with its default arguments, as the script always has,
+  so strings are only skipped when they were written the same way, i.e. they are ASCII and the first
+  SERIALISATION_CHECK_COUNT strings are unchanged by json.loads and json.dumps
+  (MultiQC writes every plot input data string of a file with the same serialiser).
+  Otherwise every string is parsed, so every row of the output is serialised the same way
+* The number of cache hits, misses, skips and evictions are written to stderr once complete
+
+String kernel engine (--engine arrow)
+* When a sample name only appears as an exact JSON key or string value, replacing the token "old_name"
+  with the JSON encoded "new_name" is the same as parsing, renaming and serialising the JSON
+* The arrow engine runs this replacement with pyarrow's replace_substring kernel over the whole column,
+  leaving the rest of each JSON string exactly as it was
+* Rows where the old name also appears outside of a whole token (e.g. as part of another sample name),
+  next to an escaped quote, or where the string has unicode escapes or non-ASCII characters,
+  fall back to the parse engine
+* As with skipped strings, the string kernel is only used when the strings of the file are serialised
+  by json.dumps with its default arguments, so every row is serialised the same way
+* The parse engine is used for all rows if a sample name needs escaping in JSON,
+  or if a new sample name is also an old sample name
+
+Parallel mode (--workers N)
+* The unique plot input data strings of each DataFrame / record batch that are not in the cache
+  are rewritten across a pool of N processes, only the strings themselves are sent to the workers
+* Results are returned in their original order, so the output is the same as with a single worker
+
+Streaming mode (--streaming)
+* Read the parquet file one row group at a time with pyarrow, in batches sized by --max-memory-mb
+* Apply the same rename to each record batch with arrow compute, columns other than
+  'type', 'sample' and 'plot_input_data' are passed straight through to the writer
+* Write each batch to a ParquetWriter, so peak memory is bounded by the batch size rather than the file size
+
 """
 
 
 # Standard imports
 import argparse
 import json
-from typing import cast
-import pandas as pd
-
-
-def recursively_replace_name(d, old_name, new_name):
+import sys
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from hashlib import blake2b
+from os import replace
+from pathlib import Path
+from tempfile import NamedTemporaryFile
+from typing import cast, Dict, List, Optional, Union, TYPE_CHECKING
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+
+# Pandas is only needed by the non-streaming rewrite, so is imported there
+if TYPE_CHECKING:
+    import pandas as pd
+
+# Globals
+DEFAULT_MAX_MEMORY_MB = 256
+# Headroom for the decoded batch, the rewritten plot input strings and the writer buffers
+STREAMING_MEMORY_OVERHEAD_FACTOR = 4
+DEFAULT_PLOT_INPUT_CACHE_MB = 64
+DEFAULT_WORKERS = 1
+RENAME_ENGINES = ["parse", "arrow"]
+DEFAULT_RENAME_ENGINE = "parse"
+# Number of chunks per worker, so workers finishing early can pick up more of the remaining strings
+CHUNKS_PER_WORKER = 4
+# A sample name may be written with unicode escapes in a JSON string, so neither a substring check
+# nor the string kernel can be trusted for a string with one
+JSON_UNICODE_ESCAPE = "\\u"
+# Number of plot input data strings checked to be serialised by json.dumps with its default arguments
+SERIALISATION_CHECK_COUNT = 16
+
+
+def replace_names(d, rename_map: Dict[str, str]):
     """
-    Recursively replace names in a nested dictionary for both key AND value matches
+    Replace names in a nested dictionary for both key AND value matches.
+
+    The tree is walked with an explicit stack rather than by recursion, so deeply nested plot configs
+    cannot hit the recursion limit. Only the dicts and lists on a path to a match are copied,
+    all other subtrees are shared with the input.
     :param d: The dictionary to update
-    :param old_name: The name to replace
-    :param new_name: The new name
-    :return: The updated dictionary
-    """
-    if isinstance(d, dict):
-        return {
-            (
-                new_name
-                if k == old_name
-                else k
-            ): recursively_replace_name(v, old_name, new_name)
-            for k, v in
-            d.items()
-        }
-    elif isinstance(d, list):
-        return [
-            recursively_replace_name(i, old_name, new_name)
-            for i in d
-        ]
-    elif isinstance(d, str):
-        return (
-            new_name
-            if d == old_name
-            else d
-        )
-    return d
+    :param rename_map: The mapping of old names to new names
+    :return: The updated dictionary, d itself if there were no matches
+    """
+    if isinstance(d, str):
+        return rename_map.get(d, d)
+    if not isinstance(d, (dict, list)):
+        return d
+
+    # Each stack frame is [container, items iterator, key in the parent, updated items or None]
+    stack = [[d, iter(d.items()) if isinstance(d, dict) else enumerate(d), None, None]]
+    while True:
+        frame = stack[-1]
+
+        # Walk the items of the container until we reach a nested container
+        for key, value in frame[1]:
+            value_type = type(value)
+            if value_type is str:
+                if value in rename_map:
+                    if frame[3] is None:
+                        frame[3] = {}
+                    frame[3][key] = rename_map[value]
+            elif value_type is dict:
+                stack.append([value, iter(value.items()), key, None])
+                break
+            elif value_type is list:
+                stack.append([value, enumerate(value), key, None])
+                break
+        else:
+            # All items walked, copy the container if anything in or under it has changed
+            stack.pop()
+            container, _, parent_key, updates = frame
+            if type(container) is dict:
+                if updates is not None or not rename_map.keys().isdisjoint(container):
+                    updates = updates or {}
+                    container = {
+                        rename_map.get(k, k): updates.get(k, v)
+                        for k, v in
+                        container.items()
+                    }
+            elif updates is not None:
+                container = list(container)
+                for index_iter_, value_iter_ in updates.items():
+                    container[index_iter_] = value_iter_
+
+            # Pass the (possibly) updated container to the parent
+            if not stack:
+                return container
+            if container is not frame[0]:
+                if stack[-1][3] is None:
+                    stack[-1][3] = {}
+                stack[-1][3][parent_key] = container
 
 
 def update_plot_input(
         plot_input_data: str,
-        old_sample_name: str,
-        new_sample_name: str
+        rename_map: Dict[str, str]
 ) -> str:
     """
     Given a plot input data JSON string, update the sample names in the 'data' key
     :param plot_input_data:
-    :param old_sample_name:
-    :param new_sample_name:
+    :param rename_map:
     :return:
     """
     return json.dumps(
-        recursively_replace_name(
+        replace_names(
             d=json.loads(plot_input_data),
-            old_name=old_sample_name,
-            new_name=new_sample_name
+            rename_map=rename_map
+        )
+    )
+
+
+class PlotInputDataCache:
+    """
+    Rewrite plot input data JSON strings, keeping the rewritten strings in a size-bounded
+    least recently used cache keyed on a digest of the original string.
+
+    Strings that cannot contain any of the old sample names are returned as is without being parsed.
+    The substring check is only used when the old sample names are written the same way inside a JSON string,
+    i.e. they have no characters that json.dumps would escape,
+    and when the strings are serialised the same way as the rewritten strings, see check_serialisation().
+
+    With more than one worker, the strings missing from the cache are rewritten across a process pool,
+    the pool is started on first use and must be closed with shutdown().
+
+    With the arrow engine, whole arrays of strings are renamed with a string kernel,
+    only the rows the kernel cannot safely rename are parsed.
+    """
+    def __init__(
+            self,
+            rename_map: Dict[str, str],
+            max_cache_mb: int = DEFAULT_PLOT_INPUT_CACHE_MB,
+            workers: int = DEFAULT_WORKERS,
+            engine: str = DEFAULT_RENAME_ENGINE
+    ):
+        self.rename_map = rename_map
+        self.max_cache_bytes = max_cache_mb * 1024 * 1024
+
+        self.cache: OrderedDict[bytes, str] = OrderedDict()
+        self.cache_bytes = 0
+
+        # Only prefilter when the old names appear verbatim in the JSON string
+        self.can_prefilter = all(
+            json.dumps(old_sample_name_iter_)[1:-1] == old_sample_name_iter_
+            for old_sample_name_iter_ in rename_map.keys()
+        )
+
+        # Skipped strings are only the same as rewritten strings if they were serialised by json.dumps
+        # with its default arguments, set by check_serialisation()
+        self.is_json_dumps_serialised: Optional[bool] = None
+
+        # Process pool
+        self.workers = workers
+        self.process_pool: Optional[ProcessPoolExecutor] = None
+
+        # The string kernel is only safe when the names are written verbatim in JSON
+        # and a renamed token cannot be renamed again
+        self.use_string_kernel = (
+            engine == "arrow" and
+            self.can_prefilter and
+            all(
+                json.dumps(new_sample_name_iter_)[1:-1] == new_sample_name_iter_
+                for new_sample_name_iter_ in rename_map.values()
+            ) and
+            rename_map.keys().isdisjoint(rename_map.values())
+        )
+        if engine == "arrow" and not self.use_string_kernel:
+            print(
+                "Sample names need escaping or are renamed more than once, using the parse engine",
+                file=sys.stderr
+            )
+
+        # Counters
+        self.hits = 0
+        self.misses = 0
+        self.skips = 0
+        self.evictions = 0
+        self.string_kernel_rows = 0
+        self.string_kernel_fallbacks = 0
+
+    def check_serialisation(self, plot_input_data_list: List[Optional[str]]):
+        """
+        Check the first plot input data strings of the file are unchanged by json.loads and json.dumps,
+        i.e. they were serialised the same way as the rewritten strings.
+        Only the first strings are checked, as MultiQC writes every string of a file with the same serialiser.
+        Strings with unicode escapes or non-ASCII characters are always parsed, so are not checked.
+        If any differ, every string is parsed and serialised, rather than skipped.
+        :param plot_input_data_list:
+        :return:
+        """
+        if self.is_json_dumps_serialised is not None:
+            return
+
+        self.is_json_dumps_serialised = all(
+            json.dumps(json.loads(plot_input_data_iter_)) == plot_input_data_iter_
+            for plot_input_data_iter_ in plot_input_data_list[:SERIALISATION_CHECK_COUNT]
+            if (
+                plot_input_data_iter_ is not None and
+                plot_input_data_iter_.isascii() and
+                JSON_UNICODE_ESCAPE not in plot_input_data_iter_
+            )
+        )
+        if not self.is_json_dumps_serialised:
+            print(
+                "Plot input data strings are not serialised by json.dumps, parsing every string",
+                file=sys.stderr
+            )
+
+    def can_skip(self, plot_input_data: str) -> bool:
+        """
+        Check if the plot input data string cannot contain any of the old sample names,
+        strings with unicode escapes are never skipped, as a name may be hidden in the escapes,
+        nor are strings with characters json.dumps would have escaped
+        :param plot_input_data:
+        :return:
+        """
+        return (
+            self.can_prefilter and
+            self.is_json_dumps_serialised is True and
+            plot_input_data.isascii() and
+            JSON_UNICODE_ESCAPE not in plot_input_data
+        ) and not any(
+            old_sample_name_iter_ in plot_input_data
+            for old_sample_name_iter_ in self.rename_map.keys()
+        )
+
+    def add_to_cache(self, digest: bytes, updated_plot_input_data: str):
+        """
+        Add a rewritten string to the cache, evicting the least recently used strings
+        :param digest:
+        :param updated_plot_input_data:
+        :return:
+        """
+        # Strings larger than the cache are not kept
+        if len(updated_plot_input_data) > self.max_cache_bytes:
+            return
+
+        self.cache[digest] = updated_plot_input_data
+        self.cache_bytes += len(updated_plot_input_data)
+        while self.cache_bytes > self.max_cache_bytes:
+            _, evicted_plot_input_data = self.cache.popitem(last=False)
+            self.cache_bytes -= len(evicted_plot_input_data)
+            self.evictions += 1
+
+    def update_plot_input(self, plot_input_data: str) -> str:
+        """
+        Given a plot input data JSON string, return the string with the sample names replaced
+        :param plot_input_data:
+        :return:
+        """
+        # Skip strings that do not mention any of the old sample names
+        if self.can_skip(plot_input_data):
+            self.skips += 1
+            return plot_input_data
+
+        # Cache lookup
+        digest = blake2b(plot_input_data.encode(), digest_size=16).digest()
+        if digest in self.cache:
+            self.hits += 1
+            self.cache.move_to_end(digest)
+            return self.cache[digest]
+
+        # Cache miss, parse and rewrite
+        self.misses += 1
+        updated_plot_input_data = update_plot_input(
+            plot_input_data=plot_input_data,
+            rename_map=self.rename_map
+        )
+        self.add_to_cache(digest, updated_plot_input_data)
+
+        return updated_plot_input_data
+
+    def update_plot_input_list(self, plot_input_data_list: List[str]) -> List[str]:
+        """
+        Given a list of plot input data JSON strings, return the strings with the sample names replaced, in order.
+        With a single worker this is the same as calling update_plot_input on each string.
+        Otherwise the unique strings missing from the cache are rewritten across the process pool.
+        :param plot_input_data_list:
+        :return:
+        """
+        self.check_serialisation(cast(List[Optional[str]], plot_input_data_list))
+
+        if self.workers <= 1:
+            return list(map(self.update_plot_input, plot_input_data_list))
+
+        updated_plot_input_data_list: List[Optional[str]] = [None] * len(plot_input_data_list)
+
+        # Resolve what we can from the prefilter and the cache,
+        # collect the indexes of each unique string we still need to rewrite
+        missing_plot_input_data_indexes: Dict[str, List[int]] = {}
+        for index_iter_, plot_input_data_iter_ in enumerate(plot_input_data_list):
+            if self.can_skip(plot_input_data_iter_):
+                self.skips += 1
+                updated_plot_input_data_list[index_iter_] = plot_input_data_iter_
+                continue
+
+            if plot_input_data_iter_ in missing_plot_input_data_indexes:
+                self.hits += 1
+                missing_plot_input_data_indexes[plot_input_data_iter_].append(index_iter_)
+                continue
+
+            digest = blake2b(plot_input_data_iter_.encode(), digest_size=16).digest()
+            if digest in self.cache:
+                self.hits += 1
+                self.cache.move_to_end(digest)
+                updated_plot_input_data_list[index_iter_] = self.cache[digest]
+                continue
+
+            self.misses += 1
+            missing_plot_input_data_indexes[plot_input_data_iter_] = [index_iter_]
+
+        if not missing_plot_input_data_indexes:
+            return cast(List[str], updated_plot_input_data_list)
+
+        # Rewrite the missing strings across the pool, map returns the results in order
+        if self.process_pool is None:
+            self.process_pool = ProcessPoolExecutor(max_workers=self.workers)
+
+        missing_plot_input_data_list = list(missing_plot_input_data_indexes.keys())
+        for plot_input_data_iter_, updated_plot_input_data_iter_ in zip(
+            missing_plot_input_data_list,
+            self.process_pool.map(
+                partial(update_plot_input, rename_map=self.rename_map),
+                missing_plot_input_data_list,
+                chunksize=max(1, len(missing_plot_input_data_list) // (self.workers * CHUNKS_PER_WORKER))
+            )
+        ):
+            self.add_to_cache(
+                blake2b(plot_input_data_iter_.encode(), digest_size=16).digest(),
+                updated_plot_input_data_iter_
+            )
+            for index_iter_ in missing_plot_input_data_indexes[plot_input_data_iter_]:
+                updated_plot_input_data_list[index_iter_] = updated_plot_input_data_iter_
+
+        return cast(List[str], updated_plot_input_data_list)
+
+    def update_plot_input_array(self, plot_input_data_array: pa.Array) -> pa.Array:
+        """
+        Given an arrow array of plot input data JSON strings,
+        return an array of the strings with the sample names replaced.
+        With the parse engine, this is update_plot_input_list over the array.
+        With the arrow engine, the JSON string tokens of the old names are replaced with a string kernel,
+        and the rows the kernel cannot safely rename are passed to update_plot_input_list.
+        The string kernel keeps the rest of each string as it was, so is only used for strings
+        serialised by json.dumps with its default arguments, see check_serialisation().
+        :param plot_input_data_array:
+        :return:
+        """
+        self.check_serialisation(plot_input_data_array.slice(0, SERIALISATION_CHECK_COUNT).to_pylist())
+
+        if not (self.use_string_kernel and self.is_json_dumps_serialised):
+            return pa.array(
+                self.update_plot_input_list(plot_input_data_array.to_pylist()),
+                type=plot_input_data_array.type
+            )
+
+        # Find the rows where the old names do not only appear as whole JSON string tokens,
+        # or that json.dumps would have written differently
+        fallback_mask = pc.or_(
+            pc.match_substring(plot_input_data_array, JSON_UNICODE_ESCAPE),
+            pc.invert(pc.string_is_ascii(plot_input_data_array))
+        )
+        for old_sample_name_iter_ in self.rename_map.keys():
+            old_sample_name_token = f'"{old_sample_name_iter_}"'
+            fallback_mask = pc.or_(
+                fallback_mask,
+                pc.or_(
+                    pc.not_equal(
+                        pc.count_substring(plot_input_data_array, old_sample_name_iter_),
+                        pc.count_substring(plot_input_data_array, old_sample_name_token)
+                    ),
+                    pc.match_substring(plot_input_data_array, "\\" + old_sample_name_token)
+                )
+            )
+        fallback_mask = pc.fill_null(fallback_mask, False)
+
+        # Replace the tokens over the whole array
+        updated_plot_input_data_array = plot_input_data_array
+        for old_sample_name_iter_, new_sample_name_iter_ in self.rename_map.items():
+            updated_plot_input_data_array = pc.replace_substring(
+                updated_plot_input_data_array,
+                pattern=f'"{old_sample_name_iter_}"',
+                replacement=json.dumps(new_sample_name_iter_)
+            )
+
+        fallback_count = pc.sum(fallback_mask).as_py() or 0
+        self.string_kernel_rows += len(plot_input_data_array) - fallback_count
+        self.string_kernel_fallbacks += fallback_count
+        if fallback_count == 0:
+            return updated_plot_input_data_array
+
+        # Parse the rows the kernel could not safely rename
+        return pc.replace_with_mask(
+            updated_plot_input_data_array,
+            fallback_mask,
+            pa.array(
+                self.update_plot_input_list(
+                    pc.filter(plot_input_data_array, fallback_mask).to_pylist()
+                ),
+                type=plot_input_data_array.type
+            )
+        )
+
+    def shutdown(self):
+        """
+        Shut down the process pool if it was started
+        :return:
+        """
+        if self.process_pool is not None:
+            self.process_pool.shutdown()
+            self.process_pool = None
+
+    def print_stats(self):
+        """
+        Write the cache counters to stderr
+        :return:
+        """
+        print(
+            f"Plot input data cache: {self.hits} hits, {self.misses} misses, "
+            f"{self.skips} skips, {self.evictions} evictions",
+            file=sys.stderr
+        )
+        if self.use_string_kernel:
+            print(
+                f"String kernel: {self.string_kernel_rows} rows renamed, "
+                f"{self.string_kernel_fallbacks} rows passed to the parse engine",
+                file=sys.stderr
+            )
+
+
+def update_sample_names_in_df(
+        df: "pd.DataFrame",
+        rename_map: Dict[str, str],
+        plot_input_data_cache: Optional[PlotInputDataCache] = None
+) -> "pd.DataFrame":
+    """
+    Given a multiqc DataFrame, update the sample names in place using columnar operations
+    :param df: The multiqc parquet DataFrame
+    :param rename_map: The mapping of old names to new names
+    :param plot_input_data_cache: The plot input data cache to rewrite through, created if not given
+    :return: The updated DataFrame
+    """
+    if plot_input_data_cache is None:
+        plot_input_data_cache = PlotInputDataCache(rename_map=rename_map)
+
+    # Build the row masks once from the type column
+    plot_input_mask = df['type'] == 'plot_input'
+    plot_input_row_mask = df['type'] == 'plot_input_row'
+
+    # Rewrite only the plot input data JSON strings of the matching rows
+    if plot_input_mask.any():
+        df.loc[plot_input_mask, 'plot_input_data'] = plot_input_data_cache.update_plot_input_array(
+            pa.array(df.loc[plot_input_mask, 'plot_input_data'].tolist(), type=pa.large_string())
+        ).to_pylist()
+
+    # Set the sample column for all plot input rows in a single assignment
+    if plot_input_row_mask.any():
+        if len(rename_map) == 1:
+            df.loc[plot_input_row_mask, 'sample'] = next(iter(rename_map.values()))
+        else:
+            df.loc[plot_input_row_mask, 'sample'] = df.loc[plot_input_row_mask, 'sample'].replace(rename_map)
+
+    return df
+
+
+def update_sample_names_in_record_batch(
+        record_batch: pa.RecordBatch,
+        rename_map: Dict[str, str],
+        plot_input_data_cache: Optional[PlotInputDataCache] = None
+) -> pa.RecordBatch:
+    """
+    Given a multiqc record batch, update the sample names with arrow compute.
+    Only the 'plot_input_data' and 'sample' columns are rebuilt, all other columns are passed through as is.
+    :param record_batch: The multiqc parquet record batch
+    :param rename_map: The mapping of old names to new names
+    :param plot_input_data_cache: The plot input data cache to rewrite through, created if not given
+    :return: The updated record batch
+    """
+    if plot_input_data_cache is None:
+        plot_input_data_cache = PlotInputDataCache(rename_map=rename_map)
+
+    # Build the row masks once from the type column, null types never match
+    type_array = record_batch.column('type')
+    plot_input_mask = pc.fill_null(pc.equal(type_array, 'plot_input'), False)
+    plot_input_row_mask = pc.fill_null(pc.equal(type_array, 'plot_input_row'), False)
+
+    columns = record_batch.columns
+
+    # Rewrite only the plot input data JSON strings of the matching rows
+    if pc.any(plot_input_mask).as_py():
+        plot_input_data_index = record_batch.schema.get_field_index('plot_input_data')
+        plot_input_data_array = columns[plot_input_data_index]
+        columns[plot_input_data_index] = pc.replace_with_mask(
+            plot_input_data_array,
+            plot_input_mask,
+            plot_input_data_cache.update_plot_input_array(
+                pc.filter(plot_input_data_array, plot_input_mask)
+            )
+        )
+
+    # Set the sample column for all plot input rows in a single kernel call
+    if pc.any(plot_input_row_mask).as_py():
+        sample_index = record_batch.schema.get_field_index('sample')
+        sample_array = columns[sample_index]
+        if len(rename_map) == 1:
+            columns[sample_index] = pc.if_else(
+                plot_input_row_mask,
+                pa.scalar(next(iter(rename_map.values())), type=sample_array.type),
+                sample_array
+            )
+        else:
+            # Look up each sample in the rename map, samples not in the map are left as is
+            rename_map_index = pc.index_in(
+                sample_array,
+                value_set=pa.array(list(rename_map.keys()), type=sample_array.type)
+            )
+            columns[sample_index] = pc.if_else(
+                pc.and_(plot_input_row_mask, pc.is_valid(rename_map_index)),
+                pc.take(pa.array(list(rename_map.values()), type=sample_array.type), rename_map_index),
+                sample_array
+            )
+
+    return pa.RecordBatch.from_arrays(columns, schema=record_batch.schema)
+
+
+def get_streaming_batch_size(
+        parquet_file: pq.ParquetFile,
+        max_memory_mb: int
+) -> int:
+    """
+    Given a parquet file, use the row group metadata to pick the number of rows
+    per batch that keeps the decoded batch within the memory budget
+    :param parquet_file:
+    :param max_memory_mb:
+    :return: The number of rows per batch
+    """
+    metadata = parquet_file.metadata
+    if metadata.num_rows == 0:
+        return 1
+
+    uncompressed_bytes_per_row = sum(
+        metadata.row_group(row_group_index_iter_).total_byte_size
+        for row_group_index_iter_ in range(metadata.num_row_groups)
+    ) / metadata.num_rows
+
+    return max(
+        1,
+        int(
+            (max_memory_mb * 1024 * 1024) /
+            (max(uncompressed_bytes_per_row, 1) * STREAMING_MEMORY_OVERHEAD_FACTOR)
+        )
+    )
+
+
+def stream_update_sample_names(
+        input_source: Union[Path, pa.NativeFile],
+        output_sink: Union[Path, pa.NativeFile],
+        rename_map: Dict[str, str],
+        max_memory_mb: int = DEFAULT_MAX_MEMORY_MB,
+        plot_input_data_cache: Optional[PlotInputDataCache] = None,
+        input_buffer_size: int = 0
+):
+    """
+    Given a parquet source, update the sample names one batch at a time, writing each batch to the sink as we go.
+    The source and sink may be local paths, in-memory arrow buffers or arrow wrapped python file objects.
+    :param input_source:
+    :param output_sink:
+    :param rename_map:
+    :param max_memory_mb:
+    :param plot_input_data_cache: The plot input data cache shared across batches, created if not given
+    :param input_buffer_size: If positive, column chunks are read from the source in reads of this size,
+      rather than a whole column chunk at a time
+    :return:
+    """
+    if plot_input_data_cache is None:
+        plot_input_data_cache = PlotInputDataCache(rename_map=rename_map)
+
+    with pq.ParquetFile(input_source, buffer_size=input_buffer_size) as parquet_file:
+        with pq.ParquetWriter(output_sink, schema=parquet_file.schema_arrow) as parquet_writer:
+            for record_batch_iter_ in parquet_file.iter_batches(
+                batch_size=get_streaming_batch_size(parquet_file, max_memory_mb),
+                use_pandas_metadata=True
+            ):
+                parquet_writer.write_batch(
+                    update_sample_names_in_record_batch(
+                        record_batch=record_batch_iter_,
+                        rename_map=rename_map,
+                        plot_input_data_cache=plot_input_data_cache
+                    )
+                )
+
+
+def stream_update_sample_names_in_parquet_file(
+        input_parquet_file: Path,
+        output_parquet_file: Path,
+        rename_map: Dict[str, str],
+        max_memory_mb: int = DEFAULT_MAX_MEMORY_MB,
+        plot_input_data_cache: Optional[PlotInputDataCache] = None
+):
+    """
+    Given a parquet file, update the sample names one batch at a time, writing each batch to the output as we go.
+    We write to a temporary file in the output directory first, so the output may be the same as the input.
+    :param input_parquet_file:
+    :param output_parquet_file:
+    :param rename_map:
+    :param max_memory_mb:
+    :param plot_input_data_cache: The plot input data cache shared across batches, created if not given
+    :return:
+    """
+    with NamedTemporaryFile(
+        dir=output_parquet_file.absolute().parent,
+        prefix=f".{output_parquet_file.name}.",
+        suffix=".tmp",
+        delete=False
+    ) as temp_file_h:
+        temp_file_path = Path(temp_file_h.name)
+
+    try:
+        stream_update_sample_names(
+            input_source=input_parquet_file,
+            output_sink=temp_file_path,
+            rename_map=rename_map,
+            max_memory_mb=max_memory_mb,
+            plot_input_data_cache=plot_input_data_cache
+        )
+    except Exception:
+        temp_file_path.unlink(missing_ok=True)
+        raise
+
+    # Move the temp file into place
+    replace(temp_file_path, output_parquet_file)
+
+
+def read_rename_map_file(rename_map_file: Path) -> Dict[str, str]:
+    """
+    Read a rename map file, either a JSON object of old name to new name,
+    or a TSV file with the old name in the first column and the new name in the second column.
+    Empty lines and lines starting with '#' are ignored in the TSV file.
+    :param rename_map_file:
+    :return: The mapping of old names to new names
+    """
+    if rename_map_file.suffix == ".json":
+        with open(rename_map_file) as rename_map_file_h:
+            rename_map = json.load(rename_map_file_h)
+        if not isinstance(rename_map, dict):
+            raise ValueError(f"Expected a JSON object of old name to new name in {rename_map_file}")
+        return rename_map
+
+    rename_map = {}
+    with open(rename_map_file) as rename_map_file_h:
+        for line_iter_ in rename_map_file_h:
+            line_iter_ = line_iter_.rstrip("\n")
+            if not line_iter_.strip() or line_iter_.startswith("#"):
+                continue
+            try:
+                old_sample_name, new_sample_name = line_iter_.split("\t")
+            except ValueError:
+                raise ValueError(f"Expected two tab separated columns in {rename_map_file}, got '{line_iter_}'")
+            rename_map[old_sample_name] = new_sample_name
+
+    return rename_map
+
+
+def add_rename_args(args: argparse.ArgumentParser):
+    """
+    Add the sample naming, cache, workers and engine arguments to an argument parser.
+    Shared with the scripts that rename parquet files as part of a larger pipeline.
+    :param args:
+    :return:
+    """
+    # Naming args
+    args.add_argument(
+        "--old-sample-name",
+        type=str,
+        required=False,
+        help="The old name of the sample to be replaced. Must be used with --new-sample-name."
+    )
+    args.add_argument(
+        "--new-sample-name",
+        type=str,
+        required=False,
+        help="The new name of the sample to replace with. Must be used with --old-sample-name."
+    )
+    args.add_argument(
+        "--rename-map",
+        type=str,
+        required=False,
+        help=(
+            "A JSON (.json) object or two column TSV file of old sample names to new sample names. "
+            "Alternative to --old-sample-name / --new-sample-name."
+        )
+    )
+
+    # Cache args
+    args.add_argument(
+        "--plot-input-cache-mb",
+        type=int,
+        default=DEFAULT_PLOT_INPUT_CACHE_MB,
+        help=(
+            "The size in MB of the cache of rewritten plot input data JSON strings. "
+            f"Set to 0 to disable the cache. Defaults to {DEFAULT_PLOT_INPUT_CACHE_MB}."
+        )
+    )
+
+    # Parallel args
+    args.add_argument(
+        "--workers",
+        type=int,
+        default=DEFAULT_WORKERS,
+        help=(
+            "The number of processes used to rewrite the plot input data JSON strings. "
+            f"Defaults to {DEFAULT_WORKERS}."
+        )
+    )
+
+    # Engine args
+    args.add_argument(
+        "--engine",
+        choices=RENAME_ENGINES,
+        default=DEFAULT_RENAME_ENGINE,
+        help=(
+            "The engine used to rename samples in the plot input data JSON strings. "
+            "'parse' parses and serialises every string, "
+            "'arrow' replaces the sample name tokens with an arrow string kernel, "
+            f"parsing only the strings where this is ambiguous. Defaults to {DEFAULT_RENAME_ENGINE}."
         )
     )
 
 
+def check_rename_args(args: argparse.ArgumentParser, parsed_args: argparse.Namespace):
+    """
+    Confirm the parsed arguments added by add_rename_args are consistent
+    :param args:
+    :param parsed_args:
+    :return:
+    """
+    # Confirm we have exactly one way of naming the samples
+    if parsed_args.rename_map is not None:
+        if parsed_args.old_sample_name is not None or parsed_args.new_sample_name is not None:
+            args.error("--rename-map cannot be used with --old-sample-name / --new-sample-name")
+    elif parsed_args.old_sample_name is None or parsed_args.new_sample_name is None:
+        args.error("Either --rename-map or both --old-sample-name and --new-sample-name are required")
+
+    if parsed_args.workers < 1:
+        args.error("--workers must be at least 1")
+
 
-def update_plot_input_row(
-        series: pd.Series,
-        new_sample_name: str
-) -> pd.Series:
+def get_plot_input_data_cache_from_args(parsed_args: argparse.Namespace) -> PlotInputDataCache:
     """
-    Given a series, update the sample names in the 'sample' column
-    :param series:
-    :param new_sample_name:
+    Get the rename map from the parsed arguments added by add_rename_args, and create the plot input data cache
+    :param parsed_args:
     :return:
     """
-    series = series.copy()
-    series['sample'] = new_sample_name
+    # Get the rename map
+    if parsed_args.rename_map is not None:
+        rename_map = read_rename_map_file(Path(parsed_args.rename_map))
+    else:
+        rename_map = {
+            parsed_args.old_sample_name: parsed_args.new_sample_name
+        }
 
-    return series
+    return PlotInputDataCache(
+        rename_map=rename_map,
+        max_cache_mb=parsed_args.plot_input_cache_mb,
+        workers=parsed_args.workers,
+        engine=parsed_args.engine
+    )
 
 
 def get_args():
     """
     Use argparse, to get the arguments from the command line.
     We collect the following arguments
-    * --source-project-id
-    * --source-data-id
-    * --destination-project-id
-    * --destination-data-id
+    * --input-parquet-file
+    * --output-parquet-file
+    * --streaming / --max-memory-mb
+    * --old-sample-name / --new-sample-name, or --rename-map
+    * --plot-input-cache-mb
+    * --workers
+    * --engine
     :return:
     """
     # Get args
@@ -129,21 +872,30 @@ def get_args():
         help="The path to the output parquet file. May be the same as the input file."
     )
 
-    # Naming args
+    # Streaming args
     args.add_argument(
-        "--old-sample-name",
-        type=str,
-        required=True,
-        help="The old name of the sample to be replaced."
+        "--streaming",
+        action="store_true",
+        help="Rewrite the parquet file one batch at a time with bounded memory."
     )
     args.add_argument(
-        "--new-sample-name",
-        type=str,
-        required=True,
-        help="The new name of the sample to replace with."
+        "--max-memory-mb",
+        type=int,
+        default=DEFAULT_MAX_MEMORY_MB,
+        help=(
+            "The approximate memory budget in MB used to choose the streaming batch size. "
+            f"Only used with --streaming. Defaults to {DEFAULT_MAX_MEMORY_MB}."
+        )
     )
 
-    return args.parse_args()
+    # Naming, cache, workers and engine args
+    add_rename_args(args)
+
+    parsed_args = args.parse_args()
+
+    check_rename_args(args, parsed_args)
+
+    return parsed_args
 
 
 def main():
@@ -155,28 +907,39 @@ def main():
     # Get args
     args = get_args()
 
-    # Read the parquet file into a pandas DataFrame
-    df = pd.read_parquet(args.input_parquet_file)
-
-    # Iterate through each item and replace the old sample name with the new sample name
-    # Iterate through each row in the DataFrame
-    for index, row in df.iterrows():
-        if row['type'] == 'plot_input':
-            # Update the plot input data
-            df.loc[index, 'plot_input_data'] = update_plot_input(
-                plot_input_data=cast(str, cast(object, row['plot_input_data'])),
-                old_sample_name=args.old_sample_name,
-                new_sample_name=args.new_sample_name
+    # Get the rename map and create the plot input data cache
+    plot_input_data_cache = get_plot_input_data_cache_from_args(args)
+    rename_map = plot_input_data_cache.rename_map
+
+    try:
+        # Rewrite the file batch by batch if requested
+        if args.streaming:
+            stream_update_sample_names_in_parquet_file(
+                input_parquet_file=Path(args.input_parquet_file),
+                output_parquet_file=Path(args.output_parquet_file),
+                rename_map=rename_map,
+                max_memory_mb=args.max_memory_mb,
+                plot_input_data_cache=plot_input_data_cache
             )
-        elif row['type'] == 'plot_input_row':
-            # Update the plot input row
-            df.loc[index, :] = update_plot_input_row(
-                series=row,
-                new_sample_name=args.new_sample_name
+        else:
+            import pandas as pd
+
+            # Read the parquet file into a pandas DataFrame
+            df = pd.read_parquet(args.input_parquet_file)
+
+            # Replace the old sample names with the new sample names
+            df = update_sample_names_in_df(
+                df=df,
+                rename_map=rename_map,
+                plot_input_data_cache=plot_input_data_cache
             )
 
-    # Write the updated DataFrame back to a parquet file
-    df.to_parquet(args.output_parquet_file, index=False)
+            # Write the updated DataFrame back to a parquet file
+            df.to_parquet(args.output_parquet_file, index=False)
+    finally:
+        plot_input_data_cache.shutdown()
+
+    plot_input_data_cache.print_stats()
 
 
 if __name__ == "__main__":
@@ -1,109 +1,311 @@
 #!/usr/bin/env python3
 
 """
-Given a file and an upload url, upload the file to the url.
+Given a file and an output uri, upload the file to the output uri.
+
+The upload is made from a binary file object, so callers may upload an in-memory buffer
+with upload_file_obj_to_icav2 rather than writing it to disk first.
+
+Files smaller than the multipart threshold are streamed in a single PUT to an ICAv2 upload url,
+over a pooled connection that retries on server errors.
+
+Files at or above the multipart threshold are uploaded with an S3 multipart upload,
+using temporary AWS credentials for the destination folder.
+Parts are uploaded in parallel, and each part is retried on its own.
+We then wait for ICAv2 to register the uploaded file.
+
+In both cases, memory use is bounded by the chunk / part size rather than the file size.
+
+If a file already exists at the output uri, and has not finished uploading (e.g. left by an interrupted run),
+we re-upload it in place through a new upload url for the same file.
+Otherwise the existing file is deleted first, and we poll with exponential backoff up to a deadline
+until ICAv2 no longer finds it, ICAv2 has no way to swap a new file in over an existing one.
+
+Destination folders are kept for FOLDER_CACHE_TTL_SECONDS keyed by their normalised uri
+(lower cased scheme, repeated slashes collapsed, and a trailing slash),
+so uploads to the same folder within a process only resolve (or create) it once.
+Only folders are kept, the files we delete and re-upload are always looked up again.
 """
 # Standard imports
 import argparse
+import re
 from pathlib import Path
-from subprocess import run
-from tempfile import NamedTemporaryFile
-from textwrap import dedent
-from time import sleep
+from time import monotonic, sleep, time
+from typing import BinaryIO, Dict, Optional, Tuple
 from urllib.parse import urlparse, urlunparse
 
-# Libica imports
-from libica.openapi.v3 import ApiException
+# Upload imports
+from urllib3 import PoolManager
+from urllib3.util import Retry
 
 # Wrapica imports
 from wrapica.project_data import (
     convert_uri_to_project_data_obj,
     create_file_with_upload_url,
-    delete_project_data, get_project_data_obj_from_project_id_and_path
+    delete_project_data, get_project_data_obj_from_project_id_and_path,
+    get_aws_credentials_access_for_project_folder,
+    get_project_data_upload_url
 )
 
 # Globals
 MULTIQC_PARQUET_NAME = "multiqc.parquet"
+DEFAULT_MULTIPART_THRESHOLD_MB = 100
+DEFAULT_PART_SIZE_MB = 16
+DEFAULT_MAX_CONCURRENCY = 4
+MAX_RETRIES = 5
+# How long we wait for ICAv2 to register a multipart uploaded file
+FILE_REGISTRATION_TIMEOUT_SECONDS = 600
+# How long we wait for ICAv2 to remove a deleted file, polling with exponential backoff
+DATA_DELETION_TIMEOUT_SECONDS = 120
+DATA_DELETION_INITIAL_POLL_SECONDS = 0.5
+DATA_DELETION_POLL_BACKOFF_FACTOR = 1.5
+DATA_DELETION_MAX_POLL_SECONDS = 8
+FOLDER_CACHE_TTL_SECONDS = 300
+
+# Normalised folder uri -> (time resolved, folder object)
+FOLDER_OBJECT_CACHE: Dict[str, Tuple[float, object]] = {}
+
+
+def get_normalised_folder_uri(folder_uri: str) -> str:
+    """
+    Get the normalised form of a folder uri, used as the folder cache key and resolved in place of the uri.
+    The scheme is lower cased, repeated slashes in the path are collapsed
+    (ICAv2 data paths have no empty folder names), and the path always ends with a slash
+    :param folder_uri:
+    :return:
+    """
+    folder_uri_obj = urlparse(folder_uri)
+    folder_path = re.sub("/{2,}", "/", folder_uri_obj.path.rstrip("/") + "/")
+    return f"{folder_uri_obj.scheme.lower()}://{folder_uri_obj.netloc}{folder_path}"
 
 
-def get_shell_script_template() -> str:
-    return dedent(
-        """
-        #!/usr/bin/env bash
+def get_destination_folder_object(destination_folder_uri: str):
+    """
+    Get the folder object of the destination folder uri, creating the folder if it does not exist,
+    from the folder cache if it was resolved within the last FOLDER_CACHE_TTL_SECONDS
+    :param destination_folder_uri:
+    :return:
+    """
+    normalised_folder_uri = get_normalised_folder_uri(destination_folder_uri)
 
-        set -euo pipefail
+    resolved_time, destination_folder_object = FOLDER_OBJECT_CACHE.get(normalised_folder_uri, (None, None))
+    if resolved_time is not None and monotonic() - resolved_time < FOLDER_CACHE_TTL_SECONDS:
+        return destination_folder_object
 
-        # This actually loads the entire file into memory before uploading it
-        curl --fail-with-body --silent --show-error --location \
-          --request PUT \
-          --header 'Content-Type: application/octet-stream' \
-          --data-binary "@-" \
-          --url "__UPLOAD_PRESIGNED_URL__" < "__INPUT_FILE__"
-        """
+    destination_folder_object = convert_uri_to_project_data_obj(
+        normalised_folder_uri,
+        create_data_if_not_found=True
     )
+    FOLDER_OBJECT_CACHE[normalised_folder_uri] = (monotonic(), destination_folder_object)
+
+    return destination_folder_object
 
 
-def generate_shell_script(
-        input_file: str,
-        destination_file_upload_url: str,
+def upload_file_with_put(
+        input_file_obj: BinaryIO,
+        input_file_size: int,
+        destination_file_upload_url: str
 ):
-    # Create a temp file
-    temp_file_path = NamedTemporaryFile(
-        delete=False,
-        suffix=".sh"
-    ).name
-
-    # Write the shell script to the temp file
-    with open(temp_file_path, "w") as temp_file_h:
-        temp_file_h.write(
-            get_shell_script_template().replace(
-                "__INPUT_FILE__", input_file
-            ).replace(
-                "__UPLOAD_PRESIGNED_URL__", destination_file_upload_url
-            ) + "\n"
+    """
+    Stream the file object to the upload url in a single PUT request
+    :param input_file_obj:
+    :param input_file_size:
+    :param destination_file_upload_url:
+    :return:
+    """
+    pool_manager = PoolManager(
+        retries=Retry(
+            total=MAX_RETRIES,
+            backoff_factor=1,
+            status_forcelist=[500, 502, 503, 504],
+            allowed_methods=["PUT"]
         )
+    )
 
-    return temp_file_path
+    # Passing the file object as the body streams the file in chunks,
+    # the file object is rewound by urllib3 if the request is retried
+    response = pool_manager.request(
+        "PUT",
+        destination_file_upload_url,
+        body=input_file_obj,
+        headers={
+            "Content-Type": "application/octet-stream",
+            "Content-Length": str(input_file_size)
+        }
+    )
+
+    if not 200 <= response.status < 300:
+        raise RuntimeError(
+            f"Failed to upload {MULTIQC_PARQUET_NAME} with status {response.status}. "
+            f"Response was {response.data.decode()}"
+        )
 
 
-def run_shell_script(
-        shell_script_path: str,
+def upload_file_with_multipart(
+        input_file_obj: BinaryIO,
+        destination_folder_object,
+        part_size_mb: int,
+        max_concurrency: int
 ):
     """
-    Run the shell script with the following environment variables set
-    :param shell_script_path:
+    Upload the file object to the destination folder with an S3 multipart upload,
+    using temporary credentials for the folder
+    :param input_file_obj:
+    :param destination_folder_object:
+    :param part_size_mb:
+    :param max_concurrency:
     :return:
     """
-    proc = run(
-        [
-            "bash", shell_script_path
-        ],
-        capture_output=True
+    # Imported here so that uploads under the multipart threshold do not pay for the boto3 import
+    import boto3
+    from boto3.s3.transfer import TransferConfig
+    from botocore.config import Config
+
+    aws_temp_credentials = get_aws_credentials_access_for_project_folder(
+        project_id=str(destination_folder_object.project_id),
+        folder_id=str(destination_folder_object.data.id),
+        folder_path=None
     )
 
-    if not proc.returncode == 0:
-        raise RuntimeError(
-            f"Failed to run shell script {shell_script_path} with return code {proc.returncode}. "
-            f"Stdout was {proc.stdout.decode()}"
-            f"Stderr was {proc.stderr.decode()}"
+    s3_client = boto3.client(
+        "s3",
+        aws_access_key_id=aws_temp_credentials.access_key,
+        aws_secret_access_key=aws_temp_credentials.secret_key,
+        aws_session_token=aws_temp_credentials.session_token,
+        region_name=aws_temp_credentials.region,
+        config=Config(
+            retries={
+                "max_attempts": MAX_RETRIES,
+                "mode": "standard"
+            }
         )
+    )
+
+    extra_args = {}
+    if getattr(aws_temp_credentials, "server_side_encryption_algorithm", None):
+        extra_args["ServerSideEncryption"] = aws_temp_credentials.server_side_encryption_algorithm
+    if getattr(aws_temp_credentials, "server_side_encryption_key", None):
+        extra_args["SSEKMSKeyId"] = aws_temp_credentials.server_side_encryption_key
+
+    s3_client.upload_fileobj(
+        Fileobj=input_file_obj,
+        Bucket=aws_temp_credentials.bucket,
+        Key=aws_temp_credentials.object_prefix.rstrip("/") + "/" + MULTIQC_PARQUET_NAME,
+        ExtraArgs=extra_args,
+        Config=TransferConfig(
+            multipart_threshold=part_size_mb * 1024 * 1024,
+            multipart_chunksize=part_size_mb * 1024 * 1024,
+            max_concurrency=max_concurrency,
+            use_threads=True
+        )
+    )
+
+
+def wait_for_file_registration(
+        project_id: str,
+        data_path: Path
+):
+    """
+    Wait until ICAv2 has registered the uploaded file and it is available
+    :param project_id:
+    :param data_path:
+    :return:
+    """
+    start_time = time()
+    while True:
+        try:
+            file_obj = get_project_data_obj_from_project_id_and_path(
+                project_id=project_id,
+                data_path=data_path,
+                data_type='FILE'
+            )
+        except FileNotFoundError:
+            pass
+        else:
+            if get_data_status(file_obj) == "AVAILABLE":
+                return
+
+        if time() - start_time > FILE_REGISTRATION_TIMEOUT_SECONDS:
+            raise TimeoutError(f"{data_path} was not registered in ICAv2 after {FILE_REGISTRATION_TIMEOUT_SECONDS}s")
+        sleep(5)
+
+
+def get_data_status(data_object) -> str:
+    """
+    Get the status of a project data object as a string
+    :param data_object:
+    :return:
+    """
+    return getattr(data_object.data.details.status, "value", data_object.data.details.status)
 
-    return
+
+def get_in_place_upload_url(destination_file_object) -> Optional[str]:
+    """
+    Get an upload url for an existing file, so that it can be re-uploaded without deleting it first.
+    ICAv2 only creates upload urls for files that have not finished uploading,
+    so this returns None for files that are available.
+    :param destination_file_object:
+    :return:
+    """
+    if get_data_status(destination_file_object) != "PARTIAL":
+        return None
+
+    return get_project_data_upload_url(
+        project_id=str(destination_file_object.project_id),
+        data_id=str(destination_file_object.data.id)
+    )
+
+
+def delete_project_data_and_wait(
+        project_id: str,
+        data_id: str,
+        data_path: Path
+):
+    """
+    Delete the project data, then wait until ICAv2 no longer finds it at its path.
+    We poll with exponential backoff, and give up after DATA_DELETION_TIMEOUT_SECONDS
+    :param project_id:
+    :param data_id:
+    :param data_path:
+    :return:
+    """
+    delete_project_data(
+        project_id=project_id,
+        data_id=data_id
+    )
+
+    deadline = time() + DATA_DELETION_TIMEOUT_SECONDS
+    poll_seconds = DATA_DELETION_INITIAL_POLL_SECONDS
+    while True:
+        sleep(max(min(poll_seconds, deadline - time()), 0))
+        try:
+            get_project_data_obj_from_project_id_and_path(
+                project_id=project_id,
+                data_path=data_path,
+                data_type='FILE'
+            )
+        except FileNotFoundError:
+            return
+
+        if time() >= deadline:
+            raise TimeoutError(f"{data_path} was still found in ICAv2 {DATA_DELETION_TIMEOUT_SECONDS}s after deletion")
+        poll_seconds = min(poll_seconds * DATA_DELETION_POLL_BACKOFF_FACTOR, DATA_DELETION_MAX_POLL_SECONDS)
 
 
 def get_args():
     """
     Use argparse, to get the arguments from the command line.
     We collect the following arguments
-    * --source-project-id
-    * --source-data-id
-    * --destination-project-id
-    * --destination-data-id
+    * --input-file
+    * --output-uri
+    * --multipart-threshold-mb
+    * --part-size-mb
+    * --max-concurrency
     :return:
     """
     # Get args
     args = argparse.ArgumentParser(
-        description="Upload a single part file to ICAv2 with curl PUT"
+        description="Upload a file to ICAv2, with a streamed PUT or a parallel multipart upload for larger files"
     )
 
     # Source args
@@ -120,21 +322,56 @@ def get_args():
         help="The output uri where the file should be uploaded to."
     )
 
+    # Transfer args
+    args.add_argument(
+        "--multipart-threshold-mb",
+        type=int,
+        default=DEFAULT_MULTIPART_THRESHOLD_MB,
+        help=(
+            "Files of this size and above are uploaded with a multipart upload. "
+            f"Defaults to {DEFAULT_MULTIPART_THRESHOLD_MB}."
+        )
+    )
+    args.add_argument(
+        "--part-size-mb",
+        type=int,
+        default=DEFAULT_PART_SIZE_MB,
+        help=f"The size of each part of a multipart upload. Defaults to {DEFAULT_PART_SIZE_MB}."
+    )
+    args.add_argument(
+        "--max-concurrency",
+        type=int,
+        default=DEFAULT_MAX_CONCURRENCY,
+        help=f"The number of parts of a multipart upload to upload at once. Defaults to {DEFAULT_MAX_CONCURRENCY}."
+    )
+
     return args.parse_args()
 
 
-def main():
+def upload_file_obj_to_icav2(
+        input_file_obj: BinaryIO,
+        input_file_size: int,
+        output_uri: str,
+        multipart_threshold_mb: int = DEFAULT_MULTIPART_THRESHOLD_MB,
+        part_size_mb: int = DEFAULT_PART_SIZE_MB,
+        max_concurrency: int = DEFAULT_MAX_CONCURRENCY
+):
     """
-    Given the inputs of a local file and an output uri,
+    Given a binary file object and an output uri,
     perform the following steps:
-    1. Create an upload uri in the destination folder
-    2. Create a shell script that uses curl to upload the file to the upload uri
+    1. If there is an existing file at the output uri, re-upload it in place if ICAv2 allows, otherwise delete it
+    2. Upload the file object, in a single streamed PUT to an upload url,
+       or with a multipart upload if the file is at or above the multipart threshold
+    :param input_file_obj:
+    :param input_file_size:
+    :param output_uri:
+    :param multipart_threshold_mb:
+    :param part_size_mb:
+    :param max_concurrency:
     :return:
     """
-    args = get_args()
-
     # Get the parent uri of the destination uri
-    destination_uri_obj = urlparse(args.output_uri)
+    destination_uri_obj = urlparse(output_uri)
     parent_uri = str(Path(destination_uri_obj.path).parent) + "/"
 
     destination_folder_uri = str(urlunparse((
@@ -145,10 +382,9 @@ def main():
     )))
 
     # Get the destination folder object
-    destination_folder_object = convert_uri_to_project_data_obj(
-        destination_folder_uri,
-        create_data_if_not_found=True
-    )
+    destination_folder_object = get_destination_folder_object(destination_folder_uri)
+
+    is_multipart_upload = input_file_size >= multipart_threshold_mb * 1024 * 1024
 
     # Try get the file object
     try:
@@ -160,23 +396,41 @@ def main():
         # We expect this
         pass
     else:
+        # Re-upload the existing file in place if we can,
+        # multipart uploads are always deleted first, so that we can wait for the new file to be registered
+        in_place_upload_url = None if is_multipart_upload else get_in_place_upload_url(destination_file_object)
+        if in_place_upload_url is not None:
+            print(f"Re-uploading {destination_folder_uri}{MULTIQC_PARQUET_NAME} in place")
+            upload_file_with_put(
+                input_file_obj=input_file_obj,
+                input_file_size=input_file_size,
+                destination_file_upload_url=in_place_upload_url
+            )
+            return
+
         print(f"Deleting {destination_folder_uri}{MULTIQC_PARQUET_NAME} before regenerating the upload url")
         # Delete the file first before regenerating the upload url
-        delete_project_data(
+        # Don't move on until file is deleted from database
+        delete_project_data_and_wait(
             project_id=str(destination_file_object.project_id),
             data_id=str(destination_file_object.data.id),
+            data_path=Path(str(destination_file_object.data.details.path))
         )
-        # Don't move on until file is deleted from database
-        while True:
-            sleep(1)
-            try:
-                get_project_data_obj_from_project_id_and_path(
-                    project_id=str(destination_file_object.project_id),
-                    data_path=Path(str(destination_file_object.data.details.path)),
-                    data_type='FILE'
-                )
-            except FileNotFoundError:
-                break
+
+    # Upload larger files in parts
+    if is_multipart_upload:
+        print(f"Uploading to {destination_folder_uri}{MULTIQC_PARQUET_NAME} with a multipart upload")
+        upload_file_with_multipart(
+            input_file_obj=input_file_obj,
+            destination_folder_object=destination_folder_object,
+            part_size_mb=part_size_mb,
+            max_concurrency=max_concurrency
+        )
+        wait_for_file_registration(
+            project_id=str(destination_folder_object.project_id),
+            data_path=Path(str(destination_folder_object.data.details.path)) / MULTIQC_PARQUET_NAME
+        )
+        return
 
     # Create the upload url
     # Create the file object
@@ -186,16 +440,32 @@ def main():
         file_name=MULTIQC_PARQUET_NAME
     )
 
-    # Get the shell script
-    shell_script_path = generate_shell_script(
-        input_file=args.input_file,
+    # Stream the file object to the upload url
+    upload_file_with_put(
+        input_file_obj=input_file_obj,
+        input_file_size=input_file_size,
         destination_file_upload_url=destination_file_upload_url
     )
 
-    # Run the shell script
-    run_shell_script(
-        shell_script_path=shell_script_path,
-    )
+
+def main():
+    """
+    Given the inputs of a local file and an output uri, upload the file to the output uri
+    :return:
+    """
+    args = get_args()
+
+    input_file = Path(args.input_file)
+
+    with open(input_file, "rb") as input_file_h:
+        upload_file_obj_to_icav2(
+            input_file_obj=input_file_h,
+            input_file_size=input_file.stat().st_size,
+            output_uri=args.output_uri,
+            multipart_threshold_mb=args.multipart_threshold_mb,
+            part_size_mb=args.part_size_mb,
+            max_concurrency=args.max_concurrency
+        )
 
 
 if __name__ == "__main__":
@@ -0,0 +1,138 @@
+#!/usr/bin/env python3
+
+"""
+Shared fixtures of the sample rename tests.
+
+* The recursive walkers the sample rename script used before replace_names
+* A multiqc like DataFrame of plot input and plot input rows for a per fastq file,
+  optionally with some plot input data strings serialised with compact separators and non-ASCII characters
+"""
+
+# Standard imports
+import json
+import random
+from typing import Dict, List
+import pandas as pd
+
+# Globals
+SAMPLE_NAMES = ["L2400001", "L2400002", "L2400003", "L24000011", "PRJ240001"]
+SINGLE_RENAME_MAP = {"L2400001": "L2400001_rerun"}
+MULTI_RENAME_MAP = {"L2400001": "L2400004", "L2400003": "L2400005"}
+SWAPPED_RENAME_MAP = {"L2400001": "L2400002", "L2400002": "L2400001"}
+RANDOM_SEED = 20240101
+
+
+def recursively_replace_name(d, old_name, new_name):
+    """
+    The previous recursive walker, as it was before replace_names
+    :param d: The dictionary to update
+    :param old_name: The name to replace
+    :param new_name: The new name
+    :return: The updated dictionary
+    """
+    if isinstance(d, dict):
+        return {
+            (
+                new_name
+                if k == old_name
+                else k
+            ): recursively_replace_name(v, old_name, new_name)
+            for k, v in
+            d.items()
+        }
+    elif isinstance(d, list):
+        return [
+            recursively_replace_name(i, old_name, new_name)
+            for i in d
+        ]
+    elif isinstance(d, str):
+        return (
+            new_name
+            if d == old_name
+            else d
+        )
+    return d
+
+
+def recursively_replace_names(d, rename_map: Dict[str, str]):
+    """
+    The previous recursive walker, extended to a rename map so that swapped names are renamed in a single pass
+    :param d:
+    :param rename_map:
+    :return:
+    """
+    if isinstance(d, dict):
+        return {
+            rename_map.get(k, k): recursively_replace_names(v, rename_map)
+            for k, v in
+            d.items()
+        }
+    elif isinstance(d, list):
+        return [
+            recursively_replace_names(i, rename_map)
+            for i in d
+        ]
+    elif isinstance(d, str):
+        return rename_map.get(d, d)
+    return d
+
+
+def get_multiqc_df(sample_name: str, row_count: int = 300, compact_row_step: int = 0) -> pd.DataFrame:
+    """
+    Build a multiqc like DataFrame of plot input and plot input rows for a per fastq file,
+    the plot input data strings mention the sample and the other sample names as keys, values and substrings,
+    or none of the sample names at all
+    :param sample_name:
+    :param row_count:
+    :param compact_row_step: If set, every nth plot input data string, starting with the first,
+      is serialised with compact separators and with its non-ASCII characters unescaped
+    :return:
+    """
+    random_generator = random.Random(RANDOM_SEED)
+
+    rows: List[Dict] = []
+    for row_index_iter_ in range(row_count):
+        if row_index_iter_ % 3 == 0:
+            plot_input_data = {
+                "anchor": f"plot_{row_index_iter_ % 7}",
+                "data": [{
+                    sample_name_iter_: {"x": random_generator.randint(0, 5)}
+                    for sample_name_iter_ in [sample_name] + random_generator.sample(SAMPLE_NAMES, 2)
+                }],
+                "samples": [sample_name, random_generator.choice(SAMPLE_NAMES)]
+            }
+            # Some strings have the sample name inside another string, or unicode escapes,
+            # which the arrow engine passes to the parse engine
+            if row_index_iter_ % 6 == 0:
+                plot_input_data["title"] = f"Sample {sample_name} metrics"
+            if row_index_iter_ % 9 == 0:
+                plot_input_data["units"] = "µm"
+            # Some strings have none of the sample names, which can be skipped without being parsed
+            if row_index_iter_ % 5 == 0:
+                plot_input_data = {
+                    "anchor": f"plot_{row_index_iter_ % 7}",
+                    "pconfig": {"title": "Read length (bp)", "ylab": "Reads"}
+                }
+
+            if compact_row_step and (row_index_iter_ // 3) % compact_row_step == 0:
+                plot_input_data_str = json.dumps(plot_input_data, separators=(",", ":"), ensure_ascii=False)
+            else:
+                plot_input_data_str = json.dumps(plot_input_data)
+
+            rows.append({
+                "anchor": f"plot_{row_index_iter_ % 7}",
+                "type": "plot_input",
+                "sample": None,
+                "plot_input_data": plot_input_data_str,
+                "value": None,
+            })
+        else:
+            rows.append({
+                "anchor": f"table_{row_index_iter_ % 5}",
+                "type": "plot_input_row",
+                "sample": random_generator.choice([sample_name] + SAMPLE_NAMES),
+                "plot_input_data": None,
+                "value": random_generator.random(),
+            })
+
+    return pd.DataFrame(rows)
@@ -0,0 +1,166 @@
+#!/usr/bin/env python3
+
+"""
+Differential tests of the parse and arrow rename engines of update_sample_names_in_parquet_files.py.
+
+* The parse and arrow engines write the same parquet bytes, through both the pandas and the streaming rewrite
+* Both give the same table as the row by row rename with the recursive walker
+* With a single rename, a rename map, and a rename map that swaps two sample names
+* With plot input data strings serialised by json.dumps, and with some serialised with compact separators
+  and non-ASCII characters, which both engines parse
+
+Not shipped in the container image, run from this directory with
+uv run --with pyarrow --with pandas python3 -m unittest test_rename_engines.py
+"""
+
+# Standard imports
+import json
+import sys
+import unittest
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from typing import Dict
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+# Local imports
+sys.path.append(str(Path(__file__).absolute().parent.parent / "scripts"))
+from update_sample_names_in_parquet_files import (  # noqa: E402
+    PlotInputDataCache,
+    stream_update_sample_names_in_parquet_file,
+    update_sample_names_in_df
+)
+from sample_rename_fixtures import (  # noqa: E402
+    MULTI_RENAME_MAP,
+    SINGLE_RENAME_MAP,
+    SWAPPED_RENAME_MAP,
+    get_multiqc_df,
+    recursively_replace_names
+)
+
+
+class TestRenameEngines(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = TemporaryDirectory()
+        self.temp_dir_path = Path(self.temp_dir.name)
+        self.input_parquet_file = self.temp_dir_path / "input.parquet"
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def get_pandas_engine_bytes(self, rename_map: Dict[str, str], engine: str) -> bytes:
+        """
+        Rename the input with the pandas engine, return the bytes of the output parquet file
+        """
+        output_parquet_file = self.temp_dir_path / f"pandas_{engine}.parquet"
+        self.plot_input_data_cache = PlotInputDataCache(rename_map=rename_map, engine=engine)
+        update_sample_names_in_df(
+            df=pd.read_parquet(self.input_parquet_file),
+            rename_map=rename_map,
+            plot_input_data_cache=self.plot_input_data_cache
+        ).to_parquet(output_parquet_file, index=False)
+        return output_parquet_file.read_bytes()
+
+    def write_input_parquet_file(self, compact_row_step: int = 0):
+        """
+        Write the multiqc like input parquet file
+        """
+        get_multiqc_df("L2400001", compact_row_step=compact_row_step).to_parquet(
+            self.input_parquet_file, index=False
+        )
+
+    def get_streaming_engine_bytes(self, rename_map: Dict[str, str], engine: str) -> bytes:
+        """
+        Rename the input with the streaming engine in small batches, return the bytes of the output parquet file
+        """
+        output_parquet_file = self.temp_dir_path / f"streaming_{engine}.parquet"
+        plot_input_data_cache = PlotInputDataCache(rename_map=rename_map, engine=engine)
+        stream_update_sample_names_in_parquet_file(
+            input_parquet_file=self.input_parquet_file,
+            output_parquet_file=output_parquet_file,
+            rename_map=rename_map,
+            max_memory_mb=1,
+            plot_input_data_cache=plot_input_data_cache
+        )
+        if engine == "arrow":
+            self.arrow_string_kernel_rows = plot_input_data_cache.string_kernel_rows
+        return output_parquet_file.read_bytes()
+
+    def get_expected_table(self, rename_map: Dict[str, str]) -> pa.Table:
+        """
+        Rename the input row by row with the recursive walker, as the expected table
+        """
+        df = pd.read_parquet(self.input_parquet_file)
+        for index, row in df.iterrows():
+            if row['type'] == 'plot_input':
+                df.loc[index, 'plot_input_data'] = json.dumps(
+                    recursively_replace_names(json.loads(row['plot_input_data']), rename_map)
+                )
+            elif row['type'] == 'plot_input_row':
+                df.loc[index, 'sample'] = (
+                    next(iter(rename_map.values()))
+                    if len(rename_map) == 1
+                    else rename_map.get(row['sample'], row['sample'])
+                )
+        return pa.Table.from_pandas(df, preserve_index=False).replace_schema_metadata(None)
+
+    def assert_engines_match(self, rename_map: Dict[str, str], compact_row_step: int = 0):
+        """
+        Every engine gives the same parquet bytes as its counterpart, and the same table as the expected rename
+        """
+        self.write_input_parquet_file(compact_row_step=compact_row_step)
+        expected_table = self.get_expected_table(rename_map)
+
+        pandas_parse_bytes = self.get_pandas_engine_bytes(rename_map, "parse")
+        self.assertEqual(self.get_pandas_engine_bytes(rename_map, "arrow"), pandas_parse_bytes)
+
+        streaming_parse_bytes = self.get_streaming_engine_bytes(rename_map, "parse")
+        self.assertEqual(self.get_streaming_engine_bytes(rename_map, "arrow"), streaming_parse_bytes)
+
+        # The string kernel is used unless a name is renamed more than once, e.g. swapped names,
+        # or the strings are not serialised by json.dumps with its default arguments
+        if rename_map.keys().isdisjoint(rename_map.values()) and not compact_row_step:
+            self.assertGreater(self.arrow_string_kernel_rows, 0)
+        else:
+            self.assertEqual(self.arrow_string_kernel_rows, 0)
+
+        for output_bytes_iter_ in [pandas_parse_bytes, streaming_parse_bytes]:
+            output_table = pq.read_table(pa.BufferReader(output_bytes_iter_)).replace_schema_metadata(None)
+            self.assertTrue(output_table.equals(expected_table))
+
+    def test_single_rename(self):
+        """
+        A single rename sets every plot input row to the new name
+        """
+        self.assert_engines_match(SINGLE_RENAME_MAP)
+
+    def test_rename_map(self):
+        """
+        A rename map only renames the plot input rows whose sample is in the map
+        """
+        self.assert_engines_match(MULTI_RENAME_MAP)
+
+    def test_swapped_rename_map(self):
+        """
+        Swapped names are renamed in a single pass, rather than renamed back
+        """
+        self.assert_engines_match(SWAPPED_RENAME_MAP)
+
+    def test_single_rename_with_compact_json(self):
+        """
+        Strings serialised with compact separators and non-ASCII characters are parsed by both engines,
+        rather than some kept as they were by the string kernel
+        """
+        self.assert_engines_match(SINGLE_RENAME_MAP, compact_row_step=4)
+
+    def test_rename_map_with_compact_json(self):
+        """
+        As above with a rename map
+        """
+        self.assert_engines_match(MULTI_RENAME_MAP, compact_row_step=4)
+
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+
+"""
+Tests of replace_names in update_sample_names_in_parquet_files.py.
+
+* replace_names is compared against the recursive walker the script used to have, over random plot input trees
+* replace_names walks a tree nested deeper than the recursion limit
+
+Not shipped in the container image, run from this directory with
+uv run --with pyarrow --with pandas python3 -m unittest test_replace_names.py
+"""
+
+# Standard imports
+import json
+import random
+import sys
+import unittest
+from copy import deepcopy
+from pathlib import Path
+
+# Local imports
+sys.path.append(str(Path(__file__).absolute().parent.parent / "scripts"))
+from update_sample_names_in_parquet_files import replace_names  # noqa: E402
+from sample_rename_fixtures import (  # noqa: E402
+    MULTI_RENAME_MAP,
+    RANDOM_SEED,
+    SAMPLE_NAMES,
+    SINGLE_RENAME_MAP,
+    SWAPPED_RENAME_MAP,
+    recursively_replace_name,
+    recursively_replace_names
+)
+
+# Globals
+RANDOM_TREE_COUNT = 500
+DEEP_NESTING_DEPTH = 5000
+
+
+def get_random_tree(random_generator: random.Random, depth: int = 0):
+    """
+    Build a random plot input tree of dicts, lists, sample names and other values
+    :param random_generator:
+    :param depth:
+    :return:
+    """
+    node_type = random_generator.choice(
+        ["dict", "list", "name", "other"] if depth < 5 else ["name", "other"]
+    )
+    if node_type == "dict":
+        return {
+            random_generator.choice(SAMPLE_NAMES + ["data", "samples", "title", "pconfig"]):
+                get_random_tree(random_generator, depth + 1)
+            for _ in range(random_generator.randint(0, 5))
+        }
+    if node_type == "list":
+        return [
+            get_random_tree(random_generator, depth + 1)
+            for _ in range(random_generator.randint(0, 5))
+        ]
+    if node_type == "name":
+        return random_generator.choice(SAMPLE_NAMES)
+    return random_generator.choice([1, 2.5, None, True, "Sample L2400001 metrics", "L2400001_2"])
+
+
+class TestReplaceNames(unittest.TestCase):
+    def test_matches_recursive_walker_on_random_trees(self):
+        """
+        replace_names gives the same JSON as the recursive walker, with and without swapped names,
+        and never changes its input
+        """
+        random_generator = random.Random(RANDOM_SEED)
+        for _ in range(RANDOM_TREE_COUNT):
+            tree = get_random_tree(random_generator)
+            tree_copy = deepcopy(tree)
+            for rename_map_iter_ in [SINGLE_RENAME_MAP, MULTI_RENAME_MAP, SWAPPED_RENAME_MAP]:
+                expected_tree = recursively_replace_names(tree, rename_map_iter_)
+                self.assertEqual(
+                    json.dumps(replace_names(tree, rename_map_iter_)),
+                    json.dumps(expected_tree)
+                )
+                self.assertEqual(json.dumps(tree), json.dumps(tree_copy))
+
+            # The single name walker of the previous script
+            old_sample_name, new_sample_name = next(iter(SINGLE_RENAME_MAP.items()))
+            self.assertEqual(
+                json.dumps(replace_names(tree, SINGLE_RENAME_MAP)),
+                json.dumps(recursively_replace_name(tree, old_sample_name, new_sample_name))
+            )
+
+    def test_deep_nesting(self):
+        """
+        replace_names walks a tree nested deeper than the recursion limit
+        """
+        self.assertGreater(DEEP_NESTING_DEPTH, sys.getrecursionlimit())
+
+        tree = "L2400001"
+        expected_tree = "L2400002"
+        for depth_iter_ in range(DEEP_NESTING_DEPTH):
+            if depth_iter_ % 2 == 0:
+                tree = [tree, "other"]
+                expected_tree = [expected_tree, "other"]
+            else:
+                tree = {"L2400002": tree}
+                expected_tree = {"L2400001": expected_tree}
+
+        updated_tree = replace_names(tree, SWAPPED_RENAME_MAP)
+
+        # Walk down both trees side by side, json.dumps would itself hit the recursion limit
+        for _ in range(DEEP_NESTING_DEPTH):
+            if isinstance(expected_tree, list):
+                self.assertIsInstance(updated_tree, list)
+                self.assertEqual(updated_tree[1], expected_tree[1])
+                updated_tree, expected_tree = updated_tree[0], expected_tree[0]
+            else:
+                self.assertEqual(list(updated_tree.keys()), list(expected_tree.keys()))
+                updated_tree, expected_tree = updated_tree["L2400001"], expected_tree["L2400001"]
+        self.assertEqual(updated_tree, expected_tree)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+
+"""
+Regression tests of the sample rename in update_sample_names_in_parquet_files.py.
+
+* The pandas engine is compared byte for byte against the row by row iterrows rename the script used to have,
+  including with plot input data strings serialised with compact separators and non-ASCII characters
+
+Not shipped in the container image, run from this directory with
+uv run --with pyarrow --with pandas python3 -m unittest test_update_sample_names_in_parquet_files.py
+"""
+
+# Standard imports
+import json
+import sys
+import unittest
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from typing import Dict, cast
+import pandas as pd
+
+# Local imports
+sys.path.append(str(Path(__file__).absolute().parent.parent / "scripts"))
+from update_sample_names_in_parquet_files import (  # noqa: E402
+    PlotInputDataCache,
+    update_sample_names_in_df
+)
+from sample_rename_fixtures import (  # noqa: E402
+    SINGLE_RENAME_MAP,
+    get_multiqc_df,
+    recursively_replace_name
+)
+
+
+def iterrows_update_sample_names_in_df(df: pd.DataFrame, old_sample_name: str, new_sample_name: str) -> pd.DataFrame:
+    """
+    The previous row by row rename of main(), as it was before the columnar masks
+    :param df:
+    :param old_sample_name:
+    :param new_sample_name:
+    :return:
+    """
+    for index, row in df.iterrows():
+        if row['type'] == 'plot_input':
+            df.loc[index, 'plot_input_data'] = json.dumps(
+                recursively_replace_name(
+                    d=json.loads(cast(str, cast(object, row['plot_input_data']))),
+                    old_name=old_sample_name,
+                    new_name=new_sample_name
+                )
+            )
+        elif row['type'] == 'plot_input_row':
+            series = row.copy()
+            series['sample'] = new_sample_name
+            df.loc[index, :] = series
+
+    return df
+
+
+class TestColumnarRename(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = TemporaryDirectory()
+        self.temp_dir_path = Path(self.temp_dir.name)
+        self.input_parquet_file = self.temp_dir_path / "input.parquet"
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def get_pandas_engine_bytes(self, rename_map: Dict[str, str], engine: str) -> bytes:
+        """
+        Rename the input with the pandas engine, return the bytes of the output parquet file
+        """
+        output_parquet_file = self.temp_dir_path / f"pandas_{engine}.parquet"
+        self.plot_input_data_cache = PlotInputDataCache(rename_map=rename_map, engine=engine)
+        update_sample_names_in_df(
+            df=pd.read_parquet(self.input_parquet_file),
+            rename_map=rename_map,
+            plot_input_data_cache=self.plot_input_data_cache
+        ).to_parquet(output_parquet_file, index=False)
+        return output_parquet_file.read_bytes()
+
+    def assert_pandas_engine_matches_iterrows(self, compact_row_step: int):
+        """
+        The pandas engine writes the same bytes as the row by row rename of the previous script,
+        which serialised every plot input data string with json.dumps
+        """
+        get_multiqc_df("L2400001", compact_row_step=compact_row_step).to_parquet(
+            self.input_parquet_file, index=False
+        )
+        old_sample_name, new_sample_name = next(iter(SINGLE_RENAME_MAP.items()))
+
+        iterrows_parquet_file = self.temp_dir_path / "iterrows.parquet"
+        iterrows_update_sample_names_in_df(
+            df=pd.read_parquet(self.input_parquet_file),
+            old_sample_name=old_sample_name,
+            new_sample_name=new_sample_name
+        ).to_parquet(iterrows_parquet_file, index=False)
+
+        self.assertEqual(
+            self.get_pandas_engine_bytes(SINGLE_RENAME_MAP, "parse"),
+            iterrows_parquet_file.read_bytes()
+        )
+
+    def test_pandas_engine_matches_iterrows(self):
+        """
+        The pandas engine writes the same bytes as the previous script, skipping the strings without the sample
+        """
+        self.assert_pandas_engine_matches_iterrows(compact_row_step=0)
+        self.assertGreater(self.plot_input_data_cache.skips, 0)
+
+    def test_pandas_engine_matches_iterrows_with_compact_json(self):
+        """
+        Strings serialised with compact separators and non-ASCII characters are parsed rather than skipped,
+        so the pandas engine still writes the same bytes as the previous script
+        """
+        self.assert_pandas_engine_matches_iterrows(compact_row_step=4)
+        self.assertEqual(self.plot_input_data_cache.skips, 0)
+
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -98,6 +98,9 @@ With the outputs as follows:
 
 We also get the optional default inputs from SSM, the pipeline id and the project id
 
+If a merged parquet file uri is given, this single run level parquet file is used as the additional parquet files input
+in place of the per fastq parquet file uri list.
+
 """
 
 from typing import Dict, Any
@@ -112,6 +115,7 @@ def handler(event, context) -> Dict[str, Any]:
     """
     event_detail_body = event['readyEventDetail']
     parquet_file_uri_list = event['parquetFileUriList']
+    merged_parquet_file_uri = event.get('mergedParquetFileUri', None)
     sample_filters_uri = event['sampleFiltersFileUri']
 
     # Extract the inputs from the event detail body
@@ -131,13 +135,17 @@ def handler(event, context) -> Dict[str, Any]:
                         "location": event_detail_body['payload']['data']['inputs']['interOpDirectory']
                     },
                     "instrument_run_id": event_detail_body['payload']['data']['inputs']['instrumentRunId'],
-                    # Add in the parquet file uris
+                    # Add in the parquet file uris, or the merged parquet file uri if we have one
                     "additional_parquet_files": list(map(
                         lambda uri: {
                             "class": "File",
                             "location": uri
                         },
-                        parquet_file_uri_list
+                        (
+                            [merged_parquet_file_uri]
+                            if merged_parquet_file_uri is not None
+                            else parquet_file_uri_list
+                        )
                     )),
                     "sample_filters_tsv": (
                         # Add in the sample filters tsv if provided
@@ -2,42 +2,45 @@
 
 """
 Convert s3 uri to ICAv2 URI py
+
+The uris are resolved through the icav2 lookup cache layer,
+so the parent folder shared by many uris (i.e. the cacheUri) is only resolved once per warm lambda container.
+
+Given an s3UriList rather than an s3Uri, the uris are converted in one invocation.
+The parent folder shared by the uris of each bucket is created first, once,
+so the conversions do not race to create it, then the uris are converted at most MAX_CONCURRENT_CONVERSIONS at a time.
 """
 
 # Standard imports
+from concurrent.futures import ThreadPoolExecutor
+from os.path import commonpath
+from typing import Dict, List
 from urllib.parse import urlparse, urlunparse
 from pathlib import Path
 
 # Wrapica imports
-from wrapica.project_data import (
-    convert_uri_to_project_data_obj,
-    convert_project_data_obj_to_uri,
-    create_file_in_project, create_folder_in_project
-)
+from wrapica.project_data import convert_project_data_obj_to_uri
 
 # Layer imports
 from icav2_tools import set_icav2_env_vars
+from icav2_lookup_cache import convert_uri_to_project_data_obj
 
+# Globals
+MAX_CONCURRENT_CONVERSIONS = 8
 
-def handler(event, context):
+
+def get_icav2_uri_from_s3_uri(s3_uri: str) -> str:
     """
-    Convert the s3 output uri to ICAv2 uri
-    :param event:
-    :param context:
+    Get the ICAv2 uri of the s3 uri, creating its parent folder if the s3 uri does not exist yet
+    :param s3_uri:
     :return:
     """
-    # Set icav2 env vars
-    set_icav2_env_vars()
-
-    # Create the folder if it does not exist
     try:
-        convert_uri_to_project_data_obj(
-            event["s3Uri"]
-        )
-    except FileNotFoundError as e:
+        project_data_obj = convert_uri_to_project_data_obj(s3_uri)
+    except FileNotFoundError:
         # Create the parent directory
-        bucket = urlparse(event["s3Uri"]).netloc
-        parent_dir = str(Path(urlparse(event["s3Uri"]).path).parent) + "/"
+        bucket = urlparse(s3_uri).netloc
+        parent_dir = str(Path(urlparse(s3_uri).path).parent) + "/"
         parent_data_obj = convert_uri_to_project_data_obj(
             str(urlunparse((
                 "s3", bucket, parent_dir,
@@ -46,20 +49,97 @@ def handler(event, context):
             create_data_if_not_found=True
         )
 
+        return (
+            convert_project_data_obj_to_uri(
+                parent_data_obj,
+                uri_type='icav2'
+            ) + Path(urlparse(s3_uri).path).name
+        )
+
+    return convert_project_data_obj_to_uri(
+        project_data_obj,
+        uri_type='icav2'
+    )
+
+
+def get_shared_parent_folder_uris(s3_uri_list: List[str]) -> List[str]:
+    """
+    Get the deepest parent folder shared by the uris of each bucket, buckets whose uris share no parent folder are left out
+    :param s3_uri_list:
+    :return:
+    """
+    parent_paths_by_bucket: Dict[str, List[str]] = {}
+    for s3_uri_iter_ in s3_uri_list:
+        s3_uri_obj = urlparse(s3_uri_iter_)
+        parent_paths_by_bucket.setdefault(s3_uri_obj.netloc, []).append(str(Path(s3_uri_obj.path).parent))
+
+    shared_parent_folder_uris = []
+    for bucket_iter_, parent_paths_iter_ in parent_paths_by_bucket.items():
+        shared_parent_path = commonpath(parent_paths_iter_)
+        if shared_parent_path == "/":
+            continue
+        shared_parent_folder_uris.append(str(urlunparse((
+            "s3", bucket_iter_, shared_parent_path + "/",
+            None, None, None
+        ))))
+
+    return shared_parent_folder_uris
+
+
+def get_icav2_uri_map_from_s3_uri_list(s3_uri_list: List[str]) -> Dict[str, str]:
+    """
+    Get the ICAv2 uri of each s3 uri, creating the shared parent folders once before converting the uris concurrently
+    :param s3_uri_list:
+    :return: The ICAv2 uri of each unique s3 uri, keyed by s3 uri
+    """
+    s3_uri_list = list(dict.fromkeys(s3_uri_list))
+
+    with ThreadPoolExecutor(max_workers=MAX_CONCURRENT_CONVERSIONS) as executor:
+        # Create the shared parent folders first
+        list(executor.map(
+            lambda folder_uri_iter_: convert_uri_to_project_data_obj(folder_uri_iter_, create_data_if_not_found=True),
+            get_shared_parent_folder_uris(s3_uri_list)
+        ))
+
+        return dict(zip(
+            s3_uri_list,
+            executor.map(get_icav2_uri_from_s3_uri, s3_uri_list)
+        ))
+
+
+def handler(event, context):
+    """
+    Convert the s3 output uri, or list of s3 output uris, to ICAv2 uris
+
+    Input:
+    {
+        "s3Uri": "s3://bucket/path/to/file"
+    }
+    or
+    {
+        "s3UriList": ["s3://bucket/path/to/file", ...]
+    }
+
+    Output:
+    {
+        "icav2Uri": "icav2://project-id/path/to/file"
+    }
+    or
+    {
+        "icav2UriMap": {"s3://bucket/path/to/file": "icav2://project-id/path/to/file", ...}
+    }
+    :param event:
+    :param context:
+    :return:
+    """
+    # Set icav2 env vars
+    set_icav2_env_vars()
+
+    if "s3UriList" in event:
         return {
-            "icav2Uri": (
-                convert_project_data_obj_to_uri(
-                    parent_data_obj,
-                    uri_type='icav2'
-                ) + Path(urlparse(event["s3Uri"]).path).name
-            )
+            "icav2UriMap": get_icav2_uri_map_from_s3_uri_list(event["s3UriList"])
         }
 
     return {
-        "icav2Uri": convert_project_data_obj_to_uri(
-            convert_uri_to_project_data_obj(
-                event["s3Uri"]
-            ),
-            uri_type='icav2'
-        )
+        "icav2Uri": get_icav2_uri_from_s3_uri(event["s3Uri"])
     }
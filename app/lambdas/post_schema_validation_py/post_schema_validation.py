@@ -6,10 +6,30 @@ Post-schema validation for bclconvert-interop-qc pipeline.
 Validates:
 1. Engine parameters (projectId, outputUri, logsUri, cacheUri, pipelineId)
 2. Input URIs are accessible via Filemanager and linked to ICA project
+
+The lookups behind each check are independent, so they all run at once on bounded thread pools,
+the input lookups are started before the engine parameters are validated.
+The results are then checked in the original order, so the first error reported is always the same,
+whichever lookup returns first, and the input lookups still queued are dropped once a check fails.
+The thread pools are scoped to the invocation, every lookup still queued is dropped and every running lookup
+is waited on before the handler returns, so no lookup is frozen with the container and resumed in a later invocation.
+
+The Filemanager existence checks are batched, the URIs of each bucket are grouped by their common prefix,
+each group is listed a page at a time, and the keys are matched locally.
+The listing stops as soon as every URI of the group has matched, and after MAX_LISTING_PAGES pages
+the URIs still unmatched are looked up one at a time, so a prefix holding the history of many past runs
+costs at most a few pages rather than a listing of the whole prefix.
+Groups with a prefix shallower than MIN_LISTING_PREFIX_DEPTH are looked up one URI at a time instead,
+rather than listing most of a bucket. A folder URI looked up on its own is checked with a single row query.
+
+The project, project s3 key prefix and project pipeline lookups go through the icav2 lookup cache layer,
+so warm invocations for the same project and pipeline make no ICAv2 calls for them.
 """
 
 # Imports
-from typing import Dict, Tuple, List, cast
+from concurrent.futures import CancelledError, Future, InvalidStateError, ThreadPoolExecutor
+from functools import partial
+from typing import Dict, Tuple, List, Optional, cast
 import logging
 from os import environ
 from time import sleep
@@ -19,15 +39,19 @@ from pathlib import Path
 # Wrapica imports
 from libica.openapi.v3 import ApiException
 from wrapica.project_data import coerce_data_id_or_uri_to_project_data_obj, get_project_data_obj_by_id
-from wrapica.storage_configuration import get_s3_key_prefix_by_project_id
-from wrapica.project_pipelines import get_project_pipeline_obj
-from wrapica.project import get_project_obj_from_project_id
 
 # Layer imports
 from orcabus_api_tools.workflow import add_comment_to_workflow_run, get_workflow_run
-from orcabus_api_tools.filemanager import get_s3_object_id_from_s3_uri, list_files_recursively
+from orcabus_api_tools.filemanager import get_s3_object_id_from_s3_uri
+from orcabus_api_tools.filemanager.query_helpers import get_file_manager_request
 from orcabus_api_tools.filemanager.errors import S3FileNotFoundError
 from icav2_tools import set_icav2_env_vars
+from icav2_lookup_cache import (
+    get_cache_stats,
+    get_project_obj_from_project_id,
+    get_project_pipeline_obj,
+    get_s3_key_prefix_by_project_id,
+)
 
 # Globals
 WORKFLOW_NAME_ENV_VAR = "WORKFLOW_NAME"
@@ -40,6 +64,17 @@ REF_DATA_BUCKET = environ[REF_DATA_BUCKET_ENV_VAR]
 WORKFLOW_NAME = environ[WORKFLOW_NAME_ENV_VAR]
 COMMENT_AUTHOR = f"{WORKFLOW_NAME}-post-schema-validation-service"
 
+# Bounded, as hundreds of input uris may be looked up at once
+MAX_CONCURRENT_INPUT_LOOKUPS = 16
+# The project, pipeline and workflow run lookups, kept apart so they never queue behind the input lookups
+MAX_CONCURRENT_ENGINE_PARAMETERS_LOOKUPS = 3
+# A group of URIs is only listed if the prefix it shares has at least this many folders below the bucket
+MIN_LISTING_PREFIX_DEPTH = 3
+# The listing of a group stops after this many pages, the URIs still unmatched are then looked up on their own
+FILEMANAGER_LISTING_ROWS_PER_PAGE = 1000
+MAX_LISTING_PAGES = 4
+FILEMANAGER_S3_LIST_ENDPOINT = "api/v1/s3"
+
 # Midfixes
 ANALYSIS_MIDFIX = "analysis"
 LOGS_MIDFIX = "logs"
@@ -70,6 +105,7 @@ def validate_engine_parameters(
         engine_parameters: Dict,
         workflow_run_id: str,
         project_prefix: str,
+        lookup_executor: ThreadPoolExecutor,
 ) -> Tuple[bool, str]:
     """
     Validate the engine parameters.
@@ -86,6 +122,7 @@ def validate_engine_parameters(
     :param engine_parameters: The engine parameters to validate.
     :param workflow_run_id: The workflow run ID (orcabusId)
     :param project_prefix: The project S3 prefix
+    :param lookup_executor: The thread pool of the invocation to run the lookups on
     :return: A tuple of (is_valid, comment)
     """
     project_id = cast(str, engine_parameters.get("projectId"))
@@ -97,8 +134,19 @@ def validate_engine_parameters(
     # Validate projectId
     if project_id is None:
         return False, "projectId is not set"
+
+    # Start the project, pipeline and workflow run lookups at once,
+    # each result is only read when its check is reached
+    project_future = lookup_executor.submit(get_project_obj_from_project_id, project_id)
+    pipeline_future = lookup_executor.submit(
+        get_project_pipeline_obj,
+        project_id=project_id,
+        pipeline_id=pipeline_id,
+    )
+    workflow_run_future = lookup_executor.submit(get_workflow_run, workflow_run_id)
+
     try:
-        get_project_obj_from_project_id(project_id)
+        project_future.result()
     except ApiException:
         return False, f"Cannot find project id {project_id}"
 
@@ -116,15 +164,12 @@ def validate_engine_parameters(
 
     # Validate pipelineId is accessible in the project
     try:
-        _ = get_project_pipeline_obj(
-            project_id=project_id,
-            pipeline_id=pipeline_id,
-        )
+        _ = pipeline_future.result()
     except ValueError:
         return False, f"The pipeline {pipeline_id} cannot be found in the project {project_id}"
 
     # Get the portal run id from the workflow run id
-    portal_run_id = get_workflow_run(workflow_run_id)['portalRunId']
+    portal_run_id = workflow_run_future.result()['portalRunId']
 
     # Validate outputUri ends with /<analysis-midfix>/<workflow-name>/<portal-run-id>/
     if not output_uri.endswith(f"/{ANALYSIS_MIDFIX}/{WORKFLOW_NAME}/{portal_run_id}/"):
@@ -143,13 +188,345 @@ def validate_engine_parameters(
     return True, ""
 
 
-def validate_inputs(
+def get_filemanager_not_found_comment(data_uri: str) -> str:
+    """
+    Get the failure comment of a URI not found by the Filemanager.
+
+    :param data_uri: The S3 URI
+    :return: The failure comment
+    """
+    if data_uri.endswith("/"):
+        return (
+            f"Folder URI '{data_uri}' has no files found under "
+            f"that prefix in the Filemanager"
+        )
+    return (
+        f"Data URI '{data_uri}' cannot be found by the Filemanager, "
+        f"are you sure it exists?"
+    )
+
+
+def get_filemanager_listing_page(
+        bucket: str,
+        key_prefix: str,
+        page: int,
+        rows_per_page: int = FILEMANAGER_LISTING_ROWS_PER_PAGE,
+) -> Tuple[List[str], bool]:
+    """
+    Get a single page of the current keys under a prefix from the Filemanager.
+
+    :param bucket: The bucket name
+    :param key_prefix: The key prefix
+    :param page: The page number, starting at 1
+    :param rows_per_page: The number of keys in each page
+    :return: A tuple of (keys of the page, whether there is a next page)
+    """
+    response = get_file_manager_request(
+        FILEMANAGER_S3_LIST_ENDPOINT,
+        params={
+            "bucket": bucket,
+            "key": f"{key_prefix}*",
+            "currentState": "true",
+            "rowsPerPage": rows_per_page,
+            "page": page,
+        }
+    )
+    return (
+        [file_obj_iter['key'] for file_obj_iter in response['results']],
+        bool((response.get('links') or {}).get('next'))
+    )
+
+
+def check_uri_in_filemanager(data_uri: str) -> Optional[str]:
+    """
+    Confirm a file URI exists in the Filemanager, or that a folder URI has at least one file under it.
+
+    :param data_uri: The S3 URI to check
+    :return: The failure comment, or None if the URI exists
+    """
+    if data_uri.endswith("/"):
+        # Folder URI — verify at least 1 file exists under that prefix, a single row is enough
+        bucket = urlparse(data_uri).netloc
+        key = str(Path(urlparse(data_uri).path)).lstrip("/") + "/"
+        listed_keys, _ = get_filemanager_listing_page(bucket, key, page=1, rows_per_page=1)
+        if len(listed_keys) == 0:
+            return get_filemanager_not_found_comment(data_uri)
+    else:
+        # File URI — confirm the file exists
+        try:
+            get_s3_object_id_from_s3_uri(data_uri)
+        except S3FileNotFoundError:
+            return get_filemanager_not_found_comment(data_uri)
+
+    return None
+
+
+def get_uri_folder_parts(data_uri: str) -> Tuple[str, ...]:
+    """
+    Get the folders of the URI below the bucket, the folder itself for a folder URI,
+    or the folder containing the file for a file URI.
+
+    :param data_uri: The S3 URI
+    :return: The folder names
+    """
+    return tuple(filter(None, urlparse(data_uri).path.split("/")[:-1]))
+
+
+def get_filemanager_listing_groups(
+        data_uris: List[str],
+        folder_parts_by_uri: Dict[str, Tuple[str, ...]],
+) -> List[Tuple[Tuple[str, ...], List[str]]]:
+    """
+    Group the URIs of a bucket by their deepest common prefix.
+    A group with a common prefix shallower than MIN_LISTING_PREFIX_DEPTH is split by the next folder,
+    until each group is deep enough or cannot be split any further.
+
+    :param data_uris: The URIs of a single bucket
+    :param folder_parts_by_uri: The folders of each URI below the bucket
+    :return: A list of (common prefix folders, URIs) of each group
+    """
+    # Get the deepest common prefix of the group
+    common_parts: Tuple[str, ...] = folder_parts_by_uri[data_uris[0]]
+    for data_uri in data_uris[1:]:
+        folder_parts = folder_parts_by_uri[data_uri]
+        common_depth = 0
+        while (
+                common_depth < min(len(common_parts), len(folder_parts)) and
+                common_parts[common_depth] == folder_parts[common_depth]
+        ):
+            common_depth += 1
+        common_parts = common_parts[:common_depth]
+
+    if len(common_parts) >= MIN_LISTING_PREFIX_DEPTH:
+        return [(common_parts, data_uris)]
+
+    # Split the group by the next folder, URIs directly under the common prefix cannot be split any further
+    sub_groups: Dict[Optional[str], List[str]] = {}
+    for data_uri in data_uris:
+        folder_parts = folder_parts_by_uri[data_uri]
+        next_folder = folder_parts[len(common_parts)] if len(folder_parts) > len(common_parts) else None
+        sub_groups.setdefault(next_folder, []).append(data_uri)
+
+    if len(sub_groups) == 1:
+        return [(common_parts, data_uris)]
+
+    listing_groups = []
+    for next_folder, sub_group_uris in sub_groups.items():
+        if next_folder is None:
+            listing_groups.append((common_parts, sub_group_uris))
+        else:
+            listing_groups.extend(get_filemanager_listing_groups(sub_group_uris, folder_parts_by_uri))
+    return listing_groups
+
+
+def list_group_in_filemanager(
+        bucket: str,
+        key_prefix: str,
+        group_uris: List[str],
+) -> Tuple[List[str], bool]:
+    """
+    List the keys under the prefix of a group a page at a time, matching the URIs of the group as we go.
+    The listing stops as soon as every URI has matched, the prefix has no more pages, or MAX_LISTING_PAGES is reached.
+    A file URI matches if its key is listed, a folder URI matches if any listed key is under it.
+
+    :param bucket: The bucket name
+    :param key_prefix: The common key prefix of the group
+    :param group_uris: The URIs of the group
+    :return: A tuple of (URIs found, whether the URIs not found are known to be missing)
+    """
+    unmatched_uris_by_file_key: Dict[str, str] = {}
+    unmatched_uris_by_folder_key: Dict[str, str] = {}
+    for data_uri in group_uris:
+        key = urlparse(data_uri).path.lstrip("/")
+        if data_uri.endswith("/"):
+            unmatched_uris_by_folder_key[key] = data_uri
+        else:
+            unmatched_uris_by_file_key[key] = data_uri
+
+    found_uris: List[str] = []
+    for page_iter in range(1, MAX_LISTING_PAGES + 1):
+        listed_keys, has_next_page = get_filemanager_listing_page(bucket, key_prefix, page=page_iter)
+
+        for listed_key in listed_keys:
+            if listed_key in unmatched_uris_by_file_key:
+                found_uris.append(unmatched_uris_by_file_key.pop(listed_key))
+            if unmatched_uris_by_folder_key:
+                for folder_key in [
+                    folder_key_iter for folder_key_iter in unmatched_uris_by_folder_key
+                    if listed_key.startswith(folder_key_iter)
+                ]:
+                    found_uris.append(unmatched_uris_by_folder_key.pop(folder_key))
+
+        if not has_next_page or (not unmatched_uris_by_file_key and not unmatched_uris_by_folder_key):
+            return found_uris, True
+
+    return found_uris, False
+
+
+def set_check_result_from_future(source_future: Future, check_future: Future):
+    """
+    Resolve a check with the result of the lookup made for it.
+
+    :param source_future: The future of the lookup
+    :param check_future: The future of the check, already set running
+    """
+    try:
+        if source_future.cancelled():
+            check_future.set_exception(CancelledError())
+        elif source_future.exception() is not None:
+            check_future.set_exception(source_future.exception())
+        else:
+            check_future.set_result(source_future.result())
+    except InvalidStateError:
+        # Cancelled since the lookup started
+        pass
+
+
+def set_filemanager_check_results(
+        listing_future: Future,
+        group_uris: List[str],
+        check_futures_by_uri: Dict[str, Future],
+        lookup_executor: ThreadPoolExecutor,
+):
+    """
+    Resolve the check of each URI of a group from the listing of the group.
+    URIs the listing did not reach before its page limit are looked up on their own.
+
+    :param listing_future: The future of the listing of the group
+    :param group_uris: The URIs of the group
+    :param check_futures_by_uri: The check future of each URI
+    :param lookup_executor: The thread pool of the invocation to run the lookups on
+    """
+    # Run as a done callback, where an error would only be logged and leave the checks waiting forever,
+    # so any error fails every check of the group that is not yet resolved
+    try:
+        # The listing was dropped before it started, so are its checks
+        if listing_future.cancelled():
+            for data_uri in group_uris:
+                check_futures_by_uri[data_uri].cancel()
+            return
+
+        listing_exception = listing_future.exception()
+        found_uris, is_complete = ([], True) if listing_exception is not None else listing_future.result()
+
+        for data_uri in group_uris:
+            # Skip the checks cancelled since the listing started
+            if not check_futures_by_uri[data_uri].set_running_or_notify_cancel():
+                continue
+
+            if listing_exception is not None:
+                check_futures_by_uri[data_uri].set_exception(listing_exception)
+            elif data_uri in found_uris:
+                check_futures_by_uri[data_uri].set_result(None)
+            elif is_complete:
+                check_futures_by_uri[data_uri].set_result(get_filemanager_not_found_comment(data_uri))
+            else:
+                # Not reached before the page limit, look it up on its own
+                lookup_executor.submit(check_uri_in_filemanager, data_uri).add_done_callback(
+                    partial(set_check_result_from_future, check_future=check_futures_by_uri[data_uri])
+                )
+    except Exception as e:
+        for data_uri in group_uris:
+            if check_futures_by_uri[data_uri].done():
+                continue
+            try:
+                check_futures_by_uri[data_uri].set_exception(e)
+            except InvalidStateError:
+                # Cancelled since we checked
+                pass
+
+
+def submit_filemanager_checks(data_uris: List[str], lookup_executor: ThreadPoolExecutor) -> List[Future]:
+    """
+    Start the Filemanager existence checks of the URIs,
+    listing each group of URIs sharing a deep enough prefix until all of them match,
+    and looking up any other URI on its own.
+
+    :param data_uris: The S3 URIs to check
+    :param lookup_executor: The thread pool of the invocation to run the lookups on
+    :return: The future of the check of each URI, in the order of the URIs
+    """
+    unique_data_uris = list(dict.fromkeys(data_uris))
+    folder_parts_by_uri = {
+        data_uri: get_uri_folder_parts(data_uri)
+        for data_uri in unique_data_uris
+    }
+
+    # Group the URIs by bucket
+    data_uris_by_bucket: Dict[str, List[str]] = {}
+    for data_uri in unique_data_uris:
+        data_uris_by_bucket.setdefault(urlparse(data_uri).netloc, []).append(data_uri)
+
+    check_futures_by_uri: Dict[str, Future] = {}
+    for bucket, bucket_data_uris in data_uris_by_bucket.items():
+        for common_parts, group_uris in get_filemanager_listing_groups(bucket_data_uris, folder_parts_by_uri):
+            # Too shallow to list, look up each URI on its own
+            if len(common_parts) < MIN_LISTING_PREFIX_DEPTH:
+                for data_uri in group_uris:
+                    check_futures_by_uri[data_uri] = lookup_executor.submit(check_uri_in_filemanager, data_uri)
+                continue
+
+            # List the group until every URI has matched, and resolve the check of each URI from the listing
+            for data_uri in group_uris:
+                check_futures_by_uri[data_uri] = Future()
+            listing_future = lookup_executor.submit(
+                list_group_in_filemanager,
+                bucket,
+                "/".join(common_parts) + "/",
+                group_uris,
+            )
+            listing_future.add_done_callback(
+                partial(
+                    set_filemanager_check_results,
+                    group_uris=group_uris,
+                    check_futures_by_uri=check_futures_by_uri,
+                    lookup_executor=lookup_executor,
+                )
+            )
+
+    return [check_futures_by_uri[data_uri] for data_uri in data_uris]
+
+
+def check_uri_in_project_context(data_uri: str, project_id: str) -> Optional[str]:
+    """
+    Confirm a URI is accessible in the ICAv2 project context.
+
+    :param data_uri: The S3 URI to check
+    :param project_id: The ICAv2 project id
+    :return: The failure comment, or None if the URI is in the project context
+    """
+    try:
+        project_data_obj = coerce_data_id_or_uri_to_project_data_obj(
+            data_id_or_uri=data_uri,
+        )
+    except ValueError:
+        return (
+            f"Data URI '{data_uri}' cannot be found in the "
+            f"project context '{project_id}'"
+        )
+
+    try:
+        get_project_data_obj_by_id(
+            project_id=project_id,
+            data_id=project_data_obj.data.id
+        )
+    except ApiException:
+        return (
+            f"Data URI '{data_uri}' cannot be found in the "
+            f"project context '{project_id}'"
+        )
+
+    return None
+
+
+def submit_input_checks(
         inputs: Dict,
         project_id: str,
         project_prefix: str,
-) -> Tuple[bool, str]:
+        lookup_executor: ThreadPoolExecutor,
+) -> List[Future]:
     """
-    Validate the inputs.
+    Start the lookups of the input checks, returning the futures of the checks in the order they are reported.
 
     Performs two-phase validation:
     1. Filemanager existence check — confirms file/folder URIs exist at the S3 level
@@ -165,7 +542,8 @@ def validate_inputs(
     :param inputs: The inputs to validate.
     :param project_id: The ICAv2 project id to validate against.
     :param project_prefix: The ICAv2 project prefix
-    :return: A tuple of (is_valid, comment)
+    :param lookup_executor: The thread pool of the invocation to run the lookups on
+    :return: The futures of each check, each resolving to a failure comment or None
     """
     # Collect all S3 data URIs from inputs
     data_uris: List[str] = []
@@ -176,36 +554,11 @@ def validate_inputs(
         if uri:
             data_uris.append(uri)
 
-    # If there are no data URIs to validate, return valid
-    if not data_uris:
-        return True, ""
-
     # Phase 1: Filemanager existence check — ALL URIs except refdata bucket
     non_reference_data_uris = list(filter(
         lambda uri: not uri.startswith(f"s3://{REF_DATA_BUCKET}/"),
         data_uris
     ))
-    for data_uri in non_reference_data_uris:
-        if data_uri.endswith("/"):
-            # Folder URI — verify at least 1 file exists under that prefix
-            bucket = urlparse(data_uri).netloc
-            key = str(Path(urlparse(data_uri).path)) + "/"
-            if not (
-                len(list_files_recursively(bucket, key)) > 0
-            ):
-                return False, (
-                    f"Folder URI '{data_uri}' has no files found under "
-                    f"that prefix in the Filemanager"
-                )
-        else:
-            # File URI — confirm the file exists
-            try:
-                get_s3_object_id_from_s3_uri(data_uri)
-            except S3FileNotFoundError:
-                return False, (
-                    f"Data URI '{data_uri}' cannot be found by the Filemanager, "
-                    f"are you sure it exists?"
-                )
 
     # Phase 2: ICA project context validation
     # Only URIs outside ref/test/project-prefix need ICA project linking confirmed
@@ -218,32 +571,77 @@ def validate_inputs(
         )
     ]
 
-    # Validate each URI is accessible in the project context
-    for data_uri in uris_to_validate:
-        try:
-            project_data_obj = coerce_data_id_or_uri_to_project_data_obj(
-                data_id_or_uri=data_uri,
-            )
-        except ValueError:
-            return False, (
-                f"Data URI '{data_uri}' cannot be found in the "
-                f"project context '{project_id}'"
-            )
+    # Start the lookups of both phases at once, in the order the failures are reported
+    return submit_filemanager_checks(non_reference_data_uris, lookup_executor) + [
+        lookup_executor.submit(check_uri_in_project_context, data_uri, project_id)
+        for data_uri in uris_to_validate
+    ]
+
+
+def cancel_input_checks(check_futures: List[Future]):
+    """
+    Drop the input lookups that have not started yet.
+
+    :param check_futures: The futures returned by submit_input_checks
+    """
+    for check_future in check_futures:
+        check_future.cancel()
 
-        try:
-            get_project_data_obj_by_id(
-                project_id=project_id,
-                data_id=project_data_obj.data.id
-            )
-        except ApiException:
-            return False, (
-                f"Data URI '{data_uri}' cannot be found in the "
-                f"project context '{project_id}'"
-            )
+
+def shutdown_lookup_executors(*lookup_executors: ThreadPoolExecutor):
+    """
+    Drop the lookups still queued and wait on the lookups still running,
+    so no lookup outlives the invocation that started it.
+
+    :param lookup_executors: The thread pools of the invocation
+    """
+    for lookup_executor in lookup_executors:
+        lookup_executor.shutdown(wait=True, cancel_futures=True)
+
+
+def get_input_checks_result(check_futures: List[Future]) -> Tuple[bool, str]:
+    """
+    Get the first failure of the input checks, in the order of the phases, then of the uris.
+
+    :param check_futures: The futures returned by submit_input_checks
+    :return: A tuple of (is_valid, comment)
+    """
+    for check_future in check_futures:
+        error_comment = check_future.result()
+        if error_comment is not None:
+            cancel_input_checks(check_futures)
+            return False, error_comment
 
     return True, ""
 
 
+def validate_inputs(
+        inputs: Dict,
+        project_id: str,
+        project_prefix: str,
+) -> Tuple[bool, str]:
+    """
+    Validate the inputs, see submit_input_checks for the checks made.
+
+    :param inputs: The inputs to validate.
+    :param project_id: The ICAv2 project id to validate against.
+    :param project_prefix: The ICAv2 project prefix
+    :return: A tuple of (is_valid, comment)
+    """
+    input_lookup_executor = ThreadPoolExecutor(max_workers=MAX_CONCURRENT_INPUT_LOOKUPS)
+    try:
+        return get_input_checks_result(
+            submit_input_checks(
+                inputs,
+                project_id=project_id,
+                project_prefix=project_prefix,
+                lookup_executor=input_lookup_executor,
+            )
+        )
+    finally:
+        shutdown_lookup_executors(input_lookup_executor)
+
+
 def handler(event, context) -> Dict[str, bool]:
     """
     Post-schema validation handler for bclconvert-interop-qc.
@@ -317,22 +715,37 @@ def handler(event, context) -> Dict[str, bool]:
         )
         return {"isValid": False}
 
-    # Validate engine parameters
-    is_valid, comment = validate_engine_parameters(
-        engine_parameters,
-        workflow_run_id=workflow_run_id,
-        project_prefix=project_prefix,
-    )
-
-    # Validate inputs if engine parameters are valid
-    if is_valid:
-        inputs = payload_data.get("inputs", {})
-        is_valid, comment = validate_inputs(
-            inputs,
+    # The thread pools of this invocation, shut down before we return
+    input_lookup_executor = ThreadPoolExecutor(max_workers=MAX_CONCURRENT_INPUT_LOOKUPS)
+    engine_parameters_lookup_executor = ThreadPoolExecutor(max_workers=MAX_CONCURRENT_ENGINE_PARAMETERS_LOOKUPS)
+    try:
+        # Start the input lookups, so they run alongside the engine parameter lookups
+        input_check_futures = submit_input_checks(
+            payload_data.get("inputs", {}),
             project_id=project_id,
             project_prefix=project_prefix,
+            lookup_executor=input_lookup_executor,
         )
 
+        # Validate engine parameters
+        is_valid, comment = validate_engine_parameters(
+            engine_parameters,
+            workflow_run_id=workflow_run_id,
+            project_prefix=project_prefix,
+            lookup_executor=engine_parameters_lookup_executor,
+        )
+
+        # Validate inputs if engine parameters are valid,
+        # an engine parameter failure is reported first, as if the inputs were only validated after them
+        if is_valid:
+            is_valid, comment = get_input_checks_result(input_check_futures)
+        else:
+            cancel_input_checks(input_check_futures)
+    finally:
+        shutdown_lookup_executors(input_lookup_executor, engine_parameters_lookup_executor)
+
+    logger.info("ICAv2 lookup cache stats: %s", get_cache_stats())
+
     # Handle validation failure
     if not is_valid:
         if isinstance(comment, list) and len(comment) == 1:
@@ -2,6 +2,22 @@
 
 """
 Download the draft schema, validate it against the current schema, and print the results.
+
+The data is validated in a single pass, collecting every error,
+from which we return whether the data is valid, the missing fields and the structured errors.
+
+The boto3 clients, and the schema name, schema content and compiled validator of each payload version,
+are kept at module level, so warm invocations make no network calls to resolve the schema.
+Bundled payload versions are cached for the lifetime of the container, since the bundled files cannot change.
+Only payload versions fetched from the registry are resolved again once older than SCHEMA_CACHE_TTL_SECONDS.
+
+Known payload versions are read from the event schemas bundled under EVENT_SCHEMAS_DIR (the event schemas layer),
+so resolving them needs no SSM or schema registry calls.
+Only unknown payload versions are fetched from the schema registry.
+The first time a bundled schema is resolved in a lambda container, it is compared against the registry copy,
+and a warning is logged if they differ. The comparison is never repeated in the same container.
+The comparison runs in the invocation, with clients that give up after DRIFT_CHECK_TIMEOUT_SECONDS,
+so it never outlives the invocation, and a slow or failing registry only skips the comparison.
 """
 
 # Standard imports
@@ -9,11 +25,13 @@ import json
 from pathlib import Path
 import boto3
 import typing
-import jsonschema
 from os import environ
-from typing import Dict
+from typing import Dict, List
 import logging
-from jsonschema import ValidationError
+from time import monotonic
+from botocore.config import Config
+from jsonschema import Draft202012Validator, ValidationError
+from jsonschema.exceptions import best_match
 
 # Type checking imports
 if typing.TYPE_CHECKING:
@@ -23,23 +41,81 @@ if typing.TYPE_CHECKING:
 # Globals
 SSM_REGISTRY_NAME_ENV_VAR = "SSM_REGISTRY_NAME"
 SSM_SCHEMA_PATH_ENV_VAR = "SSM_SCHEMA_PATH"
+DEFAULT_PAYLOAD_VERSION_ENV_VAR = "DEFAULT_PAYLOAD_VERSION"
+EVENT_SCHEMAS_DIR_ENV_VAR = "EVENT_SCHEMAS_DIR"
+SCHEMA_NAME = "complete-data-draft"
+SCHEMA_CACHE_TTL_SECONDS_ENV_VAR = "SCHEMA_CACHE_TTL_SECONDS"
+DEFAULT_SCHEMA_CACHE_TTL_SECONDS = 300
+DRIFT_CHECK_TIMEOUT_SECONDS = 2
+DRIFT_CHECK_CLIENT_CONFIG = Config(
+    connect_timeout=DRIFT_CHECK_TIMEOUT_SECONDS,
+    read_timeout=DRIFT_CHECK_TIMEOUT_SECONDS,
+    retries={"max_attempts": 1, "mode": "standard"}
+)
+
+# Kept across warm invocations
+SSM_CLIENT: typing.Optional['SSMClient'] = None
+SCHEMAS_CLIENT: typing.Optional['SchemasClient'] = None
+DRIFT_CHECK_SSM_CLIENT: typing.Optional['SSMClient'] = None
+DRIFT_CHECK_SCHEMAS_CLIENT: typing.Optional['SchemasClient'] = None
+# Payload version -> (time cached, schema cache entry)
+SCHEMA_CACHE: Dict[str, typing.Tuple[float, Dict]] = {}
+# The bundled payload versions already compared against the registry in this container
+DRIFT_CHECKED_PAYLOAD_VERSIONS: typing.Set[str] = set()
 
 # Set up logging
 logger = logging.getLogger()
 logger.setLevel(logging.INFO)
 
 
-def get_ssm_parameter_value(parameter_name: str) -> str:
+def get_ssm_client(is_drift_check: bool = False) -> 'SSMClient':
+    """
+    Get the ssm client, created once per lambda container
+    :param is_drift_check: Get the client with the short timeouts of the drift check
+    :return:
+    """
+    global SSM_CLIENT, DRIFT_CHECK_SSM_CLIENT
+
+    if is_drift_check:
+        if DRIFT_CHECK_SSM_CLIENT is None:
+            DRIFT_CHECK_SSM_CLIENT = boto3.client("ssm", config=DRIFT_CHECK_CLIENT_CONFIG)
+        return DRIFT_CHECK_SSM_CLIENT
+
+    if SSM_CLIENT is None:
+        SSM_CLIENT = boto3.client("ssm")
+
+    return SSM_CLIENT
+
+
+def get_schemas_client(is_drift_check: bool = False) -> 'SchemasClient':
+    """
+    Get the schemas client, created once per lambda container
+    :param is_drift_check: Get the client with the short timeouts of the drift check
+    :return:
+    """
+    global SCHEMAS_CLIENT, DRIFT_CHECK_SCHEMAS_CLIENT
+
+    if is_drift_check:
+        if DRIFT_CHECK_SCHEMAS_CLIENT is None:
+            DRIFT_CHECK_SCHEMAS_CLIENT = boto3.client("schemas", config=DRIFT_CHECK_CLIENT_CONFIG)
+        return DRIFT_CHECK_SCHEMAS_CLIENT
+
+    if SCHEMAS_CLIENT is None:
+        SCHEMAS_CLIENT = boto3.client("schemas")
+
+    return SCHEMAS_CLIENT
+
+
+def get_ssm_parameter_value(parameter_name: str, is_drift_check: bool = False) -> str:
     """
     Get the SSM parameter for the schema.
+    :param parameter_name:
+    :param is_drift_check:
     :return: The SSM parameter value.
     """
 
-    # Get the ssm client
-    ssm_client: SSMClient = boto3.client("ssm")
-
     # Get the SSM parameter value
-    response = ssm_client.get_parameter(
+    response = get_ssm_client(is_drift_check).get_parameter(
         Name=parameter_name,
         WithDecryption=True
     )
@@ -49,20 +125,19 @@ def get_ssm_parameter_value(parameter_name: str) -> str:
 
 def get_schema_from_registry(
         registry_name: str,
-        schema_name: str
+        schema_name: str,
+        is_drift_check: bool = False
 ) -> str:
     """
     Get the schema from the schema registry.
     :param registry_name: The name of the schema registry.
     :param schema_name: The name of the schema.
+    :param is_drift_check:
     :return: The schema as a string.
     """
 
-    # Get the schemas client
-    schemas_client: SchemasClient = boto3.client("schemas")
-
     # Get the schema from the registry
-    response = schemas_client.describe_schema(
+    response = get_schemas_client(is_drift_check).describe_schema(
         RegistryName=registry_name,
         SchemaName=schema_name
     )
@@ -70,27 +145,211 @@ def get_schema_from_registry(
     return response["Content"]
 
 
-def validate_draft_schema(
-        json_schema: str,
-        json_body: str
-) -> bool:
+def get_schema_content_from_registry(payload_version: str, is_drift_check: bool = False) -> typing.Tuple[str, str]:
+    """
+    Get the schema name and schema content of the payload version from the schema registry
+    :param payload_version:
+    :param is_drift_check:
+    :return:
+    """
+    # Get the SSM parameters
+    schema_registry = get_ssm_parameter_value(environ[SSM_REGISTRY_NAME_ENV_VAR], is_drift_check)
+    schema_name = json.loads(get_ssm_parameter_value(
+        str(Path(environ[SSM_SCHEMA_PATH_ENV_VAR]) / payload_version),
+        is_drift_check
+    ))['schemaName']
+
+    # Get the current schema from the schema registry
+    return schema_name, get_schema_from_registry(
+        registry_name=schema_registry,
+        schema_name=schema_name,
+        is_drift_check=is_drift_check
+    )
+
+
+def get_local_schema_path(payload_version: str) -> typing.Optional[Path]:
+    """
+    Get the path of the bundled schema of the payload version, or None if it is not bundled
+    :param payload_version:
+    :return:
+    """
+    if not environ.get(EVENT_SCHEMAS_DIR_ENV_VAR):
+        return None
+
+    local_schemas_dir = Path(environ[EVENT_SCHEMAS_DIR_ENV_VAR]) / SCHEMA_NAME
+    if not local_schemas_dir.is_dir():
+        return None
+
+    # Only match a bundled version directory, the payload version comes from the event
+    if payload_version not in [version_dir_iter_.name for version_dir_iter_ in local_schemas_dir.iterdir()]:
+        return None
+
+    local_schema_path = local_schemas_dir / payload_version / f"{SCHEMA_NAME}-schema.json"
+    if not local_schema_path.is_file():
+        return None
+
+    return local_schema_path
+
+
+def check_local_schema_drift(payload_version: str, local_schema: Dict):
     """
-    Download the draft schema, validate it against the current schema, and print the results.
+    Compare the bundled schema of the payload version against the registry copy, logging a warning if they differ.
+    The bundled schema is used either way, so any failure, including a timeout, is logged rather than raised.
+    :param payload_version:
+    :param local_schema:
+    :return:
     """
     try:
-        jsonschema.validate(
-            instance=json.loads(json_body),
-            schema=json.loads(json_schema)
+        schema_name, registry_schema_content = get_schema_content_from_registry(payload_version, is_drift_check=True)
+    except Exception as e:
+        logger.warning("Could not compare the bundled %s schema against the registry: %s", payload_version, e)
+        return
+
+    if json.loads(registry_schema_content) != local_schema:
+        logger.warning(
+            "The bundled %s schema differs from the registry schema %s, validating against the bundled schema",
+            payload_version, schema_name
         )
-    except ValidationError as e:
-        logger.info("Validation error: %s", e)
-        return False
-    return True
 
 
-def handler(event, context) -> Dict[str, bool]:
+def get_schema_cache_ttl_seconds() -> float:
+    """
+    Get the number of seconds a resolved schema is kept for
+    :return:
+    """
+    return float(environ.get(SCHEMA_CACHE_TTL_SECONDS_ENV_VAR, DEFAULT_SCHEMA_CACHE_TTL_SECONDS))
+
+
+def get_schema_cache_entry(payload_version: str) -> Dict:
+    """
+    Get the schema name, schema content and compiled validator of the payload version,
+    resolving them only if the cached entry is missing, or is a registry entry that has expired,
+    from the bundled schemas if the payload version is bundled, otherwise through SSM and the schema registry.
+    :param payload_version:
+    :return: A dict with the keys schemaName, schemaContent, schemaSource and validator
+    """
+    cached_time, schema_cache_entry = SCHEMA_CACHE.get(payload_version, (None, None))
+    if cached_time is not None and (
+        schema_cache_entry["schemaSource"] == "local" or
+        monotonic() - cached_time < get_schema_cache_ttl_seconds()
+    ):
+        return schema_cache_entry
+
+    # The 'default' payload version is the deployed default payload version
+    resolved_payload_version = payload_version
+    if payload_version == 'default' and environ.get(DEFAULT_PAYLOAD_VERSION_ENV_VAR):
+        resolved_payload_version = environ[DEFAULT_PAYLOAD_VERSION_ENV_VAR]
+
+    local_schema_path = get_local_schema_path(resolved_payload_version)
+    if local_schema_path is not None:
+        schema_name = local_schema_path.name
+        schema_source = "local"
+        schema_content = local_schema_path.read_text()
+    else:
+        schema_source = "registry"
+        schema_name, schema_content = get_schema_content_from_registry(resolved_payload_version)
+
+    # Check the schema once, rather than on each validation
+    schema = json.loads(schema_content)
+    Draft202012Validator.check_schema(schema)
+
+    # Compare the bundled schema against the registry, once per container
+    if schema_source == "local" and resolved_payload_version not in DRIFT_CHECKED_PAYLOAD_VERSIONS:
+        DRIFT_CHECKED_PAYLOAD_VERSIONS.add(resolved_payload_version)
+        check_local_schema_drift(resolved_payload_version, schema)
+
+    schema_cache_entry = {
+        "schemaName": schema_name,
+        "schemaContent": schema_content,
+        "schemaSource": schema_source,
+        "validator": Draft202012Validator(schema)
+    }
+    SCHEMA_CACHE[payload_version] = (monotonic(), schema_cache_entry)
+
+    return schema_cache_entry
+
+
+def get_missing_fields(errors: List[ValidationError]) -> List[str]:
+    """
+    Get the unique missing or invalid field paths from the validation errors, in the order of the errors.
+    Each missing property of a required error is listed on its own,
+    any other error is listed by its path along with the start of its message.
+    :param errors:
+    :return:
+    """
+    missing_fields = []
+    for error in errors:
+        path = ".".join(str(p) for p in error.absolute_path) if error.absolute_path else ""
+        if error.validator == "required":
+            # For required errors, list each missing property
+            for missing_prop in error.validator_value:
+                if missing_prop not in error.instance:
+                    field_path = f"{path}.{missing_prop}" if path else missing_prop
+                    missing_fields.append(field_path)
+        else:
+            # For other errors (type, pattern, etc.)
+            if path:
+                missing_fields.append(f"{path} ({error.message[:50]})")
+
+    # Each missing property raises its own required error, each listing every missing property of the object
+    return list(dict.fromkeys(missing_fields))
+
+
+def get_structured_errors(errors: List[ValidationError]) -> List[Dict[str, str]]:
+    """
+    Get the path, failing keyword and message of each validation error
+    :param errors:
+    :return:
+    """
+    return [
+        {
+            "path": ".".join(str(p) for p in error.absolute_path),
+            "validator": str(error.validator),
+            "message": error.message
+        }
+        for error in errors
+    ]
+
+
+def validate_draft_schema(
+        validator: Draft202012Validator,
+        data: Dict
+) -> Dict:
+    """
+    Validate the draft data against the compiled validator of the current schema in a single pass,
+    logging the most relevant error.
+    :param validator:
+    :param data:
+    :return: A dict with the keys isValid, missingFields and errors
+    """
+    errors = list(validator.iter_errors(data))
+
+    if errors:
+        logger.info("Validation error: %s", best_match(errors))
+
+    return {
+        "isValid": len(errors) == 0,
+        "missingFields": get_missing_fields(errors),
+        "errors": get_structured_errors(errors),
+    }
+
+
+def handler(event, context) -> Dict:
     """
     Given a draft schema, validate it against the current schema and print the results.
+
+    Input:
+    {
+        "data": {...},
+        "payloadVersion": "2026.04.01"  (optional)
+    }
+
+    Output:
+    {
+        "isValid": false,
+        "missingFields": ["inputs.sequenceData", "inputs.reference", ...],
+        "errors": [{"path": "inputs", "validator": "required", "message": "..."}, ...]
+    }
     :return:
     """
     # Get data and version
@@ -101,23 +360,11 @@ def handler(event, context) -> Dict[str, bool]:
     if payload_version is None:
         payload_version = 'default'
 
-    # Get the SSM parameters
-    schema_registry = get_ssm_parameter_value(environ[SSM_REGISTRY_NAME_ENV_VAR])
-    schema_name = json.loads(get_ssm_parameter_value(
-        str(Path(environ[SSM_SCHEMA_PATH_ENV_VAR]) / payload_version)
-    ))['schemaName']
+    # Get the current schema of the payload version, from the cache if warm
+    schema_cache_entry = get_schema_cache_entry(payload_version)
 
-    # Get the current schema from the schema registry
-    payload_schema = get_schema_from_registry(
-        registry_name=schema_registry,
-        schema_name=schema_name
+    # Validate the draft data against the current schema
+    return validate_draft_schema(
+        schema_cache_entry["validator"],
+        data
     )
-
-    # Get the draft schema from the schema registry
-    return {
-        "isValid": validate_draft_schema(
-            payload_schema,
-            # Assuming the event contains the draft schema as a JSON string
-            json.dumps(data)
-        )
-    }
@@ -17,6 +17,7 @@ to
 Lane 1<tab>show<tab>_L1<tab>(L1)<tab>Lane 1
 WGS<tab>...
 
+The parent folder is resolved through the icav2 lookup cache layer, so warm invocations do not resolve it again.
 """
 
 # Standard imports
@@ -25,13 +26,11 @@ from tempfile import NamedTemporaryFile
 from urllib.parse import urlparse, urlunparse
 
 # Wrapica imports
-from wrapica.project_data import (
-    write_icav2_file_contents,
-    convert_uri_to_project_data_obj
-)
+from wrapica.project_data import write_icav2_file_contents
 
 # Layer imports
 from icav2_tools import set_icav2_env_vars
+from icav2_lookup_cache import convert_uri_to_project_data_obj, invalidate_uri
 
 
 def handler(event, context):
@@ -85,3 +84,6 @@ def handler(event, context):
             data_path=Path(str(icav2_project_data_parent_object.data.details.path)) / Path(sample_filters_file_uri_obj.path).name,
             file_stream_or_path=Path(file_h.name)
         )
+
+    # The file now exists
+    invalidate_uri(sample_filters_file_uri)
@@ -0,0 +1,51 @@
+#!/usr/bin/env python3
+
+"""
+Warm container caches of ICAv2 lookups, shared by the lambdas of this service.
+
+Drop in replacements of the wrapica lookups, kept at module level so they survive across warm invocations.
+Callers that create or delete ICAv2 data without convert_uri_to_project_data_obj drop it with invalidate_uri.
+"""
+
+# Standard imports
+from typing import Dict, List
+
+# Local imports
+from .ttl_cache import TtlCache
+from .project import (
+    PROJECT_CACHE,
+    PROJECT_PIPELINE_CACHE,
+    PROJECT_S3_KEY_PREFIX_CACHE,
+    get_project_obj_from_project_id,
+    get_project_pipeline_obj,
+    get_s3_key_prefix_by_project_id,
+)
+from .project_data import (
+    PROJECT_DATA_CACHE,
+    convert_uri_to_project_data_obj,
+    get_normalised_uri,
+    invalidate_uri,
+)
+
+
+def get_cache_stats() -> List[Dict]:
+    """
+    Get the hit, negative hit, miss, deduplicated and expiry counts of each cache, to be logged at the end of an invocation
+    :return:
+    """
+    return [
+        cache_iter_.get_stats()
+        for cache_iter_ in [PROJECT_CACHE, PROJECT_S3_KEY_PREFIX_CACHE, PROJECT_PIPELINE_CACHE, PROJECT_DATA_CACHE]
+    ]
+
+
+__all__ = [
+    "TtlCache",
+    "convert_uri_to_project_data_obj",
+    "get_cache_stats",
+    "get_normalised_uri",
+    "get_project_obj_from_project_id",
+    "get_project_pipeline_obj",
+    "get_s3_key_prefix_by_project_id",
+    "invalidate_uri",
+]
@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+
+"""
+Cached ICAv2 project, project s3 key prefix and project pipeline lookups.
+
+The answers of these lookups almost never change within a deployment,
+so they are kept for ICAV2_LOOKUP_CACHE_TTL_SECONDS (default 15 minutes),
+and a project or pipeline that cannot be found is kept for ICAV2_LOOKUP_CACHE_NEGATIVE_TTL_SECONDS (default 30 seconds).
+"""
+
+# Standard imports
+from os import environ
+import typing
+from typing import Optional
+
+# Wrapica imports
+from libica.openapi.v3 import ApiException
+from wrapica.project import get_project_obj_from_project_id as _get_project_obj_from_project_id
+from wrapica.project_pipelines import get_project_pipeline_obj as _get_project_pipeline_obj
+from wrapica.storage_configuration import get_s3_key_prefix_by_project_id as _get_s3_key_prefix_by_project_id
+
+# Type checking imports
+if typing.TYPE_CHECKING:
+    from libica.openapi.v3.models import Project, ProjectPipelineV4
+
+# Local imports
+from .ttl_cache import TtlCache
+
+# Globals
+TTL_SECONDS_ENV_VAR = "ICAV2_LOOKUP_CACHE_TTL_SECONDS"
+NEGATIVE_TTL_SECONDS_ENV_VAR = "ICAV2_LOOKUP_CACHE_NEGATIVE_TTL_SECONDS"
+DEFAULT_TTL_SECONDS = 900
+DEFAULT_NEGATIVE_TTL_SECONDS = 30
+NOT_FOUND_STATUSES = [404]
+
+
+def is_not_found_api_exception(e: Exception) -> bool:
+    """
+    An ICAv2 api error meaning the object does not exist, rather than the request failing
+    :param e:
+    :return:
+    """
+    return isinstance(e, ApiException) and getattr(e, "status", None) in NOT_FOUND_STATUSES
+
+
+def is_pipeline_not_found_error(e: Exception) -> bool:
+    """
+    wrapica raises a ValueError if the pipeline is not linked to the project
+    :param e:
+    :return:
+    """
+    return isinstance(e, ValueError) or is_not_found_api_exception(e)
+
+
+def get_ttl_seconds() -> float:
+    return float(environ.get(TTL_SECONDS_ENV_VAR, DEFAULT_TTL_SECONDS))
+
+
+def get_negative_ttl_seconds() -> float:
+    return float(environ.get(NEGATIVE_TTL_SECONDS_ENV_VAR, DEFAULT_NEGATIVE_TTL_SECONDS))
+
+
+PROJECT_CACHE = TtlCache(
+    name="project",
+    ttl_seconds=get_ttl_seconds(),
+    negative_ttl_seconds=get_negative_ttl_seconds(),
+    is_not_found_error=is_not_found_api_exception
+)
+PROJECT_S3_KEY_PREFIX_CACHE = TtlCache(
+    name="projectS3KeyPrefix",
+    ttl_seconds=get_ttl_seconds(),
+    negative_ttl_seconds=get_negative_ttl_seconds(),
+    is_not_found_error=is_not_found_api_exception
+)
+PROJECT_PIPELINE_CACHE = TtlCache(
+    name="projectPipeline",
+    ttl_seconds=get_ttl_seconds(),
+    negative_ttl_seconds=get_negative_ttl_seconds(),
+    is_not_found_error=is_pipeline_not_found_error
+)
+
+
+def get_project_obj_from_project_id(project_id: str) -> 'Project':
+    """
+    Get the ICAv2 project object, from the cache if warm
+    :param project_id:
+    :return:
+    """
+    return PROJECT_CACHE.get(
+        project_id,
+        lambda: _get_project_obj_from_project_id(project_id)
+    )
+
+
+def get_s3_key_prefix_by_project_id(project_id: str) -> Optional[str]:
+    """
+    Get the s3 key prefix of the ICAv2 project, from the cache if warm
+    :param project_id:
+    :return:
+    """
+    return PROJECT_S3_KEY_PREFIX_CACHE.get(
+        project_id,
+        lambda: _get_s3_key_prefix_by_project_id(project_id)
+    )
+
+
+def get_project_pipeline_obj(project_id: str, pipeline_id: str) -> 'ProjectPipelineV4':
+    """
+    Get the ICAv2 project pipeline object, from the cache if warm
+    :param project_id:
+    :param pipeline_id:
+    :return:
+    """
+    return PROJECT_PIPELINE_CACHE.get(
+        (project_id, pipeline_id),
+        lambda: _get_project_pipeline_obj(project_id=project_id, pipeline_id=pipeline_id)
+    )
@@ -0,0 +1,150 @@
+#!/usr/bin/env python3
+
+"""
+Cached resolution of ICAv2 and s3 uris to ICAv2 project data objects.
+
+The project data object holds the project id, data id and path of the uri.
+Entries are keyed by the normalised uri, and the normalised uri is resolved in place of the uri given,
+so every caller sharing an entry shares the same lookup.
+* The scheme is lower cased and repeated slashes in the path are collapsed,
+  ICAv2 data paths have no empty folder names, so both forms are the same ICAv2 data
+* An s3 uri under the s3 key prefix of a project already in the project s3 key prefix cache
+  is converted to its icav2://<project id>/<path> form, as wrapica does before its lookup
+* A trailing slash is kept, it marks the uri as a folder rather than a file
+
+A resolved uri is kept for ICAV2_PROJECT_DATA_CACHE_TTL_SECONDS (default 5 minutes),
+a uri that cannot be found is kept for ICAV2_LOOKUP_CACHE_NEGATIVE_TTL_SECONDS (default 30 seconds),
+unless it is created through convert_uri_to_project_data_obj with create_data_if_not_found set.
+Creating a uri also drops the 'not found' entries of its parent folders, as they are created along with it.
+Callers that create or delete data by other means must drop the uri with invalidate_uri.
+"""
+
+# Standard imports
+import re
+import typing
+from os import environ
+from typing import Iterator
+from urllib.parse import urlparse
+
+# Wrapica imports
+from wrapica.project_data import convert_uri_to_project_data_obj as _convert_uri_to_project_data_obj
+
+# Type checking imports
+if typing.TYPE_CHECKING:
+    from libica.openapi.v3.models import ProjectData
+
+# Local imports
+from .project import PROJECT_S3_KEY_PREFIX_CACHE, get_negative_ttl_seconds
+from .ttl_cache import TtlCache
+
+# Globals
+PROJECT_DATA_TTL_SECONDS_ENV_VAR = "ICAV2_PROJECT_DATA_CACHE_TTL_SECONDS"
+DEFAULT_PROJECT_DATA_TTL_SECONDS = 300
+
+PROJECT_DATA_CACHE = TtlCache(
+    name="projectData",
+    ttl_seconds=float(environ.get(PROJECT_DATA_TTL_SECONDS_ENV_VAR, DEFAULT_PROJECT_DATA_TTL_SECONDS)),
+    negative_ttl_seconds=get_negative_ttl_seconds(),
+    is_not_found_error=lambda e: isinstance(e, FileNotFoundError)
+)
+
+
+def get_normalised_path_uri(data_uri: str) -> str:
+    """
+    Get the uri with its scheme lower cased and the repeated slashes of its path collapsed
+    :param data_uri:
+    :return:
+    """
+    data_uri_obj = urlparse(data_uri)
+    return f"{data_uri_obj.scheme.lower()}://{data_uri_obj.netloc}{re.sub('/{2,}', '/', data_uri_obj.path or '/')}"
+
+
+def get_normalised_uri(data_uri: str) -> str:
+    """
+    Get the normalised form of a uri, used as the key of the cache and resolved in place of the uri.
+    s3 uris are converted to their icav2 form if the s3 key prefix of their project is in the cache,
+    no lookups are made to convert them
+    :param data_uri:
+    :return:
+    """
+    normalised_uri = get_normalised_path_uri(data_uri)
+    if not normalised_uri.startswith("s3://"):
+        return normalised_uri
+
+    for project_id_iter_, s3_key_prefix_iter_ in PROJECT_S3_KEY_PREFIX_CACHE.get_cached_items():
+        if s3_key_prefix_iter_ is None:
+            continue
+        s3_key_prefix = get_normalised_path_uri(s3_key_prefix_iter_).rstrip("/") + "/"
+        if normalised_uri.startswith(s3_key_prefix):
+            return f"icav2://{project_id_iter_}/{normalised_uri[len(s3_key_prefix):]}"
+
+    return normalised_uri
+
+
+def get_parent_folder_uris(normalised_uri: str) -> Iterator[str]:
+    """
+    Get the normalised uris of each parent folder of a normalised uri, closest first
+    :param normalised_uri:
+    :return:
+    """
+    data_uri_obj = urlparse(normalised_uri)
+    path_parts = data_uri_obj.path.strip("/").split("/")
+    for parent_parts_length_iter_ in range(len(path_parts) - 1, 0, -1):
+        yield (
+            f"{data_uri_obj.scheme}://{data_uri_obj.netloc}/" +
+            "/".join(path_parts[:parent_parts_length_iter_]) + "/"
+        )
+
+
+def convert_uri_to_project_data_obj(data_uri: str, create_data_if_not_found: bool = False) -> 'ProjectData':
+    """
+    Get the project data object of the uri, from the cache if warm.
+    Concurrent requests of the same uri make a single lookup.
+    :param data_uri:
+    :param create_data_if_not_found:
+    :return:
+    """
+    normalised_uri = get_normalised_uri(data_uri)
+
+    if not create_data_if_not_found:
+        return PROJECT_DATA_CACHE.get(
+            normalised_uri,
+            lambda: _convert_uri_to_project_data_obj(normalised_uri)
+        )
+
+    def create_lookup():
+        return _convert_uri_to_project_data_obj(normalised_uri, create_data_if_not_found=True)
+
+    try:
+        project_data_obj = PROJECT_DATA_CACHE.get(normalised_uri, create_lookup, refresh_not_found=True)
+    except FileNotFoundError:
+        # We shared a lookup of the same uri that did not create it
+        project_data_obj = PROJECT_DATA_CACHE.get(normalised_uri, create_lookup, refresh_not_found=True)
+
+    # Any missing parent folders were created along with the uri
+    for parent_folder_uri_iter_ in get_parent_folder_uris(normalised_uri):
+        PROJECT_DATA_CACHE.invalidate_not_found(parent_folder_uri_iter_)
+
+    return project_data_obj
+
+
+def invalidate_uri(data_uri: str):
+    """
+    Drop the uri, and if it is a folder everything under it, from the cache,
+    once the data of the uri has been created or deleted.
+    Both the s3 and icav2 forms of an s3 uri are dropped,
+    as the s3 form is the key while the s3 key prefix of its project is not in the cache
+    :param data_uri:
+    :return:
+    """
+    normalised_folder_uris = [
+        normalised_uri_iter_.rstrip("/") + "/"
+        for normalised_uri_iter_ in {get_normalised_path_uri(data_uri), get_normalised_uri(data_uri)}
+    ]
+
+    PROJECT_DATA_CACHE.invalidate_matching(
+        lambda key_iter_: any(
+            (key_iter_.rstrip("/") + "/").startswith(normalised_folder_uri_iter_)
+            for normalised_folder_uri_iter_ in normalised_folder_uris
+        )
+    )
@@ -0,0 +1,184 @@
+#!/usr/bin/env python3
+
+"""
+A thread safe time to live cache, kept at module level so that it survives across warm lambda invocations.
+
+Values are kept for ttl_seconds. A lookup that raises a 'not found' error is cached for
+negative_ttl_seconds instead, and the error is raised again on each hit, so a missing object
+is not looked up on every call, but is found soon after it is created.
+Any other error is raised without being cached.
+
+Concurrent requests for the same key are deduplicated, only the first runs the lookup,
+the others wait for and share its value or error.
+"""
+
+# Standard imports
+import threading
+from concurrent.futures import Future
+from time import monotonic
+from typing import Any, Callable, Dict, Hashable, List, Optional, Tuple
+
+
+class TtlCache:
+    """
+    A time to live cache of lookups, with negative caching of 'not found' errors and hit / miss counts
+    """
+
+    def __init__(
+            self,
+            name: str,
+            ttl_seconds: float,
+            negative_ttl_seconds: float,
+            is_not_found_error: Optional[Callable[[Exception], bool]] = None
+    ):
+        """
+        :param name: The name of the cache, used in the stats
+        :param ttl_seconds: How long a value is kept for
+        :param negative_ttl_seconds: How long a 'not found' error is kept for
+        :param is_not_found_error: Whether an error raised by a lookup means the object does not exist
+        """
+        self.name = name
+        self.ttl_seconds = ttl_seconds
+        self.negative_ttl_seconds = negative_ttl_seconds
+        self.is_not_found_error = is_not_found_error or (lambda e: False)
+
+        # Key -> (expiry time, is error, value or error)
+        self._entries: Dict[Hashable, Tuple[float, bool, Any]] = {}
+        # Key -> the future of the lookup running for it
+        self._in_flight: Dict[Hashable, Future] = {}
+        self._lock = threading.Lock()
+        self._stats = {
+            "hits": 0,
+            "negativeHits": 0,
+            "misses": 0,
+            "deduplicated": 0,
+            "expired": 0,
+        }
+
+    def get(self, key: Hashable, lookup: Callable[[], Any], refresh_not_found: bool = False) -> Any:
+        """
+        Get the value of the key, calling lookup only if the key is missing or expired,
+        and no lookup of the key is already running
+        :param key:
+        :param lookup:
+        :param refresh_not_found: Call lookup even if a 'not found' error of the key is cached
+        :return:
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] <= monotonic():
+                del self._entries[key]
+                self._stats["expired"] += 1
+                entry = None
+            if entry is not None and entry[1] and refresh_not_found:
+                entry = None
+
+            if entry is not None:
+                self._stats["negativeHits" if entry[1] else "hits"] += 1
+            else:
+                lookup_future = self._in_flight.get(key)
+                is_lookup_owner = lookup_future is None
+                if is_lookup_owner:
+                    lookup_future = Future()
+                    self._in_flight[key] = lookup_future
+                    self._stats["misses"] += 1
+                else:
+                    self._stats["deduplicated"] += 1
+
+        if entry is not None:
+            _, is_error, value = entry
+            if is_error:
+                # Drop the traceback of the original lookup, so it does not grow with each hit
+                raise value.with_traceback(None)
+            return value
+
+        # Wait for the lookup already running
+        if not is_lookup_owner:
+            if lookup_future.exception() is not None:
+                raise lookup_future.exception().with_traceback(None)
+            return lookup_future.result()
+
+        lookup_error: Optional[BaseException] = None
+        try:
+            value = lookup()
+            with self._lock:
+                self._entries[key] = (monotonic() + self.ttl_seconds, False, value)
+            return value
+        except BaseException as e:
+            lookup_error = e
+            if isinstance(e, Exception) and self.is_not_found_error(e):
+                with self._lock:
+                    self._entries[key] = (monotonic() + self.negative_ttl_seconds, True, e)
+            raise
+        finally:
+            # Always release the key and resolve the requests waiting on the lookup, whatever it raised
+            with self._lock:
+                self._in_flight.pop(key, None)
+            if lookup_error is None:
+                lookup_future.set_result(value)
+            else:
+                lookup_future.set_exception(lookup_error)
+
+    def get_cached_items(self) -> List[Tuple[Hashable, Any]]:
+        """
+        Get the keys and values of the unexpired entries that are not 'not found' errors,
+        without looking up or counting them as hits
+        :return:
+        """
+        with self._lock:
+            return [
+                (key_iter_, value_iter_)
+                for key_iter_, (expiry_time_iter_, is_error_iter_, value_iter_) in self._entries.items()
+                if not is_error_iter_ and expiry_time_iter_ > monotonic()
+            ]
+
+    def invalidate(self, key: Hashable):
+        """
+        Drop the key from the cache
+        :param key:
+        :return:
+        """
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def invalidate_not_found(self, key: Hashable):
+        """
+        Drop the key from the cache only if a 'not found' error is cached for it,
+        i.e. once the object of the key has been created
+        :param key:
+        :return:
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[1]:
+                del self._entries[key]
+
+    def invalidate_matching(self, is_match: Callable[[Hashable], bool]):
+        """
+        Drop every key that matches from the cache
+        :param is_match:
+        :return:
+        """
+        with self._lock:
+            for key_iter_ in [key_iter_ for key_iter_ in self._entries if is_match(key_iter_)]:
+                del self._entries[key_iter_]
+
+    def clear(self):
+        """
+        Drop every key from the cache
+        :return:
+        """
+        with self._lock:
+            self._entries.clear()
+
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        Get the hit, negative hit, miss, deduplicated and expiry counts of the cache since the lambda container started
+        :return:
+        """
+        with self._lock:
+            return {
+                "name": self.name,
+                "size": len(self._entries),
+                **self._stats
+            }
@@ -11,6 +11,7 @@ export const LAMBDA_DIR = path.join(APP_ROOT, 'lambdas');
 export const STEP_FUNCTIONS_DIR = path.join(APP_ROOT, 'step-functions-templates');
 export const ECS_DIR = path.join(APP_ROOT, 'ecs');
 export const EVENT_SCHEMAS_DIR = path.join(APP_ROOT, 'event-schemas');
+export const LAYERS_DIR = path.join(APP_ROOT, 'layers');
 
 /* Workflow constants */
 export const WORKFLOW_NAME = 'bclconvert-interop-qc';
@@ -81,6 +82,8 @@ export const READY_STATUS = 'READY';
 /* Schema constants */
 export const SCHEMA_REGISTRY_NAME = DATA_SCHEMA_REGISTRY_NAME;
 export const SSM_SCHEMA_ROOT = path.join(SSM_PARAMETER_PATH_PREFIX, 'schemas');
+/* Where the event schemas layer is unpacked in the lambda runtime */
+export const EVENT_SCHEMAS_LAYER_DIR = '/opt';
 
 /* Bucket constants */
 export const TEST_DATA_BUCKET_NAME = TEST_DATA_BUCKET;
@@ -88,3 +91,5 @@ export const REFERENCE_DATA_BUCKET_NAME = REFERENCE_DATA_BUCKET;
 
 /* Orchestration constants */
 export const SAMPLE_FILTERS_PAYLOAD_VERSION_THRESHOLD: PayloadVersionType = '2026.04.01';
+/* Merge the resampled multiqc parquet files into a single run level parquet file for the WES request */
+export const MERGE_MULTIQC_PARQUET_FILES = false;
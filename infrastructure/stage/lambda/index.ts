@@ -8,6 +8,7 @@ import {
   DEFAULT_PAYLOAD_VERSION,
   SCHEMA_REGISTRY_NAME,
   SSM_SCHEMA_ROOT,
+  EVENT_SCHEMAS_LAYER_DIR,
   REFERENCE_DATA_BUCKET_NAME,
   TEST_DATA_BUCKET_NAME,
 } from '../constants';
@@ -20,6 +21,7 @@ import { NagSuppressions } from 'cdk-nag';
 import { Construct } from 'constructs';
 import { camelCaseToKebabCase, camelCaseToSnakeCase } from '../utils';
 import { SchemaNames } from '../event-schemas/interfaces';
+import { buildEventSchemasLayer, buildIcav2LookupCacheLayer } from '../layers';
 
 function buildLambda(scope: Construct, props: LambdaInput): LambdaObject {
   const lambdaNameToSnakeCase = camelCaseToSnakeCase(props.lambdaName);
@@ -127,6 +129,21 @@ function buildLambda(scope: Construct, props: LambdaInput): LambdaObject {
     lambdaFunction.addEnvironment('DEFAULT_PAYLOAD_VERSION', DEFAULT_PAYLOAD_VERSION);
   }
 
+  /*
+    Bundled event schemas, resolved before the schema registry
+  */
+  if (lambdaRequirements.needsEventSchemasLayer) {
+    lambdaFunction.addLayers(props.eventSchemasLayer);
+    lambdaFunction.addEnvironment('EVENT_SCHEMAS_DIR', EVENT_SCHEMAS_LAYER_DIR);
+  }
+
+  /*
+    Warm container caches of ICAv2 lookups
+  */
+  if (lambdaRequirements.needsIcav2LookupCacheLayer) {
+    lambdaFunction.addLayers(props.icav2LookupCacheLayer);
+  }
+
   /*
   Workflow info, usually for comment generation on the workflow run in the OrcaUI
    */
@@ -162,12 +179,19 @@ function buildLambda(scope: Construct, props: LambdaInput): LambdaObject {
 }
 
 export function buildAllLambdas(scope: Construct): LambdaObject[] {
+  // Shared by the schema validation lambdas
+  const eventSchemasLayer = buildEventSchemasLayer(scope);
+  // Shared by the lambdas that look up ICAv2 projects, pipelines and data
+  const icav2LookupCacheLayer = buildIcav2LookupCacheLayer(scope);
+
   // Iterate over lambdaLayerToMapping and create the lambda functions
   const lambdaObjects: LambdaObject[] = [];
   for (const lambdaName of lambdaNameList) {
     lambdaObjects.push(
       buildLambda(scope, {
         lambdaName: lambdaName,
+        eventSchemasLayer: eventSchemasLayer,
+        icav2LookupCacheLayer: icav2LookupCacheLayer,
       })
     );
   }
@@ -1,4 +1,5 @@
 import { PythonUvFunction } from '@orcabus/platform-cdk-constructs/lambda';
+import * as lambda from 'aws-cdk-lib/aws-lambda';
 
 /**
  * Lambda function interface.
@@ -16,7 +17,6 @@ export type LambdaNameList =
   // Payload comparison and WRU generation
   | 'comparePayload'
   | 'generateWruEventObjectWithMergedData'
-  | 'getMissingSchemaFields'
   // Commentary Functions
   | 'addPopulateDraftComment'
   | 'addReadyComment'
@@ -41,7 +41,6 @@ export const lambdaNameList: LambdaNameList[] = [
   // Payload comparison and WRU generation
   'comparePayload',
   'generateWruEventObjectWithMergedData',
-  'getMissingSchemaFields',
   // Commentary Functions
   'addPopulateDraftComment',
   'addReadyComment',
@@ -61,6 +60,8 @@ export interface LambdaRequirements {
   needsHigherMemory?: boolean;
   needsSsmParametersAccess?: boolean;
   needsSchemaRegistryAccess?: boolean;
+  needsEventSchemasLayer?: boolean;
+  needsIcav2LookupCacheLayer?: boolean;
   needsExternalBucketInfo?: boolean;
   needsWorkflowInfo?: boolean;
   needsRepoUrl?: boolean;
@@ -75,10 +76,12 @@ export const lambdaRequirementsMap: Record<LambdaNameList, LambdaRequirements> =
   validateDraftDataCompleteSchema: {
     needsSsmParametersAccess: true,
     needsSchemaRegistryAccess: true,
+    needsEventSchemasLayer: true,
   },
   postSchemaValidation: {
     needsOrcabusApiTools: true,
     needsIcav2Tools: true,
+    needsIcav2LookupCacheLayer: true,
     needsExternalBucketInfo: true,
     needsWorkflowInfo: true,
   },
@@ -99,7 +102,6 @@ export const lambdaRequirementsMap: Record<LambdaNameList, LambdaRequirements> =
   // Payload comparison and WRU generation
   comparePayload: {},
   generateWruEventObjectWithMergedData: { needsOrcabusApiTools: true },
-  getMissingSchemaFields: { needsSchemaRegistryAccess: true, needsSsmParametersAccess: true },
   // Commentary Functions
   addPopulateDraftComment: {
     needsOrcabusApiTools: true,
@@ -116,9 +118,11 @@ export const lambdaRequirementsMap: Record<LambdaNameList, LambdaRequirements> =
   },
   convertS3UriToIcav2Uri: {
     needsIcav2Tools: true,
+    needsIcav2LookupCacheLayer: true,
   },
   writeSampleFiltersFile: {
     needsIcav2Tools: true,
+    needsIcav2LookupCacheLayer: true,
   },
   // Post Submitted
   convertIcav2WesStateChangeEventToWrscEvent: {
@@ -129,8 +133,11 @@ export const lambdaRequirementsMap: Record<LambdaNameList, LambdaRequirements> =
 
 export interface LambdaInput {
   lambdaName: LambdaNameList;
+  eventSchemasLayer: lambda.ILayerVersion;
+  icav2LookupCacheLayer: lambda.ILayerVersion;
 }
 
-export interface LambdaObject extends LambdaInput {
+export interface LambdaObject {
+  lambdaName: LambdaNameList;
   lambdaFunction: PythonUvFunction;
 }
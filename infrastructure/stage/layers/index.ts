@@ -0,0 +1,31 @@
+import * as lambda from 'aws-cdk-lib/aws-lambda';
+import { Construct } from 'constructs';
+import path from 'path';
+import { EVENT_SCHEMAS_DIR, LAYERS_DIR } from '../constants';
+
+/*
+Bundle the versioned event schemas into a lambda layer,
+so the schema validation lambdas can resolve known payload versions locally,
+the layer contents are unpacked under /opt (EVENT_SCHEMAS_LAYER_DIR)
+ */
+export function buildEventSchemasLayer(scope: Construct): lambda.LayerVersion {
+  return new lambda.LayerVersion(scope, 'eventSchemasLayer', {
+    code: lambda.Code.fromAsset(EVENT_SCHEMAS_DIR),
+    compatibleArchitectures: [lambda.Architecture.ARM_64],
+    compatibleRuntimes: [lambda.Runtime.PYTHON_3_14],
+    description: 'Versioned event schemas, used by the schema validation lambdas',
+  });
+}
+
+/*
+Warm container caches of ICAv2 lookups, shared by the lambdas that resolve ICAv2 projects, pipelines and data,
+the python package is under python/ so it is on the lambda python path once unpacked under /opt
+ */
+export function buildIcav2LookupCacheLayer(scope: Construct): lambda.LayerVersion {
+  return new lambda.LayerVersion(scope, 'icav2LookupCacheLayer', {
+    code: lambda.Code.fromAsset(path.join(LAYERS_DIR, 'icav2_lookup_cache_layer')),
+    compatibleArchitectures: [lambda.Architecture.ARM_64],
+    compatibleRuntimes: [lambda.Runtime.PYTHON_3_14],
+    description: 'Warm container caches of ICAv2 project, pipeline and data lookups',
+  });
+}
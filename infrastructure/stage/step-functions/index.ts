@@ -20,6 +20,7 @@ import {
   FASTQ_SYNC_DETAIL_TYPE,
   ICAV2_WES_REQUEST_DETAIL_TYPE,
   DEFAULT_PAYLOAD_VERSION,
+  MERGE_MULTIQC_PARQUET_FILES,
   READY_STATUS,
   SAMPLE_FILTERS_PAYLOAD_VERSION_THRESHOLD,
   STEP_FUNCTIONS_DIR,
@@ -48,6 +49,8 @@ function createStateMachineDefinitionSubstitutions(props: BuildStepFunctionProps
 
   definitionSubstitutions['__sample_filters_payload_version_threshold__'] =
     SAMPLE_FILTERS_PAYLOAD_VERSION_THRESHOLD;
+  definitionSubstitutions['__merge_multiqc_parquet_files__'] =
+    MERGE_MULTIQC_PARQUET_FILES.toString();
 
   /* Substitute lambdas in the state machine definition */
   for (const lambdaObject of lambdaFunctions) {
@@ -98,7 +98,6 @@ export const stepFunctionToLambdasMap: Record<StateMachineName, LambdaNameList[]
     'addPopulateDraftComment',
     'comparePayload',
     'generateWruEventObjectWithMergedData',
-    'getMissingSchemaFields',
   ],
   // Validate Draft Data and Put Ready Event
   validateDraftDataAndPutReadyEvent: ['validateDraftDataCompleteSchema', 'postSchemaValidation'],